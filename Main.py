@@ -83,7 +83,7 @@ from magisk_modules import MagiskModules
 from pif_manager import PifManager
 from message_box_ex import MessageBoxEx
 from pf_modules import (adb_kill_server, auto_resize_boot_list,
-    check_platform_tools, flash_phone, live_flash_boot_phone,
+    check_platform_tools, flash_fleet, flash_phone, live_flash_boot_phone,
     patch_boot_img, populate_boot_list, process_file, kb_stats_ui,
     select_firmware, set_flash_button_state, setup_for_downgrade,
     get_all_dialog_values)
@@ -1033,6 +1033,10 @@ class PixelFlasher(wx.Frame):
             self.spinner_label.Hide()
             self.init_complete = True
 
+            # fleet flashing requested on the command line
+            if global_args is not None and getattr(global_args, 'fleet', None):
+                wx.CallAfter(self.flash_fleet, global_args.fleet, global_args.fleet_slots)
+
             if do_profiling and profiler:
                 profiler.disable()
                 stats = pstats.Stats(profiler).sort_stats('tottime')  # 'tottime' for total time
@@ -1650,6 +1654,10 @@ class PixelFlasher(wx.Frame):
         self.partitions_menu = device_menu.Append(wx.ID_ANY, _("Partitions Manager"), _("Backup / Erase Partitions"))
         self.partitions_menu.SetBitmap(images.partition_24.GetBitmap())
         self.Bind(wx.EVT_MENU, self._on_partition_manager, self.partitions_menu)
+        # Flash Fleet
+        self.flash_fleet_menu = device_menu.Append(wx.ID_ANY, _("Flash Fleet"), _("Flash the selected factory firmware to several devices at once"))
+        self.flash_fleet_menu.SetBitmap(images.flash_24.GetBitmap())
+        self.Bind(wx.EVT_MENU, self._on_flash_fleet, self.flash_fleet_menu)
         # Logcat
         self.logcat_menu = device_menu.Append(wx.ID_ANY, _("Logcat"), _("Logcat Viewer"))
         self.logcat_menu.SetBitmap(images.logcat_24.GetBitmap())
@@ -2266,9 +2274,7 @@ class PixelFlasher(wx.Frame):
         dlg = None
         try:
             # load labels if not already loaded
-            if not get_labels() and os.path.exists(get_labels_file_path()):
-                with open(get_labels_file_path(), "r", encoding='ISO-8859-1', errors="replace") as f:
-                    set_labels(json.load(f))
+            get_labels()
             try:
                 dlg = PackageManager(self)
             except Exception:
@@ -6566,6 +6572,95 @@ class PixelFlasher(wx.Frame):
             traceback.print_exc()
         self._on_spin('stop')
 
+    # -----------------------------------------------
+    #                  _on_flash_fleet
+    # -----------------------------------------------
+    def _on_flash_fleet(self, event):
+        serials = [device.id for device in get_phones() or [] if device]
+        if not serials:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: No connected devices to flash.")
+            return
+        dlg = wx.MultiChoiceDialog(self, _("Select the devices to flash with the selected factory firmware"), _("Flash Fleet"), serials)
+        try:
+            if dlg.ShowModal() != wx.ID_OK:
+                print("User cancelled fleet flashing.")
+                return
+            selected = [serials[i] for i in dlg.GetSelections()]
+        finally:
+            dlg.Destroy()
+        if selected:
+            self.flash_fleet(selected)
+
+    # -----------------------------------------------
+    #                  flash_fleet
+    # -----------------------------------------------
+    def flash_fleet(self, serials, usb_slots=FLEET_USB_SLOTS):
+        # Confirms, then runs pf_modules.flash_fleet in a worker thread, progress is printed to the console.
+        print("\n==============================================================================")
+        print(f" {datetime.now():%Y-%m-%d %H:%M:%S} User initiated Flash Fleet: {', '.join(serials)}")
+        print("==============================================================================")
+        if self.config.flash_mode not in ['keepData', 'wipeData']:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Fleet flashing only supports Keep Data or Wipe Data mode.")
+            return
+        boot = get_boot()
+        title = _("Flash Fleet")
+        message = _("Factory Image:          %s\n") % self.config.firmware_path
+        message += _("Firmware Model:         %s\n") % get_firmware_model()
+        if boot and boot.boot_path:
+            message += _("Boot image:             %s\n") % boot.boot_path
+        message += _("Flash Mode:             %s\n") % (_("Wipe Data") if self.config.flash_mode == 'wipeData' else _("Keep Data"))
+        message += _("\nDevices (%d):\n") % len(serials)
+        for serial in serials:
+            message += f"    {serial}\n"
+        message += _("\nDevices whose model does not match the firmware model are skipped.\n")
+        message += _("Press OK to flash all the above devices or CANCEL to abort.\n")
+        print(f"\n*** Dialog ***\n{message}\n______________\n")
+        puml(":Dialog;\n", True)
+        puml(f"note right\n{message}\nend note\n")
+        dlg = wx.MessageDialog(None, message, title, wx.CANCEL | wx.OK | wx.ICON_EXCLAMATION)
+        result = dlg.ShowModal()
+        dlg.Destroy()
+        if result != wx.ID_OK:
+            print("User pressed cancel.")
+            puml("#pink:User Pressed Cancel to abort;\n")
+            return
+        print("User pressed ok.")
+        puml(":User Pressed OK;\n")
+        self.flash_button.Enable(False)
+        self.flash_fleet_menu.Enable(False)
+        last_state = {}
+
+        def progress(status):
+            # called from the device's worker thread, printing is safe (see RedirectText)
+            state = (status.state, status.step)
+            if last_state.get(status.serial) != state:
+                last_state[status.serial] = state
+                print(f"Fleet: {status}")
+
+        def fleet_thread():
+            try:
+                results = flash_fleet(self, serials, usb_slots=usb_slots, progress=progress)
+            except Exception:
+                traceback.print_exc()
+                results = -1
+            wx.CallAfter(self._on_flash_fleet_done, results)
+
+        threading.Thread(target=fleet_thread).start()
+
+    # -----------------------------------------------
+    #                  _on_flash_fleet_done
+    # -----------------------------------------------
+    def _on_flash_fleet_done(self, results):
+        if results == -1:
+            print(f"\nℹ️ {datetime.now():%Y-%m-%d %H:%M:%S} INFO: Fleet flashing was aborted.")
+        else:
+            for serial, res in results.items():
+                print(f"{'✅' if res == 0 else '❌'} {serial}")
+            print(f"Fleet flashing finished: {sum(1 for res in results.values() if res == 0)} of {len(results)} devices flashed.")
+        self.flash_button.Enable(True)
+        self.flash_fleet_menu.Enable(True)
+        self.update_widget_states()
+
     # -----------------------------------------------
     #                  _on_clear
     # -----------------------------------------------
@@ -7319,6 +7414,8 @@ def parse_arguments():
     parser.add_argument("-c", "--config", help="Path to the configuration file")
     parser.add_argument("-l", "--console", action="store_true", help="Log to console as well")
     parser.add_argument("-lc", "--console-only", action="store_true", help="Log to console only")
+    parser.add_argument("-f", "--fleet", nargs="+", metavar="SERIAL", help="Flash the configured factory firmware to these devices at once")
+    parser.add_argument("--fleet-slots", type=int, default=FLEET_USB_SLOTS, help="Number of fleet devices transferring images at the same time")
     args  = parser.parse_args()
     return args
 
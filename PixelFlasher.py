@@ -36,5 +36,11 @@
 import os
 os.environ["PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION"] = "python"
 
-import Main
-Main.main()
+import multiprocessing
+
+if __name__ == '__main__':
+    # payload extraction uses a process pool, spawned workers re-import this
+    # module and must not start the GUI, frozen builds also need freeze_support.
+    multiprocessing.freeze_support()
+    import Main
+    Main.main()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+
+# This file is part of PixelFlasher https://github.com/badabing2005/PixelFlasher
+#
+# Copyright (C) 2025 Badabing2005
+# SPDX-FileCopyrightText: 2025 Badabing2005
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+# for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+# Also add information on how to contact you by electronic and paper mail.
+#
+# If your software can interact with users remotely through a computer network,
+# you should also make sure that it provides a way for users to get its source.
+# For example, if your program is a web application, its interface could
+# display a "Source" link that leads users to an archive of the code. There are
+# many ways you could offer source, and different solutions will be better for
+# different programs; see section 13 for the specific requirements.
+#
+# You should also get your employer (if you work as a programmer) or school, if
+# any, to sign a "copyright disclaimer" for the program, if necessary. For more
+# information on this, and how to apply and follow the GNU AGPL, see
+# <https://www.gnu.org/licenses/>.
+
+import os
+import socket
+import stat
+import struct
+import subprocess
+
+ADB_SERVER_HOST = '127.0.0.1'
+ADB_SERVER_PORT = 5037
+ADB_CONNECT_TIMEOUT = 2
+SYNC_DATA_MAX = 64 * 1024
+
+# shell v2 packet ids
+SHELL_STDIN = 0
+SHELL_STDOUT = 1
+SHELL_STDERR = 2
+SHELL_EXIT = 3
+SHELL_CLOSE_STDIN = 4
+
+
+# ============================================================================
+#                               Class AdbProtocolError
+# ============================================================================
+class AdbProtocolError(Exception):
+    """Raised when the adb server refuses a request or the connection breaks."""
+
+
+# ============================================================================
+#                               Class AdbServerUnavailable
+# ============================================================================
+class AdbServerUnavailable(AdbProtocolError):
+    """Raised when no adb server is listening; the adb binary would start one."""
+
+
+# ============================================================================
+#                               Class AdbShellUnsupported
+# ============================================================================
+class AdbShellUnsupported(AdbServerUnavailable):
+    """Raised, before anything is sent, for a device without shell v2 (no exit codes)."""
+
+
+# ============================================================================
+#                               Class AdbClient
+# ============================================================================
+class AdbClient():
+    """Minimal in-process client for the adb host protocol.
+
+    It talks to an already running adb server (the one `adb start-server`
+    spawns) and never starts one itself; callers fall back to the adb binary
+    when the server is not reachable.
+    """
+    def __init__(self, host=None, port=None, timeout=None):
+        self.host = host or ADB_SERVER_HOST
+        if port is None:
+            port = int(os.environ.get('ANDROID_ADB_SERVER_PORT', ADB_SERVER_PORT))
+        self.port = port
+        self.timeout = timeout
+        self._features = {}
+
+    # ----------------------------------------------------------------------------
+    #                               method _connect
+    # ----------------------------------------------------------------------------
+    def _connect(self, timeout=None):
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=ADB_CONNECT_TIMEOUT)
+        except OSError as e:
+            raise AdbServerUnavailable(f"adb server is not reachable on {self.host}:{self.port}: {e}")
+        sock.settimeout(timeout if timeout is not None else self.timeout)
+        return sock
+
+    # ----------------------------------------------------------------------------
+    #                               method _read_exact
+    # ----------------------------------------------------------------------------
+    @staticmethod
+    def _read_exact(sock, size):
+        buf = bytearray()
+        while len(buf) < size:
+            chunk = sock.recv(size - len(buf))
+            if not chunk:
+                raise AdbProtocolError("adb connection closed unexpectedly")
+            buf += chunk
+        return bytes(buf)
+
+    # ----------------------------------------------------------------------------
+    #                               method _read_length_prefixed
+    # ----------------------------------------------------------------------------
+    def _read_length_prefixed(self, sock):
+        length = int(self._read_exact(sock, 4), 16)
+        return self._read_exact(sock, length)
+
+    # ----------------------------------------------------------------------------
+    #                               method _request
+    # ----------------------------------------------------------------------------
+    def _request(self, sock, request):
+        """Sends a host request and consumes the OKAY / FAIL status."""
+        data = request.encode('utf-8')
+        sock.sendall(f"{len(data):04x}".encode() + data)
+        status = self._read_exact(sock, 4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            raise AdbProtocolError(self._read_length_prefixed(sock).decode('utf-8', errors='replace'))
+        raise AdbProtocolError(f"unexpected adb status {status!r} for {request}")
+
+    # ----------------------------------------------------------------------------
+    #                               method _query
+    # ----------------------------------------------------------------------------
+    def _query(self, request, timeout=None):
+        """Runs a host request that answers with one length-prefixed payload."""
+        sock = self._connect(timeout)
+        try:
+            self._request(sock, request)
+            return self._read_length_prefixed(sock).decode('utf-8', errors='replace')
+        finally:
+            sock.close()
+
+    # ----------------------------------------------------------------------------
+    #                               method _transport
+    # ----------------------------------------------------------------------------
+    def _transport(self, serial, timeout=None):
+        sock = self._connect(timeout)
+        try:
+            self._request(sock, f"host:transport:{serial}")
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    # ----------------------------------------------------------------------------
+    #                               method version
+    # ----------------------------------------------------------------------------
+    def version(self):
+        return int(self._query('host:version'), 16)
+
+    # ----------------------------------------------------------------------------
+    #                               method devices
+    # ----------------------------------------------------------------------------
+    def devices(self):
+        """Returns a list of dicts with serial, state and the devices -l attributes."""
+        return parse_devices(self._query('host:devices-l'))
+
+    # ----------------------------------------------------------------------------
+    #                               method track_devices
+    # ----------------------------------------------------------------------------
+    def track_devices(self):
+        """Yields the full device list every time the adb server reports a change.
+
+        The first list is yielded immediately. The generator ends when the
+        server closes the connection.
+        """
+        sock = self._connect(timeout=None)
+        try:
+            sock.settimeout(None)
+            self._request(sock, 'host:track-devices-l')
+            while True:
+                yield parse_devices(self._read_length_prefixed(sock).decode('utf-8', errors='replace'))
+        finally:
+            sock.close()
+
+    # ----------------------------------------------------------------------------
+    #                               method get_state
+    # ----------------------------------------------------------------------------
+    def get_state(self, serial):
+        return self._query(f"host-serial:{serial}:get-state")
+
+    # ----------------------------------------------------------------------------
+    #                               method features
+    # ----------------------------------------------------------------------------
+    def features(self, serial):
+        if serial not in self._features:
+            self._features[serial] = set(self._query(f"host-serial:{serial}:features").strip().split(','))
+        return self._features[serial]
+
+    # ----------------------------------------------------------------------------
+    #                               method shell
+    # ----------------------------------------------------------------------------
+    def shell(self, serial, cmd, timeout=None):
+        """Runs cmd on the device and returns a subprocess.CompletedProcess.
+
+        Uses the shell v2 protocol (separate stdout / stderr and the exit code).
+        The legacy shell service does not report the exit code, so on devices
+        without shell v2 AdbShellUnsupported is raised before the command is
+        sent, and the caller runs it another way.
+        """
+        args = f"adb -s {serial} shell {cmd}"
+        if 'shell_v2' not in self.features(serial):
+            raise AdbShellUnsupported(f"{serial} does not support shell v2")
+        sock = self._transport(serial, timeout)
+        try:
+            self._request(sock, f"shell,v2,raw:{cmd}")
+            # nothing is ever sent on stdin
+            sock.sendall(struct.pack('<BI', SHELL_CLOSE_STDIN, 0))
+            stdout = bytearray()
+            stderr = bytearray()
+            returncode = None
+            while returncode is None:
+                packet_id, length = struct.unpack('<BI', self._read_exact(sock, 5))
+                payload = self._read_exact(sock, length)
+                if packet_id == SHELL_STDOUT:
+                    stdout += payload
+                elif packet_id == SHELL_STDERR:
+                    stderr += payload
+                elif packet_id == SHELL_EXIT:
+                    returncode = payload[0] if payload else 0
+            return subprocess.CompletedProcess(args=args, returncode=returncode, stdout=stdout.decode('ISO-8859-1'), stderr=stderr.decode('ISO-8859-1'))
+        finally:
+            sock.close()
+
+    # ----------------------------------------------------------------------------
+    #                               method exec_out
+    # ----------------------------------------------------------------------------
+    def exec_out(self, serial, cmd):
+        """Starts cmd with the exec: service and returns the connected socket.
+
+        exec: streams the raw stdout of the command (no pty, no framing), the
+        same as `adb exec-out`; the caller reads until EOF and closes it.
+        """
+        sock = self._transport(serial)
+        try:
+            self._request(sock, f"exec:{cmd}")
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    # ----------------------------------------------------------------------------
+    #                               method _sync
+    # ----------------------------------------------------------------------------
+    def _sync(self, serial, timeout=None):
+        sock = self._transport(serial, timeout)
+        try:
+            self._request(sock, 'sync:')
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    # ----------------------------------------------------------------------------
+    #                               method _sync_request
+    # ----------------------------------------------------------------------------
+    @staticmethod
+    def _sync_request(sock, command, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        sock.sendall(command + struct.pack('<I', len(data)) + data)
+
+    # ----------------------------------------------------------------------------
+    #                               method _sync_fail
+    # ----------------------------------------------------------------------------
+    def _sync_fail(self, sock, length):
+        return AdbProtocolError(self._read_exact(sock, length).decode('utf-8', errors='replace'))
+
+    # ----------------------------------------------------------------------------
+    #                               method stat
+    # ----------------------------------------------------------------------------
+    def stat(self, serial, remote_path):
+        """Returns (mode, size, mtime) of remote_path; mode is 0 if it does not exist."""
+        sock = self._sync(serial)
+        try:
+            self._sync_request(sock, b'STAT', remote_path)
+            reply = self._read_exact(sock, 16)
+            if reply[:4] != b'STAT':
+                raise AdbProtocolError(f"unexpected sync reply {reply[:4]!r}")
+            return struct.unpack('<III', reply[4:])
+        finally:
+            sock.close()
+
+    # ----------------------------------------------------------------------------
+    #                               method pull
+    # ----------------------------------------------------------------------------
+    def pull(self, serial, remote_path, local_path, progress=None):
+        """Streams a device file to local_path.
+
+        progress, if given, is called as progress(bytes_done, total_bytes).
+        Returns the number of bytes written. Directories are not supported.
+        """
+        sock = self._sync(serial)
+        try:
+            self._sync_request(sock, b'STAT', remote_path)
+            reply = self._read_exact(sock, 16)
+            mode, total, mtime = struct.unpack('<III', reply[4:])
+            if mode == 0:
+                raise AdbProtocolError(f"remote object '{remote_path}' does not exist")
+            if stat.S_ISDIR(mode):
+                raise AdbProtocolError(f"remote object '{remote_path}' is a directory")
+            self._sync_request(sock, b'RECV', remote_path)
+            done = 0
+            partial = f"{local_path}.part"
+            try:
+                with open(partial, 'wb') as f:
+                    while True:
+                        header = self._read_exact(sock, 8)
+                        command = header[:4]
+                        length = struct.unpack('<I', header[4:])[0]
+                        if command == b'DATA':
+                            f.write(self._read_exact(sock, length))
+                            done += length
+                            if progress:
+                                progress(done, total)
+                        elif command == b'DONE':
+                            break
+                        elif command == b'FAIL':
+                            raise self._sync_fail(sock, length)
+                        else:
+                            raise AdbProtocolError(f"unexpected sync reply {command!r}")
+                os.replace(partial, local_path)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+            self._sync_request(sock, b'QUIT', b'')
+            return done
+        finally:
+            sock.close()
+
+    # ----------------------------------------------------------------------------
+    #                               method push
+    # ----------------------------------------------------------------------------
+    def push(self, serial, local_path, remote_path, mode=0o644, progress=None):
+        """Streams local_path to the device.
+
+        progress, if given, is called as progress(bytes_done, total_bytes).
+        Returns the number of bytes sent. Directories are not supported.
+        """
+        if os.path.isdir(local_path):
+            raise AdbProtocolError(f"local object '{local_path}' is a directory")
+        total = os.path.getsize(local_path)
+        sock = self._sync(serial)
+        try:
+            self._sync_request(sock, b'SEND', f"{remote_path},{stat.S_IFREG | mode}")
+            done = 0
+            with open(local_path, 'rb') as f:
+                while True:
+                    data = f.read(SYNC_DATA_MAX)
+                    if not data:
+                        break
+                    self._sync_request(sock, b'DATA', data)
+                    done += len(data)
+                    if progress:
+                        progress(done, total)
+            sock.sendall(b'DONE' + struct.pack('<I', int(os.path.getmtime(local_path))))
+            header = self._read_exact(sock, 8)
+            if header[:4] == b'FAIL':
+                raise self._sync_fail(sock, struct.unpack('<I', header[4:])[0])
+            if header[:4] != b'OKAY':
+                raise AdbProtocolError(f"unexpected sync reply {header[:4]!r}")
+            self._sync_request(sock, b'QUIT', b'')
+            return done
+        finally:
+            sock.close()
+
+
+# ============================================================================
+#                               Function parse_devices
+# ============================================================================
+def parse_devices(text):
+    """Parses `adb devices -l` output into a list of dicts."""
+    devices = []
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 2 or line.startswith('List of devices'):
+            continue
+        device = {'serial': fields[0], 'state': fields[1]}
+        for field in fields[2:]:
+            key, sep, value = field.partition(':')
+            if sep:
+                device[key] = value
+        devices.append(device)
+    return devices
+
+
+# ============================================================================
+#                               Function format_devices
+# ============================================================================
+def format_devices(devices):
+    """Formats parse_devices output the way `adb devices` prints it."""
+    lines = ['List of devices attached']
+    lines.extend(f"{device['serial']}\t{device['state']}" for device in devices)
+    return '\n'.join(lines) + '\n\n'
+
+
+_client = None
+
+
+# ============================================================================
+#                               Function get_adb_client
+# ============================================================================
+def get_adb_client():
+    global _client
+    if _client is None:
+        _client = AdbClient()
+    return _client
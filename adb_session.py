@@ -0,0 +1,572 @@
+#!/usr/bin/env python
+
+# This file is part of PixelFlasher https://github.com/badabing2005/PixelFlasher
+#
+# Copyright (C) 2025 Badabing2005
+# SPDX-FileCopyrightText: 2025 Badabing2005
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+# for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+# Also add information on how to contact you by electronic and paper mail.
+#
+# If your software can interact with users remotely through a computer network,
+# you should also make sure that it provides a way for users to get its source.
+# For example, if your program is a web application, its interface could
+# display a "Source" link that leads users to an archive of the code. There are
+# many ways you could offer source, and different solutions will be better for
+# different programs; see section 13 for the specific requirements.
+#
+# You should also get your employer (if you work as a programmer) or school, if
+# any, to sign a "copyright disclaimer" for the program, if necessary. For more
+# information on this, and how to apply and follow the GNU AGPL, see
+# <https://www.gnu.org/licenses/>.
+
+import atexit
+import contextlib
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+
+from adb_client import AdbProtocolError, AdbServerUnavailable, format_devices, get_adb_client
+from constants import *
+from runtime import debug, get_adb, get_env_variables
+
+# Output is decoded the same way runtime.run_shell decodes it.
+SESSION_ENCODING = 'ISO-8859-1'
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_stats = {'native_cmds': 0, 'native_seconds': 0.0, 'session_cmds': 0, 'session_seconds': 0.0, 'oneshot_cmds': 0, 'oneshot_seconds': 0.0, 'restarts': 0}
+_stats_lock = threading.Lock()
+
+
+# ============================================================================
+#                               Class SessionError
+# ============================================================================
+class SessionError(Exception):
+    """Raised when a session cannot be used; the caller falls back to a one-shot adb call."""
+
+
+# ============================================================================
+#                               Class SessionCommandLost
+# ============================================================================
+class SessionCommandLost(SessionError):
+    """Raised when the session died after the command was sent; it may have run, so it is not run again."""
+
+
+# ============================================================================
+#                               Class AdbShellSession
+# ============================================================================
+class AdbShellSession():
+    """A long-lived `adb -s <id> shell` (optionally elevated with su) that runs
+    commands one at a time.
+
+    Each command is framed as:
+        ( cmd ) </dev/null; rc=$?; printf '\\n<marker> %d\\n' $rc; printf '\\n<marker>\\n' >&2
+    so stdout, stderr and the exit code can be split back out of the shared
+    pipes without waiting for the process to exit.
+    """
+    def __init__(self, device_id, with_su=False):
+        self.device_id = device_id
+        self.with_su = with_su
+        self.process = None
+        self.lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._buffers = {'stdout': bytearray(), 'stderr': bytearray()}
+        self._eof = False
+        self.commands = 0
+
+    # ----------------------------------------------------------------------------
+    #                               method alive
+    # ----------------------------------------------------------------------------
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None and not self._eof
+
+    # ----------------------------------------------------------------------------
+    #                               method start
+    # ----------------------------------------------------------------------------
+    def start(self):
+        adb = get_adb()
+        if not adb:
+            raise SessionError("adb command is not found")
+        # stdin is a pipe, so adb does not allocate a pty and the remote shell
+        # neither echoes input nor prints a prompt.
+        self.process = subprocess.Popen([adb, '-s', self.device_id, 'shell'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0, env=get_env_variables())
+        self._eof = False
+        for name, stream in (('stdout', self.process.stdout), ('stderr', self.process.stderr)):
+            threading.Thread(target=self._reader, args=(name, stream), daemon=True).start()
+        if self.with_su:
+            self._write(b"su\n")
+            res = self.run('id -u', timeout=ADB_SESSION_SU_PROBE_TIMEOUT)
+            if res.returncode != 0 or res.stdout.strip() != '0':
+                self.close()
+                raise SessionError(f"su shell is not available on {self.device_id}")
+        else:
+            # make sure the transport is up before handing the session out
+            res = self.run('true', timeout=ADB_SESSION_SU_PROBE_TIMEOUT)
+            if res.returncode != 0:
+                self.close()
+                raise SessionError(f"adb shell did not respond on {self.device_id}")
+        debug(f"Started persistent adb shell{' (su)' if self.with_su else ''} for {self.device_id}")
+
+    # ----------------------------------------------------------------------------
+    #                               method _reader
+    # ----------------------------------------------------------------------------
+    def _reader(self, name, stream):
+        fd = stream.fileno()
+        while True:
+            try:
+                data = os.read(fd, 65536)
+            except OSError:
+                data = b''
+            with self._cond:
+                if not data:
+                    self._eof = True
+                    self._cond.notify_all()
+                    return
+                self._buffers[name] += data
+                self._cond.notify_all()
+
+    # ----------------------------------------------------------------------------
+    #                               method _write
+    # ----------------------------------------------------------------------------
+    def _write(self, data):
+        try:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise SessionError(f"adb shell pipe is closed: {e}")
+
+    # ----------------------------------------------------------------------------
+    #                               method _take
+    # ----------------------------------------------------------------------------
+    def _take(self, name, end):
+        """Returns the framed output of the stream if its end marker has arrived, else None."""
+        buf = self._buffers[name]
+        pos = buf.find(end)
+        if pos == -1:
+            return None
+        eol = buf.find(b'\n', pos + len(end))
+        if eol == -1:
+            return None
+        output = bytes(buf[:pos])
+        trailer = bytes(buf[pos + len(end):eol])
+        del buf[:eol + 1]
+        return output, trailer
+
+    # ----------------------------------------------------------------------------
+    #                               method run
+    # ----------------------------------------------------------------------------
+    def run(self, cmd, timeout=None):
+        """Runs cmd in the session and returns a subprocess.CompletedProcess.
+
+        Raises SessionError if the command could not be sent, SessionCommandLost
+        if the session died after it was sent but before it completed. On timeout the session is closed (its state is unknown) and returncode -1
+        is returned, matching runtime.run_shell.
+        """
+        if not self.alive:
+            raise SessionError("adb shell session is not running")
+        marker = f"__PF_{uuid.uuid4().hex}__"
+        end = f"\n{marker}".encode()
+        script = f"( {cmd} ) </dev/null; __pf_rc=$?; printf '\\n%s %d\\n' {marker} $__pf_rc; printf '\\n%s\\n' {marker} >&2\n"
+        if timeout is None:
+            timeout = ADB_SESSION_TIMEOUT
+        deadline = time.monotonic() + timeout
+        self._write(script.encode(SESSION_ENCODING, errors='replace'))
+        out = err = None
+        with self._cond:
+            while out is None or err is None:
+                if out is None:
+                    out = self._take('stdout', end)
+                if err is None:
+                    err = self._take('stderr', end)
+                if out is not None and err is not None:
+                    break
+                if self._eof:
+                    raise SessionCommandLost("adb shell session ended unexpectedly")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        if out is None or err is None:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Command {cmd} timed out after {timeout} seconds")
+            self.close()
+            return subprocess.CompletedProcess(args=cmd, returncode=-1, stdout='', stderr='')
+        self.commands += 1
+        try:
+            returncode = int(out[1].strip())
+        except ValueError:
+            returncode = -1
+        return subprocess.CompletedProcess(args=cmd, returncode=returncode, stdout=out[0].decode(SESSION_ENCODING, errors='replace'), stderr=err[0].decode(SESSION_ENCODING, errors='replace'))
+
+    # ----------------------------------------------------------------------------
+    #                               method close
+    # ----------------------------------------------------------------------------
+    def close(self):
+        process = self.process
+        if process is None:
+            return
+        self.process = None
+        try:
+            if process.poll() is None:
+                with contextlib.suppress(Exception):
+                    # once for su, once for the outer shell
+                    process.stdin.write(b"exit\nexit\n" if self.with_su else b"exit\n")
+                    process.stdin.close()
+                try:
+                    process.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        except Exception:
+            traceback.print_exc()
+
+
+# ============================================================================
+#                               Function get_session
+# ============================================================================
+def get_session(device_id, with_su=False):
+    """Returns a running session for the device, starting one if needed."""
+    key = (device_id, with_su)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is not None and session.alive:
+            return session
+        if session is not None:
+            session.close()
+            with _stats_lock:
+                _stats['restarts'] += 1
+        session = AdbShellSession(device_id, with_su)
+        _sessions[key] = session
+    with session.lock:
+        if not session.alive:
+            try:
+                session.start()
+            except Exception:
+                session.close()
+                with _sessions_lock:
+                    if _sessions.get(key) is session:
+                        del _sessions[key]
+                raise
+    return session
+
+
+# ============================================================================
+#                               Function close_sessions
+# ============================================================================
+def close_sessions(device_id=None, keep=None):
+    """Closes the sessions of device_id (all devices when None).
+
+    keep is an optional collection of device ids whose sessions are left open.
+    """
+    with _sessions_lock:
+        keys = [key for key in _sessions if (device_id is None or key[0] == device_id) and not (keep and key[0] in keep)]
+        sessions = [_sessions.pop(key) for key in keys]
+    for session in sessions:
+        session.close()
+
+
+# ============================================================================
+#                               Function session_stats
+# ============================================================================
+def session_stats():
+    """Returns command counts and cumulative latency of session vs one-shot calls."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['native_avg_ms'] = round(stats['native_seconds'] * 1000 / stats['native_cmds'], 2) if stats['native_cmds'] else 0
+    stats['session_avg_ms'] = round(stats['session_seconds'] * 1000 / stats['session_cmds'], 2) if stats['session_cmds'] else 0
+    stats['oneshot_avg_ms'] = round(stats['oneshot_seconds'] * 1000 / stats['oneshot_cmds'], 2) if stats['oneshot_cmds'] else 0
+    with _sessions_lock:
+        stats['open_sessions'] = len(_sessions)
+    return stats
+
+
+# ============================================================================
+#                               Function session_safe
+# ============================================================================
+def session_safe(cmd):
+    """Tells whether cmd can be framed as `( cmd )` in a session.
+
+    A new line, a comment or an unbalanced parenthesis would leave the
+    subshell open and the command would only end on ADB_SESSION_TIMEOUT.
+    """
+    if '\n' in cmd or '#' in cmd:
+        return False
+    depth = 0
+    for c in cmd:
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+# ============================================================================
+#                               Function quote_host_arg
+# ============================================================================
+def quote_host_arg(arg):
+    """Quotes arg as a single argument of a command line run by runtime.run_shell (shell=True)."""
+    if sys.platform == "win32":
+        # cmd.exe does not expand & | < > inside double quotes, "" keeps it inside them and adb reads it as "
+        return '"' + arg.replace('"', '""') + '"'
+    return shlex.quote(arg)
+
+
+# ============================================================================
+#                               Function adb_shell
+# ============================================================================
+def adb_shell(device_id, cmd, with_su=False, timeout=None, fallback_cmd=None):
+    """Runs a shell command on the device without spawning an adb process.
+
+    Plain commands go straight to the adb server over its wire protocol
+    (adb_client). su commands, and plain ones when the server can't be used,
+    go through the device's persistent shell session. The adb binary is only
+    run as a last resort.
+
+    Args:
+        device_id:      The adb serial.
+        cmd:            The command as it would be typed in the device shell.
+        with_su:        Run it in the device's su session.
+        timeout:        Seconds to wait (Default: None, which waits ADB_SESSION_TIMEOUT in a session).
+        fallback_cmd:   Full host command to run with runtime.run_shell if the
+                        session can not be used (Default: adb -s <id> shell <cmd>,
+                        with cmd quoted so the host shell passes it through as is).
+
+    Returns:
+        subprocess.CompletedProcess, as runtime.run_shell does.
+    """
+    from runtime import run_shell
+
+    start = time.monotonic()
+    if not with_su:
+        try:
+            res = get_adb_client().shell(device_id, cmd, timeout=timeout)
+            with _stats_lock:
+                _stats['native_cmds'] += 1
+                _stats['native_seconds'] += time.monotonic() - start
+            return res
+        except AdbServerUnavailable as e:
+            # nothing reached the device, it is safe to run the command another way
+            debug(f"adb server request failed for {device_id}: {e}")
+        except socket.timeout:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Command {cmd} timed out after {timeout} seconds")
+            return subprocess.CompletedProcess(args=cmd, returncode=-1, stdout='', stderr='')
+        except (AdbProtocolError, OSError) as e:
+            # the command may already have run, it is not run a second time
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: adb shell {cmd} failed on {device_id}: {e}")
+            return subprocess.CompletedProcess(args=cmd, returncode=-1, stdout='', stderr=f"error: {e}\n")
+        start = time.monotonic()
+
+    # commands that would break the framing are sent one-shot
+    if session_safe(cmd):
+        session = None
+        try:
+            session = get_session(device_id, with_su)
+        except SessionError as e:
+            debug(f"adb shell session unavailable for {device_id}: {e}, falling back to one-shot call.")
+        except Exception:
+            traceback.print_exc()
+        if session is not None:
+            try:
+                with session.lock:
+                    res = session.run(cmd, timeout=timeout)
+                with _stats_lock:
+                    _stats['session_cmds'] += 1
+                    _stats['session_seconds'] += time.monotonic() - start
+                return res
+            except SessionCommandLost as e:
+                # the command may already have run, it is not run a second time
+                session.close()
+                print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: adb shell {cmd} failed on {device_id}: {e}")
+                return subprocess.CompletedProcess(args=cmd, returncode=-1, stdout='', stderr=f"error: {e}\n")
+            except SessionError as e:
+                debug(f"adb shell session unavailable for {device_id}: {e}, falling back to one-shot call.")
+                session.close()
+            except Exception as e:
+                traceback.print_exc()
+                session.close()
+                return subprocess.CompletedProcess(args=cmd, returncode=-1, stdout='', stderr=f"error: {e}\n")
+        start = time.monotonic()
+
+    if fallback_cmd is None:
+        device_cmd = f"su -c {shlex.quote(cmd)}" if with_su else cmd
+        fallback_cmd = f"\"{get_adb()}\" -s {device_id} shell {quote_host_arg(device_cmd)}"
+    res = run_shell(fallback_cmd, timeout=timeout)
+    with _stats_lock:
+        _stats['oneshot_cmds'] += 1
+        _stats['oneshot_seconds'] += time.monotonic() - start
+    return res
+
+
+# ============================================================================
+#                               Function adb_get_state
+# ============================================================================
+def adb_get_state(device_id, timeout=None, fallback_cmd=None):
+    """Returns `adb -s <id> get-state` as a subprocess.CompletedProcess."""
+    from runtime import run_shell
+
+    try:
+        state = get_adb_client().get_state(device_id)
+        return subprocess.CompletedProcess(args=f"get-state {device_id}", returncode=0, stdout=f"{state}\n", stderr='')
+    except AdbServerUnavailable as e:
+        debug(f"{e}, falling back to adb get-state.")
+    except AdbProtocolError as e:
+        # the server answered, the device is just not there
+        return subprocess.CompletedProcess(args=f"get-state {device_id}", returncode=1, stdout='', stderr=f"error: {e}\n")
+    except OSError as e:
+        debug(f"adb server request failed: {e}, falling back to adb get-state.")
+    if fallback_cmd is None:
+        fallback_cmd = f"\"{get_adb()}\" -s {device_id} get-state"
+    return run_shell(fallback_cmd, timeout=timeout)
+
+
+# ============================================================================
+#                               Function adb_devices
+# ============================================================================
+def adb_devices(timeout=None, fallback_cmd=None):
+    """Returns `adb devices` as a subprocess.CompletedProcess."""
+    from runtime import run_shell
+
+    try:
+        return subprocess.CompletedProcess(args='devices', returncode=0, stdout=format_devices(get_adb_client().devices()), stderr='')
+    except (AdbProtocolError, OSError) as e:
+        debug(f"adb server request failed: {e}, falling back to adb devices.")
+    if fallback_cmd is None:
+        fallback_cmd = f"\"{get_adb()}\" devices"
+    return run_shell(fallback_cmd, timeout=timeout)
+
+
+# ============================================================================
+#                               Function adb_transfer
+# ============================================================================
+def adb_transfer(device_id, direction, source, dest, progress=None, fallback_cmd=None):
+    """Pushes or pulls a single file over the sync protocol.
+
+    Args:
+        device_id:      The adb serial.
+        direction:      'push' or 'pull'.
+        source:         Path the data is read from (local for push, remote for pull).
+        dest:           Path the data is written to.
+        progress:       Optional callable(bytes_done, total_bytes).
+        fallback_cmd:   Full host command to run if the server can not be used.
+
+    Returns:
+        subprocess.CompletedProcess, as runtime.run_shell does.
+    """
+    from runtime import run_shell
+
+    try:
+        start = time.monotonic()
+        client = get_adb_client()
+        if direction == 'push':
+            size = client.push(device_id, source, dest, progress=progress)
+        else:
+            size = client.pull(device_id, source, dest, progress=progress)
+        seconds = time.monotonic() - start
+        message = f"{source}: 1 file {direction}ed. {size / max(seconds, 0.001) / 1048576:.1f} MB/s ({size} bytes in {seconds:.3f}s)\n"
+        return subprocess.CompletedProcess(args=f"{direction} {source} {dest}", returncode=0, stdout=message, stderr='')
+    except (AdbProtocolError, OSError) as e:
+        # directories, missing server and sync errors are left to the adb binary
+        debug(f"adb sync {direction} of {source} failed: {e}, falling back to adb {direction}.")
+    if fallback_cmd is None:
+        fallback_cmd = f"\"{get_adb()}\" -s {device_id} {direction} \"{source}\" \"{dest}\""
+    return run_shell(fallback_cmd)
+
+
+# ============================================================================
+#                               Class ExecStream
+# ============================================================================
+class ExecStream():
+    """Readable raw stdout of a device command, over the adb server or an adb exec-out process."""
+    def __init__(self, sock=None, process=None):
+        self.sock = sock
+        self.process = process
+        self.native = sock is not None
+
+    def read(self, size):
+        if self.sock is not None:
+            return self.sock.recv(size)
+        return self.process.stdout.read1(size) if hasattr(self.process.stdout, 'read1') else self.process.stdout.read(size)
+
+    def read_exact(self, size):
+        """Reads exactly size bytes, fewer only at end of stream."""
+        chunks = []
+        while size > 0:
+            data = self.read(min(size, 1048576))
+            if not data:
+                break
+            chunks.append(data)
+            size -= len(data)
+        return b''.join(chunks)
+
+    def readline(self, limit=4096):
+        line = bytearray()
+        while len(line) < limit:
+            data = self.read_exact(1)
+            if not data:
+                break
+            line += data
+            if data == b'\n':
+                break
+        return bytes(line)
+
+    def close(self):
+        if self.sock is not None:
+            with contextlib.suppress(Exception):
+                self.sock.close()
+        if self.process is not None:
+            with contextlib.suppress(Exception):
+                self.process.stdout.close()
+                if self.process.poll() is None:
+                    self.process.kill()
+                self.process.wait(timeout=5)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ============================================================================
+#                               Function adb_exec_out
+# ============================================================================
+def adb_exec_out(device_id, cmd, fallback_cmd=None):
+    """Starts cmd on the device and returns an ExecStream of its raw stdout.
+
+    The command goes over the adb server when it is reachable, otherwise an
+    `adb exec-out` process is started (fallback_cmd, when given, is the full
+    host command line for that).
+    """
+    try:
+        return ExecStream(sock=get_adb_client().exec_out(device_id, cmd))
+    except (AdbProtocolError, OSError) as e:
+        debug(f"adb server exec failed for {device_id}: {e}, falling back to adb exec-out.")
+    if fallback_cmd is None:
+        fallback_cmd = f"\"{get_adb()}\" -s {device_id} exec-out \"{cmd}\""
+    process = subprocess.Popen(fallback_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=get_env_variables())
+    return ExecStream(process=process)
+
+
+atexit.register(close_sessions)
@@ -199,6 +199,22 @@ class AdvancedSettings(wx.Dialog):
         self.reboot_to_system_timeout.SetDescriptiveText(_("Example: 90"))
         self.reboot_to_system_timeout.ShowSearchButton(False)
 
+        # Partition dump concurrency
+        self.partition_dump_concurrency_label = wx.StaticText(parent=scrolled_panel, id=wx.ID_ANY, label=_("Parallel partition dumps"))
+        self.partition_dump_concurrency_label.SetToolTip(_("Number of partitions the Partition Manager dumps from the device at the same time"))
+        self.partition_dump_concurrency = wx.SearchCtrl(scrolled_panel, style=wx.TE_LEFT)
+        self.partition_dump_concurrency.ShowCancelButton(True)
+        self.partition_dump_concurrency.SetDescriptiveText(_("Example: 2"))
+        self.partition_dump_concurrency.ShowSearchButton(False)
+
+        # Firmware cache size
+        self.firmware_cache_gb_label = wx.StaticText(parent=scrolled_panel, id=wx.ID_ANY, label=_("Firmware cache size (GB)"))
+        self.firmware_cache_gb_label.SetToolTip(_("Disk space kept for files extracted from processed firmware archives, so that processing the same archive again skips extraction.\nLeast recently used entries are removed first, extracted factory_images folders are never removed. 0 disables the cache."))
+        self.firmware_cache_gb = wx.SearchCtrl(scrolled_panel, style=wx.TE_LEFT)
+        self.firmware_cache_gb.ShowCancelButton(True)
+        self.firmware_cache_gb.SetDescriptiveText(_("Example: 30"))
+        self.firmware_cache_gb.ShowSearchButton(False)
+
         # Delete Bundle libs
         self.delete_bundled_libs_label = wx.StaticText(parent=scrolled_panel, id=wx.ID_ANY, label=_("Delete bundled libs"))
         self.delete_bundled_libs_label.SetToolTip(_("The listed libraries would be deleted from the PF bundle to allow system defined ones to be used."))
@@ -289,6 +305,8 @@ class AdvancedSettings(wx.Dialog):
         self.kb_index_cb.SetValue(self.Parent.config.kb_index)
         self.force_codepage_checkbox.SetValue(self.Parent.config.force_codepage)
         self.reboot_to_system_timeout.SetValue(str(self.Parent.config.reboot_to_system_timeout))
+        self.partition_dump_concurrency.SetValue(str(self.Parent.config.partition_dump_concurrency))
+        self.firmware_cache_gb.SetValue(str(self.Parent.config.firmware_cache_gb))
         self.delete_bundled_libs.SetValue(self.Parent.config.delete_bundled_libs)
         self.override_kmi.SetValue(self.Parent.config.override_kmi)
         self.code_page.SetValue(str(self.Parent.config.custom_codepage))
@@ -371,6 +389,12 @@ class AdvancedSettings(wx.Dialog):
         fgs1.Add(self.reboot_to_system_timeout_label, 0, wx.EXPAND)
         fgs1.Add(self.reboot_to_system_timeout, 1, wx.EXPAND)
 
+        fgs1.Add(self.partition_dump_concurrency_label, 0, wx.EXPAND)
+        fgs1.Add(self.partition_dump_concurrency, 1, wx.EXPAND)
+
+        fgs1.Add(self.firmware_cache_gb_label, 0, wx.EXPAND)
+        fgs1.Add(self.firmware_cache_gb, 1, wx.EXPAND)
+
         fgs1.Add(self.delete_bundled_libs_label, 0, wx.EXPAND)
         fgs1.Add(self.delete_bundled_libs, 1, wx.EXPAND)
 
@@ -617,6 +641,24 @@ class AdvancedSettings(wx.Dialog):
                 sys.stdout.write(f"Setting Reboot to system timeout to: {value}\n")
                 self.Parent.config.reboot_to_system_timeout = value
 
+            value = self.partition_dump_concurrency.GetValue()
+            if value not in ('', None) and value.isnumeric() and int(value) > 0:
+                value = int(value)
+            else:
+                value = 2
+            if value != self.Parent.config.partition_dump_concurrency:
+                sys.stdout.write(f"Setting Parallel partition dumps to: {value}\n")
+                self.Parent.config.partition_dump_concurrency = value
+
+            value = self.firmware_cache_gb.GetValue()
+            if value not in ('', None) and value.isnumeric():
+                value = int(value)
+            else:
+                value = 30
+            if value != self.Parent.config.firmware_cache_gb:
+                sys.stdout.write(f"Setting Firmware cache size to: {value} GB\n")
+                self.Parent.config.firmware_cache_gb = value
+
             value = self.delete_bundled_libs.GetValue()
             if value is None:
                 value = ''
@@ -40,26 +40,17 @@ import pyperclip
 import traceback
 import wx
 import wx.html
-import wx.lib.mixins.listctrl as listmix
 import wx.lib.wxpTag
 
 import images as images
 from runtime import *
 from i18n import _
-
-# ============================================================================
-#                               Class ListCtrl
-# ============================================================================
-class ListCtrl(wx.ListCtrl, listmix.ListCtrlAutoWidthMixin):
-    def __init__(self, parent, ID, pos=wx.DefaultPosition, size=wx.DefaultSize, style=0):
-        wx.ListCtrl.__init__(self, parent, ID, pos, size, style)
-        listmix.ListCtrlAutoWidthMixin.__init__(self)
-
+from virtual_list import ListModel, VirtualListCtrl
 
 # ============================================================================
 #                               Class BackupManager
 # ============================================================================
-class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
+class BackupManager(wx.Dialog):
     def __init__(self, *args, **kwargs):
         wx.Dialog.__init__(self, *args, **kwargs, style = wx.RESIZE_BORDER | wx.DEFAULT_DIALOG_STYLE)
         self.SetTitle(_("Magisk Backup Manager"))
@@ -88,15 +79,17 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
         self.sm_up = self.il.Add(images.SmallUpArrow.GetBitmap())
         self.sm_dn = self.il.Add(images.SmallDnArrow.GetBitmap())
 
-        self.list  = ListCtrl(self, -1, size=wx.Size(-1, -1), style=wx.LC_REPORT | wx.LC_SINGLE_SEL | wx.BORDER_NONE)
+        self.model = ListModel(["SHA1", "Date", "Firmware"], search_columns=(0, 2))
+        self.list  = VirtualListCtrl(self, -1, self.model, size=wx.Size(-1, -1), style=wx.LC_REPORT | wx.LC_SINGLE_SEL | wx.BORDER_NONE)
         if sys.platform == "win32":
             self.list.SetHeaderAttr(wx.ItemAttr(wx.Colour('BLACK'),wx.Colour('DARK GREY'), wx.Font(wx.FontInfo(10).Bold())))
         self.list.SetImageList(self.il, wx.IMAGE_LIST_SMALL)
         self.list.EnableCheckBoxes(enable=True)
-        itemDataMap = self.PopulateList()
-        if itemDataMap != -1:
-            self.itemDataMap = itemDataMap
-        listmix.ColumnSorterMixin.__init__(self, 6)
+        self.list.SetSortImages(self.sm_dn, self.sm_up)
+        self.list.SetColumns()
+        self.PopulateList()
+        self.FilterList()
+        self.SizeColumns()
 
         self.delete_button = wx.Button(self, wx.ID_ANY, _("Delete"), wx.DefaultPosition, wx.DefaultSize, 0)
         self.delete_button.SetToolTip(_("Delete checked backups"))
@@ -153,8 +146,8 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
         self.Bind(wx.EVT_LIST_ITEM_SELECTED, self.OnItemSelected, self.list)
         self.Bind(wx.EVT_LIST_COL_CLICK, self.OnColClick, self.list)
         self.list.Bind(wx.EVT_RIGHT_DOWN, self.OnRightDown)
-        self.list.Bind(wx.EVT_LIST_ITEM_CHECKED, self.OnItemCheck)
-        self.list.Bind(wx.EVT_LIST_ITEM_UNCHECKED, self.OnItemUncheck)
+        self.Bind(wx.EVT_LIST_ITEM_CHECKED, self.OnItemCheck, self.list)
+        self.Bind(wx.EVT_LIST_ITEM_UNCHECKED, self.OnItemUncheck, self.list)
         # for wxMSW
         self.list.Bind(wx.EVT_COMMAND_RIGHT_CLICK, self.OnRightClick)
         # for wxGTK
@@ -166,62 +159,36 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
     #              Function PopulateList
     # -----------------------------------------------
     def PopulateList(self):
-        info = wx.ListItem()
-        info.Mask = wx.LIST_MASK_TEXT | wx.LIST_MASK_IMAGE | wx.LIST_MASK_FORMAT
-        info.Image = -1
-        info.Align = 0
-        info.Width = -1
-        info.SetWidth(-1)
-        info.Text = "SHA1"
-        self.list.InsertColumn(0, info)
-
-        info.Align = wx.LIST_FORMAT_LEFT # 0
-        info.Text = "Date"
-        self.list.InsertColumn(1, info)
-
-        info.Align = wx.LIST_FORMAT_LEFT # 0
-        info.Text = "Firmware"
-        self.list.InsertColumn(2, info)
-
+        # (Re)loads the device backups in the list model, searching and sorting only change its view.
+        self.model.clear()
         if not self.device:
-            return -1
+            return
         res = self.device.get_magisk_backups()
-        itemDataMap = {}
-        query = self.searchCtrl.GetValue().lower()
         if res == 0:
             self.backupCount = len(self.device.backups)
-            self.message_label.Label = f"{self.backupCount} Backups\n{self.sha1}"
-            i = 0
-            items = self.device.backups.items()
-            for key, data in items:
-                alltext = f"{key.lower()} {str(data.firmware.lower())}"
-                if query.lower() in alltext:
-                    index = self.list.InsertItem(self.list.GetItemCount(), key)
-                    if data.value:
-                        itemDataMap[i + 1] = (key, data.date, data.firmware)
-                        row = self.list.GetItem(index)
-                        self.list.SetItem(index, 1, data.date)
-                        self.list.SetItem(index, 2, str(data.firmware))
-                        if self.sha1 and self.sha1 == data.value:
-                            row.SetTextColour(wx.RED)
-                        self.list.SetItem(row)
-                        self.list.SetItemData(index, i + 1)
-                    # hide image
-                    self.list.SetItemColumnImage(i, 0, -1)
-                    i += 1
-            self.message_label.Label = f"{str(i)} / {self.backupCount} Backups\n{self.sha1}"
-        self.list.SetColumnWidth(0, -2)
-        grow_column(self.list, 0, 20)
-        self.list.SetColumnWidth(1, -2)
-        grow_column(self.list, 1, 20)
-        self.list.SetColumnWidth(2, -2)
-        grow_column(self.list, 1, 20)
+            for key, data in self.device.backups.items():
+                if not data.value:
+                    self.model.append((key, '', ''))
+                    continue
+                colour = wx.RED if self.sha1 and self.sha1 == data.value else None
+                self.model.append((key, data.date, str(data.firmware)), colour)
 
+    # -----------------------------------------------
+    #              Function FilterList
+    # -----------------------------------------------
+    def FilterList(self):
         self.currentItem = 0
-        if itemDataMap:
-            return itemDataMap
-        else:
-            return -1
+        self.model.filter(self.searchCtrl.GetValue())
+        self.list.RefreshView()
+        self.message_label.Label = f"{self.list.GetItemCount()} / {self.backupCount} Backups\n{self.sha1}"
+
+    # -----------------------------------------------
+    #              Function SizeColumns
+    # -----------------------------------------------
+    def SizeColumns(self):
+        for col in range(3):
+            self.list.SetColumnWidth(col, -2)
+            grow_column(self.list, col, 20)
 
     # -----------------------------------------------
     #              Function Check_UncheckAll
@@ -229,8 +196,7 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
     def Check_UncheckAll(self, state):
         # Set this so that we skip processing OnItemChecked, OnItemUnchecked events
         self.Set_all_cb_clicked (True)
-        itemcount = self.list.GetItemCount()
-        [self.list.CheckItem(item=i, check=state) for i in range(itemcount)]
+        self.list.CheckAll(state)
         if state:
             print("checking all Backups\n")
             self.EnableDisableButton(True)
@@ -245,14 +211,14 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
     def OnSearch(self, event):
         query = self.searchCtrl.GetValue()
         print(f"Searching for: {query}")
-        self.Refresh()
+        self.FilterList()
 
     # -----------------------------------------------
     #                  onCancel
     # -----------------------------------------------
     def OnCancel(self, event):
         self.searchCtrl.SetValue("")
-        self.Refresh()
+        self.FilterList()
 
     # -----------------------------------------------
     #                  OnAllCheckbox
@@ -274,7 +240,7 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
     def OnItemCheck(self, event):
         if self.Get_all_cb_clicked():
             return
-        print(f"{event.Item.Text} is checked")
+        print(f"{self.list.GetItemText(event.Index)} is checked")
         self.Update_all_checkbox()
 
     # -----------------------------------------------
@@ -283,7 +249,7 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
     def OnItemUncheck(self, event):
         if self.Get_all_cb_clicked():
             return
-        print(f"{event.Item.Text} is unchecked")
+        print(f"{self.list.GetItemText(event.Index)} is unchecked")
         self.Update_all_checkbox()
 
     # -----------------------------------------------
@@ -350,7 +316,7 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
     def DeleteBackup(self, index, do_refresh = True):
         if not self.device:
             return
-        sha1 = self.list.GetItem(index).Text
+        sha1 = self.list.GetItemText(index)
         print(f"Deleting backup {sha1}")
         self.device.delete(f"/data/magisk_backup_{sha1}/", True, True)
         if do_refresh:
@@ -506,20 +472,6 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
             print("Aborting ...")
             return
 
-    # -----------------------------------------------
-    #                  GetListCtrl
-    # -----------------------------------------------
-    # Used by the ColumnSorterMixin, see wx/lib/mixins/listctrl.py
-    def GetListCtrl(self):
-        return self.list
-
-    # -----------------------------------------------
-    #                  GetSortImages
-    # -----------------------------------------------
-    # Used by the ColumnSorterMixin, see wx/lib/mixins/listctrl.py
-    def GetSortImages(self):
-        return (self.sm_dn, self.sm_up)
-
     # -----------------------------------------------
     #                  OnRightDown
     # -----------------------------------------------
@@ -536,8 +488,7 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
     #                  getColumnText
     # -----------------------------------------------
     def getColumnText(self, index, col):
-        item = self.list.GetItem(index, col)
-        return item.GetText()
+        return self.list.GetItemText(index, col)
 
     # -----------------------------------------------
     #                  OnItemSelected
@@ -634,8 +585,7 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
     #                  OnCopyClipboard
     # -----------------------------------------------
     def OnCopyClipboard(self, event):
-        item = self.list.GetItem(self.currentItem)
-        pyperclip.copy(item.Text)
+        pyperclip.copy(self.list.GetItemText(self.currentItem))
 
     # -----------------------------------------------
     #                  Function Refresh
@@ -644,10 +594,9 @@ class BackupManager(wx.Dialog, listmix.ColumnSorterMixin):
         # override is intentional, this Refresh needs to reload backup data rather than redraw the widget.
         print("Refreshing the backups ...\n")
         self._on_spin('start')
-        self.list.ClearAll()
-        itemDataMap = self.PopulateList()
-        if itemDataMap != -1:
-            self.itemDataMap = itemDataMap
+        self.PopulateList()
+        self.FilterList()
+        self.SizeColumns()
         self._on_spin('stop')
 
     # -----------------------------------------------
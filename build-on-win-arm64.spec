@@ -43,6 +43,7 @@ a = Analysis(['PixelFlasher.py'],
                 'wx._adv',
                 'wx._html',
                 'wx._stc',
+                'zstandard',
             ],
             hookspath=['pyi-hooks-arm64'],
             runtime_hooks=[],
@@ -128,6 +128,8 @@ class Config():
         self.pif_chunk_overlap = 200        # 200 bytes default
         self.canary_miner_channel = 'stable'  # can be 'stable' or 'main', default to 'stable'
         self.reboot_to_system_timeout = 90
+        self.partition_dump_concurrency = 2
+        self.firmware_cache_gb = 30         # 0 disables the firmware cache
 
         self.toolbar = {
             'tb_position': 'top',
@@ -358,6 +360,10 @@ class Config():
                     conf.canary_miner_channel = data['canary_miner_channel']
                 with contextlib.suppress(KeyError):
                     conf.reboot_to_system_timeout = data['reboot_to_system_timeout']
+                with contextlib.suppress(KeyError):
+                    conf.partition_dump_concurrency = data['partition_dump_concurrency']
+                with contextlib.suppress(KeyError):
+                    conf.firmware_cache_gb = data['firmware_cache_gb']
 
                 # read the toolbar section
                 with contextlib.suppress(KeyError):
@@ -568,7 +574,9 @@ class Config():
             'pif_chunk_size': self.pif_chunk_size,
             'pif_chunk_overlap': self.pif_chunk_overlap,
             'canary_miner_channel': self.canary_miner_channel,
-            'reboot_to_system_timeout': self.reboot_to_system_timeout
+            'reboot_to_system_timeout': self.reboot_to_system_timeout,
+            'partition_dump_concurrency': self.partition_dump_concurrency,
+            'firmware_cache_gb': self.firmware_cache_gb
         }
         with open(file_path, 'w', encoding="ISO-8859-1", errors="replace", newline='\n') as f:
             json.dump(data, f, indent=4)
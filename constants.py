@@ -45,6 +45,35 @@ PIF_WIDTH = 1150
 PIF_HEIGHT = 840
 POS_X = 40
 POS_Y = 40
+# read size of the file hashing service (runtime.file_digests)
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+# persistent adb shell sessions (adb_session.py)
+ADB_SESSION_TIMEOUT = 300
+ADB_SESSION_SU_PROBE_TIMEOUT = 10
+# streamed partition dumps (Device.stream_partitions), dd block size and resume granularity
+DUMP_BLOCK_SIZE = 1024 * 1024
+# output formats of partition dumps and the extension appended to the image name
+DUMP_FORMATS = {'': '', 'gz': '.gz', 'xz': '.xz', 'zst': '.zst', 'sparse': '.sparse'}
+# device property snapshots (runtime.get_prop_snapshot), reused for at most this many seconds
+PROP_SNAPSHOT_TTL = 24 * 60 * 60
+# device tracker (device_tracker.py), fastboot enumeration interval in seconds, sysfs and `fastboot devices`
+FASTBOOT_POLL_INTERVAL = 0.5
+FASTBOOT_DEVICES_POLL_INTERVAL = 1
+# fleet flashing (fleet_flash.py), devices transferring images at once and reboot wait in seconds
+FLEET_USB_SLOTS = 2
+FLEET_REBOOT_TIMEOUT = 180
+
+EXTRACT_THREADS = 4
+EXTRACT_CHUNK_SIZE = 1024 * 1024
+# remote OTA fingerprint / security patch scan, range requests in flight at once
+OTA_RANGE_WORKERS = 4
+
+# where build.prop is inside each partition image, most likely first
+BUILD_PROP_PATHS = {
+    'system': ['system/build.prop', 'build.prop'],
+    'vendor': ['build.prop', 'etc/build.prop'],
+    'product': ['etc/build.prop', 'build.prop'],
+}
 
 KNOWN_BAD_MAGISKS = ['7dbfba76:25207', 'e5641d5b:25208', '2717feac:25209', '981ccabb:25210', '69529ac5:25211', 'e2545e57:26001', '26.0:26000', 'a8c4a33e:26103']
 PIF_UPDATE_URL = 'https://raw.githubusercontent.com/chiteroman/PlayIntegrityFix/main/update.json'
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+
+# This file is part of PixelFlasher https://github.com/badabing2005/PixelFlasher
+#
+# Copyright (C) 2025 Badabing2005
+# SPDX-FileCopyrightText: 2025 Badabing2005
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+# for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+# Also add information on how to contact you by electronic and paper mail.
+#
+# If your software can interact with users remotely through a computer network,
+# you should also make sure that it provides a way for users to get its source.
+# For example, if your program is a web application, its interface could
+# display a "Source" link that leads users to an archive of the code. There are
+# many ways you could offer source, and different solutions will be better for
+# different programs; see section 13 for the specific requirements.
+#
+# You should also get your employer (if you work as a programmer) or school, if
+# any, to sign a "copyright disclaimer" for the program, if necessary. For more
+# information on this, and how to apply and follow the GNU AGPL, see
+# <https://www.gnu.org/licenses/>.
+
+import glob
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from adb_client import AdbServerUnavailable, get_adb_client
+from constants import *
+from runtime import debug, get_fastboot, run_shell
+
+# adb states in which `adb get-state` succeeds
+ADB_READY_STATES = ('device', 'recovery', 'sideload', 'rescue', 'bootloader')
+# fastboot USB interface: vendor specific class, subclass 0x42, protocol 0x03
+FASTBOOT_INTERFACE = ('ff', '42', '03')
+
+
+# ============================================================================
+#                               Function enumerate_fastboot_usb
+# ============================================================================
+def enumerate_fastboot_usb():
+    """Returns the serials of USB devices exposing a fastboot interface.
+
+    Reads Linux sysfs, which costs a few file reads and no process. Returns
+    None where sysfs is not available, so the caller can fall back to
+    `fastboot devices`.
+    """
+    if not sys.platform.startswith('linux') or not os.path.isdir('/sys/bus/usb/devices'):
+        return None
+    serials = set()
+    for interface in glob.glob('/sys/bus/usb/devices/*:*'):
+        try:
+            values = []
+            for name in ('bInterfaceClass', 'bInterfaceSubClass', 'bInterfaceProtocol'):
+                with open(os.path.join(interface, name)) as f:
+                    values.append(f.read().strip().lower())
+            if tuple(values) != FASTBOOT_INTERFACE:
+                continue
+            with open(os.path.join(os.path.dirname(os.path.realpath(interface)), 'serial')) as f:
+                serials.add(f.read().strip())
+        except OSError:
+            continue
+    return serials
+
+
+# ============================================================================
+#                               Function fastboot_devices
+# ============================================================================
+def fastboot_devices():
+    """Returns the serials listed by `fastboot devices`, None on failure."""
+    if not get_fastboot():
+        return None
+    res = run_shell(f"\"{get_fastboot()}\" devices", timeout=10)
+    if not (res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0):
+        return None
+    serials = set()
+    for line in res.stdout.splitlines():
+        fields = line.split()
+        if len(fields) >= 2 and 'fastboot' in fields[1:]:
+            serials.add(fields[0])
+    return serials
+
+
+# ============================================================================
+#                               Class DeviceTracker
+# ============================================================================
+class DeviceTracker():
+    """Live table of connected devices.
+
+    adb devices come from the adb server's track-devices-l stream, which
+    pushes every change as it happens. fastboot devices come from polling
+    USB enumeration every FASTBOOT_POLL_INTERVAL seconds (sysfs on Linux). On
+    other platforms `fastboot devices` is polled every
+    FASTBOOT_DEVICES_POLL_INTERVAL seconds, but only while a caller is waiting
+    for a device to reach or leave fastboot; the set is emptied when the last
+    one stops waiting.
+
+    adb_live / fastboot_live tell whether the table can be trusted for that
+    transport; when it can't, callers use the old one-shot commands.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.adb = {}
+        self.fastboot = set()
+        self.adb_live = False
+        self.fastboot_live = False
+        self._fastboot_waiters = 0
+        self._fastboot_polled = False
+        self._threads = []
+
+    # ----------------------------------------------------------------------------
+    #                               method start
+    # ----------------------------------------------------------------------------
+    def start(self, wait=1.0):
+        """Starts the tracking threads and waits up to `wait` seconds for the first adb snapshot."""
+        if self._threads:
+            return
+        for target in (self._adb_loop, self._fastboot_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        with self._cond:
+            self._cond.wait_for(lambda: self.adb_live, timeout=wait)
+
+    # ----------------------------------------------------------------------------
+    #                               method _adb_loop
+    # ----------------------------------------------------------------------------
+    def _adb_loop(self):
+        while True:
+            try:
+                for devices in get_adb_client().track_devices():
+                    table = {device['serial']: device['state'] for device in devices}
+                    with self._cond:
+                        if table != self.adb:
+                            debug(f"adb devices: {table}")
+                        self.adb = table
+                        self.adb_live = True
+                        self._cond.notify_all()
+            except AdbServerUnavailable:
+                pass
+            except Exception as e:
+                debug(f"adb device tracking interrupted: {e}")
+            with self._cond:
+                self.adb_live = False
+                self._cond.notify_all()
+            # the adb binary starts the server on its next use, try again later
+            time.sleep(2)
+
+    # ----------------------------------------------------------------------------
+    #                               method _fastboot_loop
+    # ----------------------------------------------------------------------------
+    def _fastboot_loop(self):
+        while True:
+            serials = enumerate_fastboot_usb()
+            live = serials is not None
+            if serials is None and self._fastboot_waiters:
+                try:
+                    serials = fastboot_devices()
+                except Exception:
+                    serials = None
+            if serials is not None:
+                with self._cond:
+                    if live or self._fastboot_waiters:
+                        if serials != self.fastboot:
+                            debug(f"fastboot devices: {sorted(serials)}")
+                        self.fastboot = serials
+                        self._fastboot_polled = not live
+                    self.fastboot_live = live
+                    self._cond.notify_all()
+            time.sleep(FASTBOOT_POLL_INTERVAL if live else FASTBOOT_DEVICES_POLL_INTERVAL)
+
+    # ----------------------------------------------------------------------------
+    #                               method state
+    # ----------------------------------------------------------------------------
+    def state(self, serial):
+        """Returns the adb state, 'fastboot', or None if the device is not seen.
+
+        Without live fastboot enumeration, `fastboot devices` is run once.
+        """
+        with self._cond:
+            if serial in self.adb:
+                return self.adb[serial]
+            if self.fastboot_live:
+                return 'fastboot' if serial in self.fastboot else None
+        return 'fastboot' if serial in (fastboot_devices() or ()) else None
+
+    # ----------------------------------------------------------------------------
+    #                               method wait_for
+    # ----------------------------------------------------------------------------
+    def wait_for(self, serial, states, timeout):
+        """Blocks until the device reaches one of states (None means disconnected).
+
+        Returns the reached state (or 'disconnect'), or '' on timeout.
+        """
+        states = set(states)
+        deadline = time.monotonic() + timeout
+        # a device leaving the bus may leave from fastboot, that needs polling too
+        polls_fastboot = 'fastboot' in states or None in states
+        with self._cond:
+            if polls_fastboot:
+                self._fastboot_waiters += 1
+            try:
+                while True:
+                    if serial in self.adb:
+                        state = self.adb[serial]
+                    elif not (self.fastboot_live or self._fastboot_polled):
+                        # fastboot devices has not been polled for this wait yet, the device's state is unknown
+                        state = ''
+                    elif serial in self.fastboot:
+                        state = 'fastboot'
+                    else:
+                        state = None
+                    if state in states:
+                        return state or 'disconnect'
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return ''
+                    self._cond.wait(remaining)
+            finally:
+                if polls_fastboot:
+                    self._fastboot_waiters -= 1
+                    if not self._fastboot_waiters and not self.fastboot_live:
+                        # nobody polls any more, the set would only go stale
+                        self.fastboot = set()
+                        self._fastboot_polled = False
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+# ============================================================================
+#                               Function get_device_tracker
+# ============================================================================
+def get_device_tracker():
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = DeviceTracker()
+            _tracker.start()
+    return _tracker
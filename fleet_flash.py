@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+
+# This file is part of PixelFlasher https://github.com/badabing2005/PixelFlasher
+#
+# Copyright (C) 2025 Badabing2005
+# SPDX-FileCopyrightText: 2025 Badabing2005
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+# for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+# Also add information on how to contact you by electronic and paper mail.
+#
+# If your software can interact with users remotely through a computer network,
+# you should also make sure that it provides a way for users to get its source.
+# For example, if your program is a web application, its interface could
+# display a "Source" link that leads users to an archive of the code. There are
+# many ways you could offer source, and different solutions will be better for
+# different programs; see section 13 for the specific requirements.
+#
+# You should also get your employer (if you work as a programmer) or school, if
+# any, to sign a "copyright disclaimer" for the program, if necessary. For more
+# information on this, and how to apply and follow the GNU AGPL, see
+# <https://www.gnu.org/licenses/>.
+
+import concurrent.futures
+import os
+import re
+import subprocess
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from constants import *
+from device_tracker import ADB_READY_STATES, get_device_tracker
+from runtime import debug, get_adb, get_fastboot, puml, run_shell
+
+
+# ============================================================================
+#                               Class FleetStep
+# ============================================================================
+class FleetStep():
+    def __init__(self, action, args=(), usb=False):
+        # Instance variables
+        self.action = action    # flash, update, reboot-bootloader, sleep or reboot
+        self.args = args
+        self.usb = usb          # transfers images, runs in one of the USB slots
+
+    @property
+    def label(self):
+        if self.action == 'flash':
+            return f"flash {self.args[0]}"
+        if self.action == 'update':
+            return f"update {os.path.basename(self.args[0])}"
+        if self.action == 'sleep':
+            return f"sleep {self.args[0]}"
+        return self.action
+
+
+# ============================================================================
+#                               Class FleetPlan
+# ============================================================================
+class FleetPlan():
+    """What gets flashed on every device of the fleet that receives one firmware.
+
+    flash_file is the FlashFile list process_flash_all_file parses from the
+    firmware's flash-all script, it can be left None when prepare sets it.
+    prepare(plan) -> 0 / -1 is the once per firmware preparation (extraction,
+    patching ...), it runs a single time however many devices share the plan.
+    hardware is the firmware's model, a device whose fastboot product is not
+    part of it is not flashed ('' skips the check).
+    """
+    def __init__(self, firmware_id, package_dir, flash_file=None, wipe=False, boot_image='', boot_partition='boot', fastboot_options='', reboot=True, prepare=None, hardware=''):
+        # Instance variables
+        self.firmware_id = firmware_id
+        self.package_dir = package_dir
+        self.hardware = hardware
+        self.flash_file = flash_file
+        self.wipe = wipe
+        self.boot_image = boot_image
+        self.boot_partition = boot_partition
+        self.fastboot_options = fastboot_options
+        self.reboot = reboot
+        self.prepare = prepare
+        self.steps = []
+
+    # ----------------------------------------------------------------------------
+    #                               method build_steps
+    # ----------------------------------------------------------------------------
+    def build_steps(self):
+        steps = []
+        for f in self.flash_file or []:
+            if f.type == 'sleep':
+                # sleep 5 / ping -n 5 127.0.0.1 >nul
+                match = re.search(r"\b(\d+)\b", f.command)
+                steps.append(FleetStep('sleep', (int(match[1]) if match else 5,)))
+            elif f.action == 'flash':
+                steps.append(FleetStep('flash', (f.arg1, os.path.join(self.package_dir, f.arg2)), usb=True))
+            elif f.action == 'reboot-bootloader':
+                steps.append(FleetStep('reboot-bootloader'))
+            elif f.action == '-w update':
+                steps.append(FleetStep('update', (os.path.join(self.package_dir, f.arg1),), usb=True))
+        if self.boot_image:
+            steps.append(FleetStep('flash', (self.boot_partition, self.boot_image), usb=True))
+        if self.reboot:
+            steps.append(FleetStep('reboot'))
+        self.steps = steps
+        return steps
+
+
+# ============================================================================
+#                               Class FleetStatus
+# ============================================================================
+class FleetStatus():
+    def __init__(self, serial, firmware_id):
+        # Instance variables
+        self.serial = serial
+        self.firmware_id = firmware_id
+        self.state = 'pending'  # pending, bootloader, checking, preparing, waiting, flashing, done, failed or cancelled
+        self.step = 0
+        self.total = 0
+        self.message = ''
+        self.error = ''
+        self.start = None
+        self.end = None
+
+    @property
+    def elapsed(self):
+        if self.start is None:
+            return 0
+        return (self.end or time.time()) - self.start
+
+    def __str__(self):
+        text = f"{self.serial:<25}{self.state:<11}{self.step:>3}/{self.total:<3} {self.elapsed:7.1f}s  {self.message}"
+        if self.error:
+            text += f"  ({self.error})"
+        return text
+
+
+# ============================================================================
+#                               Class FleetFlasher
+# ============================================================================
+class FleetFlasher():
+    """Flashes a set of devices concurrently, without any UI.
+
+    Each device runs its own pipeline: reboot to the bootloader, wait for the
+    shared preparation of its firmware, then the plan's steps. Only usb_slots
+    devices run an image transfer (flash / update) at once, the others wait
+    for a free slot while reboots and sleeps proceed in parallel. One device
+    failing does not stop the others.
+
+    progress(status) is called with the device's FleetStatus on every change,
+    from the device's worker thread.
+    """
+    def __init__(self, jobs, usb_slots=FLEET_USB_SLOTS, reboot_timeout=FLEET_REBOOT_TIMEOUT, progress=None):
+        # jobs: {serial: FleetPlan}
+        self.jobs = jobs
+        self.usb_slots = max(1, usb_slots)
+        self.usb = threading.BoundedSemaphore(self.usb_slots)
+        self.reboot_timeout = reboot_timeout
+        self.progress = progress
+        self.status = {serial: FleetStatus(serial, plan.firmware_id) for serial, plan in jobs.items()}
+        self._lock = threading.Lock()
+        self._prepare_locks = {}
+        self._prepared = {}
+        self._cancel = threading.Event()
+
+    # ----------------------------------------------------------------------------
+    #                               method run
+    # ----------------------------------------------------------------------------
+    def run(self):
+        """Runs all the pipelines and returns {serial: 0 on success, -1 on failure}."""
+        if not self.jobs:
+            return {}
+        print(f"\n{datetime.now():%Y-%m-%d %H:%M:%S} Flashing {len(self.jobs)} devices, {self.usb_slots} at a time ...")
+        puml(f":Fleet flashing {len(self.jobs)} devices;\n", True)
+        start = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.jobs), thread_name_prefix='fleet') as executor:
+            futures = [executor.submit(self._pipeline, serial, plan) for serial, plan in self.jobs.items()]
+            concurrent.futures.wait(futures)
+        print(f"\nFleet flashing summary ({time.time() - start:.0f} seconds):")
+        for status in self.status.values():
+            print(f"    {status}")
+        return {serial: 0 if status.state == 'done' else -1 for serial, status in self.status.items()}
+
+    # ----------------------------------------------------------------------------
+    #                               method cancel
+    # ----------------------------------------------------------------------------
+    def cancel(self):
+        """Stops every pipeline before its next step, a running step is not interrupted."""
+        self._cancel.set()
+
+    # ----------------------------------------------------------------------------
+    #                               method _update
+    # ----------------------------------------------------------------------------
+    def _update(self, status, state=None, message=None, error=None):
+        if state:
+            status.state = state
+        if message is not None:
+            status.message = message
+            debug(f"[{status.serial}] {message}")
+        if error:
+            status.error = error
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: [{status.serial}] {error}")
+        if self.progress:
+            try:
+                self.progress(status)
+            except Exception:
+                traceback.print_exc()
+
+    # ----------------------------------------------------------------------------
+    #                               method _pipeline
+    # ----------------------------------------------------------------------------
+    def _pipeline(self, serial, plan):
+        status = self.status[serial]
+        status.start = time.time()
+        try:
+            self._update(status, 'bootloader', "Rebooting to bootloader ...")
+            if not self._to_bootloader(serial):
+                return self._fail(status, "Device did not reach the bootloader.")
+
+            if plan.hardware:
+                self._update(status, 'checking', "Checking the device model ...")
+                product = self._get_product(serial)
+                if not (len(product) >= 3 and product in plan.hardware):
+                    return self._fail(status, f"Device model {product or 'UNKNOWN'} does not match firmware model {plan.hardware}.")
+
+            self._update(status, 'preparing', f"Preparing {plan.firmware_id} ...")
+            if self._prepare(plan) != 0:
+                return self._fail(status, f"Preparation of {plan.firmware_id} failed.")
+
+            status.total = len(plan.steps)
+            for i, step in enumerate(plan.steps, start=1):
+                if self._cancel.is_set():
+                    status.end = time.time()
+                    self._update(status, 'cancelled', f"Cancelled before {step.label}")
+                    return
+                status.step = i
+                if step.usb:
+                    self._update(status, 'waiting', f"Waiting for a USB slot to {step.label} ...")
+                    with self.usb:
+                        self._update(status, 'flashing', f"{step.label} ...")
+                        ok = self._run_step(serial, plan, step)
+                else:
+                    self._update(status, 'flashing', f"{step.label} ...")
+                    ok = self._run_step(serial, plan, step)
+                if not ok:
+                    return self._fail(status, f"Step {i}/{status.total} {step.label} failed.")
+            status.end = time.time()
+            self._update(status, 'done', f"Done in {status.elapsed:.0f} seconds")
+        except Exception as e:
+            traceback.print_exc()
+            self._fail(status, f"Exception: {e}")
+
+    # ----------------------------------------------------------------------------
+    #                               method _fail
+    # ----------------------------------------------------------------------------
+    def _fail(self, status, error):
+        status.end = time.time()
+        self._update(status, 'failed', error=error)
+
+    # ----------------------------------------------------------------------------
+    #                               method _prepare
+    # ----------------------------------------------------------------------------
+    def _prepare(self, plan):
+        # the first device to get here prepares the firmware, the others sharing it wait for the result.
+        with self._lock:
+            lock = self._prepare_locks.setdefault(plan.firmware_id, threading.Lock())
+        with lock:
+            if plan.firmware_id not in self._prepared:
+                start = time.time()
+                result = -1
+                try:
+                    result = plan.prepare(plan) if plan.prepare else 0
+                    if result == 0:
+                        plan.build_steps()
+                        if not plan.steps:
+                            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Nothing to flash for {plan.firmware_id}")
+                            result = -1
+                except Exception:
+                    traceback.print_exc()
+                    result = -1
+                debug(f"Preparation of {plan.firmware_id} took {time.time() - start:.1f}s, result: {result}")
+                self._prepared[plan.firmware_id] = result
+            return self._prepared[plan.firmware_id]
+
+    # ----------------------------------------------------------------------------
+    #                               method _to_bootloader
+    # ----------------------------------------------------------------------------
+    def _to_bootloader(self, serial):
+        tracker = get_device_tracker()
+        state = tracker.state(serial)
+        if state == 'fastboot':
+            return True
+        if state not in ADB_READY_STATES or not get_adb():
+            return False
+        res = run_shell(f"\"{get_adb()}\" -s {serial} reboot bootloader", timeout=60)
+        if not (res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0):
+            return False
+        return self._wait_for_fastboot(serial)
+
+    # ----------------------------------------------------------------------------
+    #                               method _get_product
+    # ----------------------------------------------------------------------------
+    def _get_product(self, serial):
+        # the model the bootloader reports, '' if it can't be read.
+        res = run_shell(f"\"{get_fastboot()}\" -s {serial} getvar product", timeout=30)
+        if not (res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0):
+            return ''
+        for line in f"{res.stderr}{res.stdout}".splitlines():
+            if line.startswith("product:"):
+                return line.split("product:", 1)[1].strip()
+        return ''
+
+    # ----------------------------------------------------------------------------
+    #                               method _wait_for_fastboot
+    # ----------------------------------------------------------------------------
+    def _wait_for_fastboot(self, serial):
+        tracker = get_device_tracker()
+        # let the device drop off the bus first, so the old entry isn't mistaken for the new one.
+        tracker.wait_for(serial, (None,), timeout=15)
+        return tracker.wait_for(serial, ('fastboot',), timeout=self.reboot_timeout) == 'fastboot'
+
+    # ----------------------------------------------------------------------------
+    #                               method _run_step
+    # ----------------------------------------------------------------------------
+    def _run_step(self, serial, plan, step):
+        fastboot = f"\"{get_fastboot()}\" -s {serial}"
+        if step.action == 'sleep':
+            self._cancel.wait(step.args[0])
+            return True
+        if step.action == 'flash':
+            theCmd = f"{fastboot} {plan.fastboot_options} flash {step.args[0]} \"{step.args[1]}\""
+        elif step.action == 'update':
+            wipe = '-w ' if plan.wipe else ''
+            theCmd = f"{fastboot} {plan.fastboot_options} --skip-reboot {wipe}update \"{step.args[0]}\""
+        elif step.action == 'reboot-bootloader':
+            theCmd = f"{fastboot} reboot-bootloader"
+        elif step.action == 'reboot':
+            theCmd = f"{fastboot} reboot"
+        else:
+            return False
+        debug(theCmd)
+        res = run_shell(theCmd)
+        if not (res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0):
+            if res and isinstance(res, subprocess.CompletedProcess):
+                debug(f"[{serial}] Return Code: {res.returncode}\nStdout: {res.stdout}\nStderr: {res.stderr}")
+            return False
+        if step.action == 'reboot-bootloader':
+            return self._wait_for_fastboot(serial)
+        return True
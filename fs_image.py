@@ -0,0 +1,634 @@
+#!/usr/bin/env python
+
+# This file is part of PixelFlasher https://github.com/badabing2005/PixelFlasher
+#
+# Copyright (C) 2025 Badabing2005
+# SPDX-FileCopyrightText: 2025 Badabing2005
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+# for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+# Also add information on how to contact you by electronic and paper mail.
+#
+# If your software can interact with users remotely through a computer network,
+# you should also make sure that it provides a way for users to get its source.
+# For example, if your program is a web application, its interface could
+# display a "Source" link that leads users to an archive of the code. There are
+# many ways you could offer source, and different solutions will be better for
+# different programs; see section 13 for the specific requirements.
+#
+# You should also get your employer (if you work as a programmer) or school, if
+# any, to sign a "copyright disclaimer" for the program, if necessary. For more
+# information on this, and how to apply and follow the GNU AGPL, see
+# <https://www.gnu.org/licenses/>.
+
+# Read only access to files inside ext4 and EROFS partition images (raw or
+# Android sparse), reading only the metadata and data blocks on the way to the
+# file. Used to get build.prop out of system / vendor / product images without
+# extracting them. The image can be any seekable file object, a member of a
+# zip included.
+
+import bisect
+import struct
+import tempfile
+import zipfile
+import zlib
+from collections import OrderedDict
+
+import lz4.block
+
+EXT4_MAGIC = 0xEF53
+EROFS_MAGIC = 0xE0F5E1E2
+SPARSE_MAGIC = 0xED26FF3A
+
+EXT4_ROOT_INO = 2
+EXT4_INDEX_FL = 0x1000
+EXT4_EXTENTS_FL = 0x80000
+EXT4_INLINE_DATA_FL = 0x10000000
+EXT4_EXTENT_MAGIC = 0xF30A
+EXT4_INCOMPAT_64BIT = 0x80
+
+EROFS_FLAT_PLAIN = 0
+EROFS_COMPRESSED_FULL = 1
+EROFS_FLAT_INLINE = 2
+EROFS_COMPRESSED_COMPACT = 3
+EROFS_CHUNK_BASED = 4
+EROFS_NULL_ADDR = 0xFFFFFFFF
+EROFS_INCOMPAT_ZERO_PADDING = 0x1
+
+Z_EROFS_LCLUSTER_PLAIN = 0
+Z_EROFS_LCLUSTER_HEAD1 = 1
+Z_EROFS_LCLUSTER_NONHEAD = 2
+Z_EROFS_LCLUSTER_HEAD2 = 3
+Z_EROFS_LI_D0_CBLKCNT = 1 << 11
+Z_EROFS_ADVISE_COMPACTED_2B = 0x1
+Z_EROFS_ADVISE_BIG_PCLUSTER_1 = 0x2
+Z_EROFS_ADVISE_BIG_PCLUSTER_2 = 0x4
+Z_EROFS_ADVISE_INLINE_PCLUSTER = 0x8
+Z_EROFS_ADVISE_INTERLACED_PCLUSTER = 0x10
+Z_EROFS_ADVISE_FRAGMENT_PCLUSTER = 0x20
+Z_EROFS_LZ4 = 0
+Z_EROFS_DEFLATE = 2
+
+S_IFMT = 0xF000
+S_IFDIR = 0x4000
+
+
+# ============================================================================
+#                               Class FsImageError
+# ============================================================================
+class FsImageError(Exception):
+    """The image is corrupt or uses a layout this reader does not handle."""
+
+
+# ============================================================================
+#                               Class ImageSource
+# ============================================================================
+class ImageSource():
+    """Random access reads from a seekable file object, with a small block cache.
+
+    Metadata is read in small pieces, often the same blocks more than once;
+    the cache keeps that from turning into seeks on the file object.
+    A compressed zip member is only ever read forward (a backward seek would
+    inflate it again from the start), what was inflated is spooled to a
+    temporary file and blocks behind the read position are read from there.
+    """
+    def __init__(self, fileobj, block_size=64 * 1024, cache_blocks=512):
+        # Instance variables
+        self.fileobj = fileobj
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.cache = OrderedDict()
+        self.spool = None
+        if isinstance(fileobj, zipfile.ZipExtFile) and getattr(fileobj, '_compress_type', zipfile.ZIP_STORED) != zipfile.ZIP_STORED:
+            fileobj.seek(0)
+            self.spool = tempfile.TemporaryFile()
+
+    def _read_block(self, offset):
+        if self.spool is None:
+            self.fileobj.seek(offset)
+            return self.fileobj.read(self.block_size)
+        spooled = self.spool.seek(0, 2)
+        if offset + self.block_size > spooled:
+            # copy forward from the member up to the end of the block, never seeking it back
+            remaining = offset + self.block_size - spooled
+            while remaining > 0:
+                data = self.fileobj.read(max(remaining, 1024 * 1024))
+                if not data:
+                    break
+                self.spool.write(data)
+                remaining -= len(data)
+        self.spool.seek(offset)
+        return self.spool.read(self.block_size)
+
+    def _block(self, index):
+        data = self.cache.get(index)
+        if data is None:
+            data = self._read_block(index * self.block_size)
+            self.cache[index] = data
+            if len(self.cache) > self.cache_blocks:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(index)
+        return data
+
+    def read(self, offset, size):
+        out = bytearray()
+        while size > 0:
+            index, start = divmod(offset, self.block_size)
+            data = self._block(index)[start:start + size]
+            if not data:
+                break
+            out += data
+            offset += len(data)
+            size -= len(data)
+        return bytes(out)
+
+
+# ============================================================================
+#                               Class SparseSource
+# ============================================================================
+class SparseSource():
+    """Reads the raw image an Android sparse image expands to.
+
+    Only chunk headers are read up front, RAW chunk data is read on demand
+    and FILL / DONT_CARE chunks never touch the file.
+    """
+    RAW = 0xCAC1
+    FILL = 0xCAC2
+    DONT_CARE = 0xCAC3
+    CRC32 = 0xCAC4
+
+    def __init__(self, source):
+        # Instance variables
+        self.source = source
+        self.starts = []
+        self.chunks = []
+        header = source.read(0, 28)
+        magic, major, minor, file_hdr_sz, chunk_hdr_sz, blk_sz, total_blks, total_chunks, checksum = struct.unpack('<IHHHHIIII', header)
+        if magic != SPARSE_MAGIC:
+            raise FsImageError("Not a sparse image")
+        offset = file_hdr_sz
+        position = 0
+        for _ in range(total_chunks):
+            chunk_type, reserved, chunk_sz, total_sz = struct.unpack('<HHII', source.read(offset, 12))
+            size = chunk_sz * blk_sz
+            if chunk_type == self.RAW:
+                self.chunks.append((size, 'raw', offset + chunk_hdr_sz))
+            elif chunk_type == self.FILL:
+                self.chunks.append((size, 'fill', source.read(offset + chunk_hdr_sz, 4)))
+            elif chunk_type == self.DONT_CARE:
+                self.chunks.append((size, 'fill', bytes(4)))
+            elif chunk_type != self.CRC32:
+                raise FsImageError(f"Unknown sparse chunk type 0x{chunk_type:04X}")
+            if chunk_type != self.CRC32:
+                self.starts.append(position)
+                position += size
+            offset += total_sz
+        self.size = position
+
+    def read(self, offset, size):
+        out = bytearray()
+        while size > 0 and offset < self.size:
+            i = bisect.bisect_right(self.starts, offset) - 1
+            chunk_size, kind, where = self.chunks[i]
+            start = offset - self.starts[i]
+            count = min(size, chunk_size - start)
+            if kind == 'raw':
+                out += self.source.read(where + start, count)
+            else:
+                pattern = where * (count // 4 + 2)
+                out += pattern[start % 4:start % 4 + count]
+            offset += count
+            size -= count
+        return bytes(out)
+
+
+# ============================================================================
+#                               Class Ext4Image
+# ============================================================================
+class Ext4Image():
+    """Read only ext4 (and ext2/3) file lookup: extents, block maps and inline data."""
+    def __init__(self, source):
+        # Instance variables
+        self.source = source
+        sb = source.read(1024, 1024)
+        if len(sb) < 1024 or struct.unpack_from('<H', sb, 56)[0] != EXT4_MAGIC:
+            raise FsImageError("Not an ext4 image")
+        first_data_block, log_block_size = struct.unpack_from('<II', sb, 20)
+        self.block_size = 1024 << log_block_size
+        self.inodes_per_group = struct.unpack_from('<I', sb, 40)[0]
+        rev_level = struct.unpack_from('<I', sb, 76)[0]
+        self.inode_size = struct.unpack_from('<H', sb, 88)[0] if rev_level >= 1 else 128
+        incompat = struct.unpack_from('<I', sb, 96)[0]
+        self.desc_size = 32
+        if incompat & EXT4_INCOMPAT_64BIT:
+            self.desc_size = struct.unpack_from('<H', sb, 254)[0] or 32
+        self.gdt_offset = (first_data_block + 1) * self.block_size
+
+    def inode(self, ino):
+        group, index = divmod(ino - 1, self.inodes_per_group)
+        desc = self.source.read(self.gdt_offset + group * self.desc_size, self.desc_size)
+        table = struct.unpack_from('<I', desc, 8)[0]
+        if self.desc_size >= 64:
+            table |= struct.unpack_from('<I', desc, 0x28)[0] << 32
+        raw = self.source.read(table * self.block_size + index * self.inode_size, 128)
+        mode = struct.unpack_from('<H', raw, 0)[0]
+        size = struct.unpack_from('<I', raw, 4)[0] | (struct.unpack_from('<I', raw, 108)[0] << 32)
+        flags = struct.unpack_from('<I', raw, 32)[0]
+        return mode, size, flags, raw[40:100]
+
+    def extents(self, node):
+        # [(logical block, block count, physical block)] of an extent tree node
+        magic, entries, maximum, depth = struct.unpack_from('<HHHH', node, 0)
+        if magic != EXT4_EXTENT_MAGIC:
+            raise FsImageError("Bad extent header")
+        found = []
+        for i in range(entries):
+            if depth == 0:
+                block, length, start_hi, start_lo = struct.unpack_from('<IHHI', node, 12 + i * 12)
+                if length > 32768:
+                    # uninitialized extent, reads as zeros
+                    found.append((block, length - 32768, None))
+                else:
+                    found.append((block, length, (start_hi << 32) | start_lo))
+            else:
+                block, leaf_lo, leaf_hi = struct.unpack_from('<IIH', node, 12 + i * 12)
+                found += self.extents(self.source.read(((leaf_hi << 32) | leaf_lo) * self.block_size, self.block_size))
+        return found
+
+    def mapped_blocks(self, i_block, count):
+        # [(logical block, 1, physical block)] of an inode using the ext2/3 block map
+        found = []
+        per_block = self.block_size // 4
+
+        def walk(block, level, logical):
+            if not block or logical >= count:
+                return
+            if level == 0:
+                found.append((logical, 1, block))
+                return
+            pointers = struct.unpack(f'<{per_block}I', self.source.read(block * self.block_size, self.block_size))
+            span = per_block ** (level - 1)
+            for i, pointer in enumerate(pointers):
+                walk(pointer, level - 1, logical + i * span)
+
+        pointers = struct.unpack('<15I', i_block)
+        for i in range(12):
+            walk(pointers[i], 0, i)
+        walk(pointers[12], 1, 12)
+        walk(pointers[13], 2, 12 + per_block)
+        walk(pointers[14], 3, 12 + per_block + per_block ** 2)
+        return found
+
+    def read_inode(self, ino):
+        mode, size, flags, i_block = self.inode(ino)
+        if flags & EXT4_INLINE_DATA_FL:
+            if size > len(i_block):
+                raise FsImageError("Inline data stored in extended attributes is not supported")
+            return i_block[:size]
+        count = (size + self.block_size - 1) // self.block_size
+        runs = self.extents(i_block) if flags & EXT4_EXTENTS_FL else self.mapped_blocks(i_block, count)
+        out = bytearray(count * self.block_size)
+        for block, length, physical in runs:
+            length = min(length, count - block)
+            if physical is None or length <= 0:
+                continue
+            out[block * self.block_size:(block + length) * self.block_size] = self.source.read(physical * self.block_size, length * self.block_size).ljust(length * self.block_size, b'\0')
+        return bytes(out[:size])
+
+    def lookup(self, path):
+        ino = EXT4_ROOT_INO
+        for name in [part for part in path.split('/') if part]:
+            mode, size, flags, i_block = self.inode(ino)
+            if mode & S_IFMT != S_IFDIR:
+                return None
+            data = self.read_inode(ino)
+            if flags & EXT4_INLINE_DATA_FL:
+                # inline directories start with the parent inode number
+                data = data[4:]
+            ino = self.find_entry(data, name.encode())
+            if not ino:
+                return None
+        return ino
+
+    @staticmethod
+    def find_entry(data, name):
+        # Linear scan, this also covers hashed (htree) directories whose index blocks read as empty entries
+        offset = 0
+        while offset + 8 <= len(data):
+            ino, rec_len, name_len = struct.unpack_from('<IHB', data, offset)
+            if rec_len < 8:
+                break
+            if ino and data[offset + 8:offset + 8 + name_len] == name:
+                return ino
+            offset += rec_len
+        return None
+
+    def read_file(self, path):
+        ino = self.lookup(path)
+        return None if ino is None else self.read_inode(ino)
+
+
+# ============================================================================
+#                               Class ErofsImage
+# ============================================================================
+class ErofsImage():
+    """Read only EROFS file lookup: plain, inline, chunk based and lz4 / deflate compressed files.
+
+    Compressed files are decoded from their full or compact lcluster
+    indexes, tail packing included. Fragments (files packed into the
+    packed inode), interlaced plain clusters and other algorithms raise
+    FsImageError.
+    """
+    def __init__(self, source):
+        # Instance variables
+        self.source = source
+        sb = source.read(1024, 128)
+        if len(sb) < 128 or struct.unpack_from('<I', sb, 0)[0] != EROFS_MAGIC:
+            raise FsImageError("Not an EROFS image")
+        self.blkszbits = sb[12]
+        self.block_size = 1 << self.blkszbits
+        self.root_nid = struct.unpack_from('<H', sb, 14)[0]
+        self.meta_blkaddr = struct.unpack_from('<I', sb, 40)[0]
+        self.feature_incompat = struct.unpack_from('<I', sb, 80)[0]
+
+    def inode(self, nid):
+        offset = self.meta_blkaddr * self.block_size + nid * 32
+        raw = self.source.read(offset, 64)
+        i_format, xattr_icount, mode = struct.unpack_from('<HHH', raw, 0)
+        extended = i_format & 1
+        inode = {
+            'offset': offset,
+            'layout': (i_format >> 1) & 7,
+            'mode': mode,
+            'size': struct.unpack_from('<Q' if extended else '<I', raw, 8)[0],
+            'i_u': struct.unpack_from('<I', raw, 16)[0],
+            'isize': 64 if extended else 32,
+            'xattr_size': 12 + (xattr_icount - 1) * 4 if xattr_icount else 0,
+        }
+        inode['end'] = offset + inode['isize'] + inode['xattr_size']
+        return inode
+
+    def read_inode(self, nid):
+        inode = self.inode(nid)
+        layout = inode['layout']
+        size = inode['size']
+        bs = self.block_size
+        if layout == EROFS_FLAT_PLAIN:
+            return self.source.read(inode['i_u'] * bs, size)
+        if layout == EROFS_FLAT_INLINE:
+            last = max((size + bs - 1) // bs - 1, 0)
+            head = self.source.read(inode['i_u'] * bs, last * bs) if last else b''
+            return head + self.source.read(inode['end'], size - last * bs)
+        if layout == EROFS_CHUNK_BASED:
+            return self.read_chunked(inode)
+        if layout in (EROFS_COMPRESSED_FULL, EROFS_COMPRESSED_COMPACT):
+            return self.read_compressed(inode)
+        raise FsImageError(f"Unknown EROFS data layout {layout}")
+
+    def read_chunked(self, inode):
+        chunk_format = inode['i_u'] & 0xFFFF
+        chunk_size = 1 << (self.blkszbits + (chunk_format & 0x1F))
+        unit = 8 if chunk_format & 0x20 else 4
+        count = (inode['size'] + chunk_size - 1) // chunk_size
+        position = (inode['end'] + unit - 1) // unit * unit
+        table = self.source.read(position, count * unit)
+        out = bytearray()
+        for i in range(count):
+            blkaddr = struct.unpack_from('<I', table, i * unit + (4 if unit == 8 else 0))[0]
+            length = min(chunk_size, inode['size'] - i * chunk_size)
+            out += bytes(length) if blkaddr == EROFS_NULL_ADDR else self.source.read(blkaddr * self.block_size, length)
+        return bytes(out)
+
+    def read_compressed(self, inode):
+        size = inode['size']
+        header_pos = (inode['end'] + 7) // 8 * 8
+        header = self.source.read(header_pos, 8)
+        idata_size, advise, algorithm_type, cluster_bits = struct.unpack_from('<2xHHBB', header, 0)
+        if advise & (Z_EROFS_ADVISE_FRAGMENT_PCLUSTER | Z_EROFS_ADVISE_INTERLACED_PCLUSTER) or cluster_bits & 0x80:
+            raise FsImageError("EROFS fragments and interlaced clusters are not supported")
+        lclusterbits = self.blkszbits + (cluster_bits & 7)
+        lcluster_size = 1 << lclusterbits
+        total = (size + lcluster_size - 1) // lcluster_size
+        # Z_EROFS_FULL_INDEX_ALIGN: full indexes start after the map header and 8 more bytes of legacy padding
+        if inode['layout'] == EROFS_COMPRESSED_FULL:
+            index_pos = header_pos + 16
+        else:
+            index_pos = header_pos + 8
+        index = ZErofsIndex(self, inode, index_pos, advise, lclusterbits, total)
+
+        # heads: [(logical start, type, physical block, compressed blocks)]
+        # a big pcluster stores its block count in the lcluster following its head
+        heads = []
+        head_lcn = None
+        for lcn in range(total):
+            entry = index.load(lcn)
+            if entry['type'] != Z_EROFS_LCLUSTER_NONHEAD:
+                head_lcn = lcn
+                heads.append(((lcn << lclusterbits) + entry['clusterofs'], entry['type'], entry['pblk'], 1))
+            elif lcn == head_lcn + 1 and entry['cblks'] and advise & (Z_EROFS_ADVISE_BIG_PCLUSTER_2 if heads[-1][1] == Z_EROFS_LCLUSTER_HEAD2 else Z_EROFS_ADVISE_BIG_PCLUSTER_1):
+                heads[-1] = heads[-1][:3] + (entry['cblks'],)
+        idata_offset = index.load(total - 1)['nextpackoff'] if advise & Z_EROFS_ADVISE_INLINE_PCLUSTER and total else None
+
+        out = bytearray()
+        for i, (start, kind, pblk, cblks) in enumerate(heads):
+            end = heads[i + 1][0] if i + 1 < len(heads) else size
+            length = end - start
+            if length <= 0:
+                continue
+            if idata_offset is not None and end == size:
+                pcluster = self.source.read(idata_offset, idata_size)
+            else:
+                pcluster = self.source.read(pblk * self.block_size, cblks * self.block_size)
+            if kind == Z_EROFS_LCLUSTER_PLAIN:
+                out += pcluster[:length]
+                continue
+            algorithm = algorithm_type & 0xF if kind == Z_EROFS_LCLUSTER_HEAD1 else algorithm_type >> 4
+            out += self.decompress(algorithm, pcluster, length)
+        if len(out) != size:
+            raise FsImageError("EROFS compressed file does not decode to its size")
+        return bytes(out)
+
+    def decompress(self, algorithm, pcluster, length):
+        if self.feature_incompat & EROFS_INCOMPAT_ZERO_PADDING:
+            # compressed data is aligned to the end of the pcluster, zero padded in front
+            pcluster = pcluster.lstrip(b'\0')
+        elif algorithm == Z_EROFS_LZ4:
+            raise FsImageError("EROFS lz4 without zero padding is not supported")
+        if algorithm == Z_EROFS_LZ4:
+            capacity = length
+            while True:
+                try:
+                    return lz4.block.decompress(pcluster, uncompressed_size=capacity)[:length]
+                except lz4.block.LZ4BlockError:
+                    if capacity > length * 16:
+                        raise FsImageError("Could not decode an lz4 pcluster")
+                    capacity *= 2
+        if algorithm == Z_EROFS_DEFLATE:
+            return zlib.decompressobj(-15).decompress(pcluster)[:length]
+        raise FsImageError(f"EROFS compression algorithm {algorithm} is not supported")
+
+    def lookup(self, path):
+        nid = self.root_nid
+        for name in [part for part in path.split('/') if part]:
+            inode = self.inode(nid)
+            if inode['mode'] & S_IFMT != S_IFDIR:
+                return None
+            nid = self.find_entry(self.read_inode(nid), name.encode())
+            if nid is None:
+                return None
+        return nid
+
+    def find_entry(self, data, name):
+        for block_start in range(0, len(data), self.block_size):
+            block = data[block_start:block_start + self.block_size]
+            if len(block) < 12:
+                break
+            count = struct.unpack_from('<H', block, 8)[0] // 12
+            for i in range(count):
+                nid, nameoff = struct.unpack_from('<QH', block, i * 12)
+                nameend = struct.unpack_from('<H', block, (i + 1) * 12 + 8)[0] if i + 1 < count else len(block)
+                entry = block[nameoff:nameend]
+                if i + 1 == count:
+                    entry = entry.split(b'\0')[0]
+                if entry == name:
+                    return nid
+        return None
+
+    def read_file(self, path):
+        nid = self.lookup(path)
+        return None if nid is None else self.read_inode(nid)
+
+
+# ============================================================================
+#                               Class ZErofsIndex
+# ============================================================================
+class ZErofsIndex():
+    """Logical cluster indexes of a compressed EROFS inode, full or compact (as the kernel decodes them)."""
+    def __init__(self, image, inode, ebase, advise, lclusterbits, total):
+        # Instance variables
+        self.image = image
+        self.compact = inode['layout'] == EROFS_COMPRESSED_COMPACT
+        self.ebase = ebase
+        self.advise = advise
+        self.lclusterbits = lclusterbits
+        self.total = total
+        self.big_pcluster = advise & Z_EROFS_ADVISE_BIG_PCLUSTER_1
+        self.lobits = max(lclusterbits, 12)     # ilog2(Z_EROFS_LI_D0_CBLKCNT) + 1
+        initial = (32 - ebase % 32) // 4
+        self.initial_4b = 0 if initial == 8 else initial
+        self.compacted_2b = 0
+        if advise & Z_EROFS_ADVISE_COMPACTED_2B and self.initial_4b < total:
+            self.compacted_2b = (total - self.initial_4b) // 16 * 16
+
+    def load(self, lcn):
+        if not self.compact:
+            position = self.ebase + lcn * 8
+            di_advise, clusterofs, di_u = struct.unpack('<HHI', self.image.source.read(position, 8))
+            entry = {'type': di_advise & 3, 'clusterofs': clusterofs, 'pblk': di_u, 'cblks': 0, 'nextpackoff': position + 8}
+            if entry['type'] == Z_EROFS_LCLUSTER_NONHEAD:
+                delta0 = di_u & 0xFFFF
+                entry['clusterofs'] = 1 << self.lclusterbits
+                if delta0 & Z_EROFS_LI_D0_CBLKCNT:
+                    entry['cblks'] = delta0 & ~Z_EROFS_LI_D0_CBLKCNT
+            return entry
+
+        position = self.ebase
+        if lcn < self.initial_4b:
+            shift = 2
+        else:
+            position += self.initial_4b * 4
+            lcn -= self.initial_4b
+            if lcn < self.compacted_2b:
+                shift = 1
+            else:
+                position += self.compacted_2b * 2
+                lcn -= self.compacted_2b
+                shift = 2
+        position += lcn << shift
+        if shift == 2 and self.lclusterbits <= 14:
+            vcnt = 2
+        elif shift == 1 and self.lclusterbits <= 12:
+            vcnt = 16
+        else:
+            raise FsImageError("Unsupported EROFS compact index")
+        pack_size = vcnt << shift
+        pack_start = position // pack_size * pack_size
+        pack = self.image.source.read(pack_start, pack_size)
+        encodebits = (pack_size - 4) * 8 // vcnt
+        i = (position - pack_start) >> shift
+
+        def decode(i):
+            bit = encodebits * i
+            value = int.from_bytes(pack[bit // 8:bit // 8 + 4].ljust(4, b'\0'), 'little') >> (bit & 7)
+            return value & ((1 << self.lobits) - 1), (value >> self.lobits) & 3
+
+        lo, kind = decode(i)
+        entry = {'type': kind, 'clusterofs': lo, 'pblk': 0, 'cblks': 0, 'nextpackoff': pack_start + pack_size}
+        if kind == Z_EROFS_LCLUSTER_NONHEAD:
+            entry['clusterofs'] = 1 << self.lclusterbits
+            if lo & Z_EROFS_LI_D0_CBLKCNT:
+                entry['cblks'] = lo & ~Z_EROFS_LI_D0_CBLKCNT
+            return entry
+        nblk = 0 if self.big_pcluster else 1
+        while i > 0:
+            i -= 1
+            lo, kind = decode(i)
+            if not self.big_pcluster:
+                if kind == Z_EROFS_LCLUSTER_NONHEAD:
+                    i -= lo
+                if i >= 0:
+                    nblk += 1
+            elif kind == Z_EROFS_LCLUSTER_NONHEAD:
+                if lo & Z_EROFS_LI_D0_CBLKCNT:
+                    i -= 1
+                    nblk += lo & ~Z_EROFS_LI_D0_CBLKCNT
+                    continue
+                if lo <= 1:
+                    raise FsImageError("Corrupt EROFS compact index")
+                i -= lo - 2
+            else:
+                nblk += 1
+        entry['pblk'] = struct.unpack_from('<I', pack, pack_size - 4)[0] + nblk
+        return entry
+
+
+# ============================================================================
+#                               Function open_image
+# ============================================================================
+def open_image(fileobj):
+    # Returns an Ext4Image or ErofsImage for a seekable file object (raw or sparse image), FsImageError if it is neither.
+    source = ImageSource(fileobj)
+    if struct.unpack('<I', source.read(0, 4).ljust(4, b'\0'))[0] == SPARSE_MAGIC:
+        source = SparseSource(source)
+    magic = source.read(1024, 4).ljust(4, b'\0')
+    if struct.unpack('<I', magic)[0] == EROFS_MAGIC:
+        return ErofsImage(source)
+    if struct.unpack_from('<H', source.read(1024 + 56, 2).ljust(2, b'\0'))[0] == EXT4_MAGIC:
+        return Ext4Image(source)
+    raise FsImageError("Not an ext4 or EROFS image")
+
+
+# ============================================================================
+#                               Function read_image_file
+# ============================================================================
+def read_image_file(fileobj, paths):
+    # Returns (path, contents) for the first of paths present in the image, None if none is.
+    image = open_image(fileobj)
+    for path in paths:
+        data = image.read_file(path)
+        if data is not None:
+            return path, data
+    return None
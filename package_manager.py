@@ -43,26 +43,17 @@ import darkdetect
 import traceback
 import wx
 import wx.html
-import wx.lib.mixins.listctrl as listmix
 import wx.lib.wxpTag
 import contextlib
 
 import images as images
 from runtime import *
+from virtual_list import ListModel, VirtualListCtrl
 
 from datetime import datetime, timedelta
 from i18n import _
 
 
-# ============================================================================
-#                               Class ListCtrl
-# ============================================================================
-class ListCtrl(wx.ListCtrl, listmix.ListCtrlAutoWidthMixin):
-    def __init__(self, parent, ID, pos=wx.DefaultPosition, size=wx.DefaultSize, style=0):
-        wx.ListCtrl.__init__(self, parent, ID, pos, size, style)
-        listmix.ListCtrlAutoWidthMixin.__init__(self)
-
-
 # ============================================================================
 #                               Class SuPermissionDialog
 # ============================================================================
@@ -182,7 +173,7 @@ class SuPermissionDialog(wx.Dialog):
 # ============================================================================
 #                               Class PackageManager
 # ============================================================================
-class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
+class PackageManager(wx.Dialog):
     def __init__(self, *args, simplified_mode=False, **kwargs):
         wx.Dialog.__init__(self, *args, **kwargs, style = wx.RESIZE_BORDER | wx.DEFAULT_DIALOG_STYLE)
         self.simplified_mode = simplified_mode
@@ -273,12 +264,14 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
         self.sm_up = self.il.Add(images.SmallUpArrow.GetBitmap())
         self.sm_dn = self.il.Add(images.SmallDnArrow.GetBitmap())
 
-        self.list  = ListCtrl(panel1, -1, size=wx.Size(-1, -1), style=wx.LC_REPORT | wx.LC_SINGLE_SEL | wx.BORDER_NONE)
+        self.model = ListModel(["Package", "Type", "Installed", "Enabled", "User 0", "Denylist", "UID", "Name"], search_columns=(0, 7))
+        self.list  = VirtualListCtrl(panel1, -1, self.model, size=wx.Size(-1, -1), style=wx.LC_REPORT | wx.LC_SINGLE_SEL | wx.BORDER_NONE)
         if sys.platform == "win32":
             self.list.SetHeaderAttr(wx.ItemAttr(wx.Colour('BLACK'),wx.Colour('DARK GREY'), wx.Font(wx.FontInfo(10).Bold())))
         self.list.SetImageList(self.il, wx.IMAGE_LIST_SMALL)
         self.list.EnableCheckBoxes(enable=True)
-        listmix.ColumnSorterMixin.__init__(self, 8)
+        self.list.SetSortImages(self.sm_dn, self.sm_up)
+        self.list.SetColumns()
 
         vSizer1.Add(self.list , 1, wx.ALL|wx.EXPAND, 5)
 
@@ -382,8 +375,8 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
             self.export_list_button.Bind(wx.EVT_BUTTON, self.OnExportList)
             # Enable checkboxes for full mode
             self.list.EnableCheckBoxes(enable=True)
-            self.list.Bind(wx.EVT_LIST_ITEM_CHECKED, self.OnItemCheck)
-            self.list.Bind(wx.EVT_LIST_ITEM_UNCHECKED, self.OnItemUncheck)
+            self.Bind(wx.EVT_LIST_ITEM_CHECKED, self.OnItemCheck, self.list)
+            self.Bind(wx.EVT_LIST_ITEM_UNCHECKED, self.OnItemUncheck, self.list)
             self.all_checkbox.Bind(wx.EVT_CHECKBOX, self.OnAllCheckbox)
         else:
             # Simplified mode: disable checkboxes, enable double-click
@@ -415,101 +408,50 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     #              Function PopulateList
     # -----------------------------------------------
     def PopulateList(self):
-        info = wx.ListItem()
-        info.Mask = wx.LIST_MASK_TEXT | wx.LIST_MASK_IMAGE | wx.LIST_MASK_FORMAT
-        info.Image = -1
-        info.Align = 0
-        info.Width = -1
-        info.SetWidth(-1)
-        info.Text = "Package"
-        self.list.InsertColumn(0, info)
-
-        info.Align = wx.LIST_FORMAT_LEFT # 0
-        info.Text = "Type"
-        self.list.InsertColumn(1, info)
-
-        info.Align = wx.LIST_FORMAT_LEFT # 0
-        info.Text = "Installed"
-        self.list.InsertColumn(2, info)
-
-        info.Align = wx.LIST_FORMAT_LEFT # 0
-        info.Text = "Enabled"
-        self.list.InsertColumn(3, info)
-
-        info.Align = wx.LIST_FORMAT_LEFT # 0
-        info.Text = "User 0"
-        self.list.InsertColumn(4, info)
-
-        info.Align = wx.LIST_FORMAT_LEFT # 0
-        info.Text = "Denylist"
-        self.list.InsertColumn(5, info)
-
-        info.Align = wx.LIST_FORMAT_LEFT # 0
-        info.Text = "UID"
-        self.list.InsertColumn(6, info)
-
-        info.Align = wx.LIST_FORMAT_LEFT # 0
-        info.Text = "Name"
-        self.list.InsertColumn(7, info)
-
-        itemDataMap = {}
-        query = self.searchCtrl.GetValue().lower()
+        # (Re)loads self.packages in the list model, searching and sorting only change its view.
+        self.model.clear()
+        light = darkdetect.isLight()
+        for key, data in self.packages.items():
+            if not data.type:
+                self.model.append((key, '', '', '', '', '', '', ''))
+                continue
+            if not data.enabled:
+                colour = wx.LIGHT_GREY
+            elif data.type == 'System':
+                colour = wx.RED
+            elif light:
+                colour = wx.BLUE
+            else:
+                colour = wx.CYAN
+            self.model.append((key, data.type, data.installed, data.enabled, data.user0, data.magisk_denylist, data.uid, data.label), colour)
         if self.packages:
-            i = 0
-            items = self.packages.items()
-            for key, data in items:
-                alltext = f"{key.lower()} {str(data.label.lower())}"
-                if query.lower() in alltext:
-                    if data.type and ((data.type == 'System' and not self.show_system_apps) or (data.type == '3rd Party' and not self.show_user_apps)):
-                        continue  # Skip this item
-                    index = self.list.InsertItem(self.list.GetItemCount(), key)
-                    if data.type:
-                        itemDataMap[i + 1] = (key, data.type, data.installed, data.enabled, data.user0, data.magisk_denylist, data.uid, data.label)
-                        row = self.list.GetItem(index)
-                        self.list.SetItem(index, 1, data.type)
-                        self.list.SetItem(index, 2, str(data.installed))
-                        self.list.SetItem(index, 3, str(data.enabled))
-                        self.list.SetItem(index, 4, str(data.user0))
-                        self.list.SetItem(index, 5, str(data.magisk_denylist))
-                        self.list.SetItem(index, 6, str(data.uid))
-                        self.list.SetItem(index, 7, str(data.label))
-                        if data.type == 'System':
-                            row.SetTextColour(wx.RED)
-                        elif darkdetect.isLight():
-                            row.SetTextColour(wx.BLUE)
-                        else:
-                            row.SetTextColour(wx.CYAN)
-                        if not data.enabled:
-                            row.SetTextColour(wx.LIGHT_GREY)
-                        self.list.SetItem(row)
-                        self.list.SetItemData(index, i + 1)
-                    # hide image
-                    self.list.SetItemColumnImage(i, 0, -1)
-                    i += 1
             res = self.push_aapt2_if_needed()
-            self.message_label.Label = _("%s / %s Packages") % (str(i), self.package_count)
-        self.list.SetColumnWidth(0, -2)
-        grow_column(self.list, 0, 20)
-        self.list.SetColumnWidth(1, -2)
-        grow_column(self.list, 1, 20)
-        self.list.SetColumnWidth(2, -2)
-        grow_column(self.list, 2, 20)
-        self.list.SetColumnWidth(3, -2)
-        grow_column(self.list, 3, 20)
-        self.list.SetColumnWidth(4, -2)
-        grow_column(self.list, 4, 20)
-        self.list.SetColumnWidth(5, -2)
-        grow_column(self.list, 5, 20)
-        self.list.SetColumnWidth(6, -2)
-        grow_column(self.list, 6, 20)
-        self.list.SetColumnWidth(7, 200)
-        grow_column(self.list, 7, 20)
 
+    # -----------------------------------------------
+    #              Function FilterList
+    # -----------------------------------------------
+    def FilterList(self):
+        types = self.model.columns[1]
+
+        def is_shown(row):
+            type = types[row]
+            return not ((type == 'System' and not self.show_system_apps) or (type == '3rd Party' and not self.show_user_apps))
+
+        predicate = None if self.show_system_apps and self.show_user_apps else is_shown
         self.currentItem = 0
-        if itemDataMap:
-            return itemDataMap
-        else:
-            return -1
+        self.model.filter(self.searchCtrl.GetValue(), predicate)
+        self.list.RefreshView()
+        self.message_label.Label = _("%s / %s Packages") % (str(self.list.GetItemCount()), self.package_count)
+
+    # -----------------------------------------------
+    #              Function SizeColumns
+    # -----------------------------------------------
+    def SizeColumns(self):
+        for col in range(7):
+            self.list.SetColumnWidth(col, -2)
+            grow_column(self.list, col, 20)
+        self.list.SetColumnWidth(7, 200)
+        grow_column(self.list, 7, 20)
 
     # -----------------------------------------------
     #                  OnColClick
@@ -542,14 +484,10 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
                     package.path = path
             label, icon = self.device.get_package_label(pkg, path)
             if label != -1:
-                package.label = label
-                package.icon = icon
-                self.list.SetItem(self.currentItem, 7, label)
-                row_as_list = list(self.itemDataMap[self.currentItem + 1])
-                row_as_list[7] = label
-                self.itemDataMap[self.currentItem + 1] = row_as_list
-                labels[pkg] = label
-                set_labels(labels)
+                self.SetPackageLabel(self.currentItem, package, label, icon)
+                inventory = self.device.package_inventory
+                version_code = inventory.get(pkg, 'version_code') if inventory and pkg in inventory else ''
+                labels.store(pkg, label, icon, version_code, path if path != -1 else '')
         if not skip_details:
             path = package.path or package.path2
             self.details.SetValue(f"Application Name: {package.label}\nApplication Path: {path}\nApplication Icon: {package.icon}\n\n{package.details}")
@@ -560,8 +498,7 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     def Check_UncheckAll(self, state):
         # Set this so that we skip processing OnItemChecked, OnItemUnchecked events
         self.Set_all_cb_clicked (True)
-        itemcount = self.list.GetItemCount()
-        [self.list.CheckItem(item=i, check=state) for i in range(itemcount)]
+        self.list.CheckAll(state)
         if state:
             print("checking all Packages\n")
             self.EnableDisableButton(True)
@@ -576,14 +513,14 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     def OnSearch(self, event):
         query = self.searchCtrl.GetValue()
         print(f"Searching for: {query}")
-        self.Refresh()
+        self.FilterList()
 
     # -----------------------------------------------
     #                  onCancel
     # -----------------------------------------------
     def OnCancel(self, event):
         self.searchCtrl.SetValue("")
-        self.Refresh()
+        self.FilterList()
 
     # -----------------------------------------------
     #                  OnAllCheckbox
@@ -605,7 +542,7 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     def OnSystemAppsCheckbox(self, event):
         cb = event.GetEventObject()
         self.show_system_apps = cb.GetValue()
-        self.Refresh()
+        self.FilterList()
 
     # -----------------------------------------------
     #                  OnUserAppsCheckbox
@@ -613,7 +550,7 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     def OnUserAppsCheckbox(self, event):
         cb = event.GetEventObject()
         self.show_user_apps = cb.GetValue()
-        self.Refresh()
+        self.FilterList()
 
     # -----------------------------------------------
     #                  OnItemChecked
@@ -621,7 +558,7 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     def OnItemCheck(self, event):
         if self.Get_all_cb_clicked():
             return
-        print(f"{event.Item.Text} is checked")
+        print(f"{self.list.GetItemText(event.Index)} is checked")
         self.Update_all_checkbox()
 
     # -----------------------------------------------
@@ -630,7 +567,7 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     def OnItemUncheck(self, event):
         if self.Get_all_cb_clicked():
             return
-        print(f"{event.Item.Text} is unchecked")
+        print(f"{self.list.GetItemText(event.Index)} is unchecked")
         self.Update_all_checkbox()
 
     # -----------------------------------------------
@@ -669,11 +606,7 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     #         Function GetItemsCheckedCount
     # -----------------------------------------------
     def GetItemsCheckedCount(self):
-        checked_count = 0
-        for i in range(self.list.GetItemCount()):
-            if self.list.IsItemChecked(i):
-                checked_count += 1
-        return checked_count
+        return len(self.list.GetCheckedItems())
 
     # -----------------------------------------------
     #                  EnableDisableButton
@@ -695,11 +628,6 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
             return
         try:
             print(f"{datetime.now():%Y-%m-%d %H:%M:%S} User Pressed Close.")
-            labels = get_labels()
-            if (labels):
-                with open(get_labels_file_path(), "w", encoding='ISO-8859-1', errors="replace") as f:
-                    # Write the dictionary to the file in JSON format
-                    json.dump(labels, f, indent=4)
             # Delete aapt2 from the device
             res = self.device.delete("/data/local/tmp/aapt2", self.device.rooted)
         except Exception:
@@ -789,58 +717,69 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
             packages_to_process = selected_packages
             print(f"\nProcessing {len(packages_to_process)} selected packages (including those with existing labels)...")
         else:
-            # Process only packages without labels
+            # Process only packages without labels, or whose label was resolved for another build
             packages_to_process = []
+            inventory = self.device.package_inventory
             for i in range(self.list.GetItemCount()):
                 pkg = self.list.GetItemText(i)
                 package = self.device.packages[pkg]
                 if package.label == '':
                     packages_to_process.append((i, pkg, package))
-            print(f"\nNo selection made - processing {len(packages_to_process)} packages without labels...")
+                elif package.path and inventory and pkg in inventory and not labels.lookup(pkg, inventory.get(pkg, 'version_code'), package.path):
+                    packages_to_process.append((i, pkg, package))
+            print(f"\nNo selection made - processing {len(packages_to_process)} packages without up to date labels...")
 
         if not packages_to_process:
             print("All packages already have labels")
             self._on_spin('stop')
             return
 
-        total_packages = len(packages_to_process)
-        for idx, (i, pkg, package) in enumerate(packages_to_process):
-            print(f"Processing package {idx + 1}/{total_packages}: {pkg}")
-            if idx % 5 == 0:  # Update UI every 5 packages to keep it responsive
-                wx.YieldIfNeeded()
-
-            if package.path == '':
-                pkg_path = self.device.get_package_path(pkg, True)
-                if pkg_path == -1:
-                    continue
-                package.path = pkg_path
-
-            label, icon = self.device.get_package_label(pkg, package.path)
-            if label != -1 and label != '':
-                package.label = label
-                package.icon = icon
-                self.list.SetItem(i, 7, label)
-                row_as_list = list(self.itemDataMap[i + 1])
-                row_as_list[7] = label
-                self.itemDataMap[i + 1] = row_as_list
-                labels[pkg] = label
+        # labels already resolved for the installed build of a package are reused
+        inventory = self.device.package_inventory
+        pending = []
+        for i, pkg, package in packages_to_process:
+            version_code = inventory.get(pkg, 'version_code') if inventory and pkg in inventory else ''
+            cached = labels.lookup(pkg, version_code, package.path) if package.path else None
+            if cached and cached[0] != 'N/A':
+                self.SetPackageLabel(i, package, cached[0], cached[1])
+            else:
+                pending.append((i, pkg, package, version_code))
+        print(f"{len(packages_to_process) - len(pending)} labels found in the labels cache, {len(pending)} to resolve on the device.")
+
+        results = {}
+        if pending:
+            results = self.device.get_package_labels({pkg: package.path for i, pkg, package, version_code in pending})
+            if results == -1:
+                # the batch failed, nothing is marked N/A so the next attempt retries everything
+                print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not get application names.")
+                self._on_spin('stop')
+                return
+        resolved = []
+        for i, pkg, package, version_code in pending:
+            if pkg in results and results[pkg][0] != '':
+                label, icon, pkg_path = results[pkg]
             else:
                 # Set a placeholder label to avoid reprocessing this package in future runs
-                placeholder_label = "N/A"
-                package.label = placeholder_label
-                package.icon = ""
-                self.list.SetItem(i, 7, placeholder_label)
-                row_as_list = list(self.itemDataMap[i + 1])
-                row_as_list[7] = placeholder_label
-                self.itemDataMap[i + 1] = row_as_list
-                labels[pkg] = placeholder_label
-                print(f"  -> Using placeholder label: {placeholder_label}")
-
-        set_labels(labels)
+                label, icon, pkg_path = "N/A", "", package.path
+                print(f"  {pkg} -> Using placeholder label: {label}")
+            if pkg_path:
+                package.path = pkg_path
+            self.SetPackageLabel(i, package, label, icon)
+            resolved.append((pkg, label, icon, version_code, package.path))
+        labels.store_many(resolved)
+
         end = time.time()
         print(f"App names extraction time: {math.ceil(end - start)} seconds")
         self._on_spin('stop')
 
+    # -----------------------------------------------
+    #                  SetPackageLabel
+    # -----------------------------------------------
+    def SetPackageLabel(self, i, package, label, icon):
+        package.label = label
+        package.icon = icon
+        self.list.SetItemValue(i, 7, label)
+
     # -----------------------------------------------
     #                  OnExportList
     # -----------------------------------------------
@@ -934,20 +873,6 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
             traceback.print_exc()
             print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Failed to save the apk file '{pathname}'.")
 
-    # -----------------------------------------------
-    #                  GetListCtrl
-    # -----------------------------------------------
-    # Used by the ColumnSorterMixin, see wx/lib/mixins/listctrl.py
-    def GetListCtrl(self):
-        return self.list
-
-    # -----------------------------------------------
-    #                  GetSortImages
-    # -----------------------------------------------
-    # Used by the ColumnSorterMixin, see wx/lib/mixins/listctrl.py
-    def GetSortImages(self):
-        return (self.sm_dn, self.sm_up)
-
     # -----------------------------------------------
     #                  OnRightDown
     # -----------------------------------------------
@@ -964,8 +889,7 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     #                  getColumnText
     # -----------------------------------------------
     def getColumnText(self, index, col):
-        item = self.list.GetItem(index, col)
-        return item.GetText()
+        return self.list.GetItemText(index, col)
 
     # -----------------------------------------------
     #                  OnItemSelected
@@ -1126,9 +1050,9 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     def OnSuPermission(self, event):
         self._on_spin('start')
         index = self.currentItem
-        pkg = self.list.GetItem(index).Text
-        uid = self.list.GetItem(index, 6).Text
-        label = self.list.GetItem(index, 7).Text
+        pkg = self.list.GetItemText(index)
+        uid = self.list.GetItemText(index, 6)
+        label = self.list.GetItemText(index, 7)
         text = f"Set SU Permission for: {pkg} {uid} {label}"
         print(f"{text} ...")
 
@@ -1215,8 +1139,7 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     #                  OnCopyClipboard
     # -----------------------------------------------
     def OnCopyClipboard(self, event):
-        item = self.list.GetItem(self.currentItem)
-        pyperclip.copy(item.Text)
+        pyperclip.copy(self.list.GetItemText(self.currentItem))
 
     # -----------------------------------------------
     #                  Function Refresh
@@ -1225,10 +1148,9 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
         self.list.Freeze()
         print("Refreshing the packages ...\n")
         self._on_spin('start')
-        self.list.ClearAll()
-        itemDataMap = self.PopulateList()
-        if itemDataMap != -1:
-            self.itemDataMap = itemDataMap
+        self.PopulateList()
+        self.FilterList()
+        self.SizeColumns()
         self._on_spin('stop')
         self.list.Thaw()
 
@@ -1236,15 +1158,14 @@ class PackageManager(wx.Dialog, listmix.ColumnSorterMixin):
     #          Function ApplySingleAction
     # -----------------------------------------------
     def ApplySingleAction(self, index, action, fromMulti = False, counter = ''):
-        pkg = self.list.GetItem(index).Text
-        type = self.list.GetItem(index, 1).Text
-        label = self.list.GetItem(index, 7).Text
-        # installed = self.list.GetItem(index, 2).Text
-        # enabled = self.list.GetItem(index, 3).Text
-        # user0 = self.list.GetItem(index, 4).Text
-        # magisk_denylist = self.list.GetItem(index, 5).Text
-        # uid = self.list.GetItem(index, 6).Text
-        # label = self.list.GetItem(index, 7).Text
+        pkg = self.list.GetItemText(index)
+        type = self.list.GetItemText(index, 1)
+        label = self.list.GetItemText(index, 7)
+        # installed = self.list.GetItemText(index, 2)
+        # enabled = self.list.GetItemText(index, 3)
+        # user0 = self.list.GetItemText(index, 4)
+        # magisk_denylist = self.list.GetItemText(index, 5)
+        # uid = self.list.GetItemText(index, 6)
         if type == 'System':
             isSystem = True
         else:
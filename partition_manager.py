@@ -36,29 +36,22 @@
 import json
 
 import pyperclip
+import shutil
+import threading
 import traceback
 import wx
 import wx.html
-import wx.lib.mixins.listctrl as listmix
 import wx.lib.wxpTag
 
 import images as images
 from runtime import *
-
-
-# ============================================================================
-#                               Class ListCtrl
-# ============================================================================
-class ListCtrl(wx.ListCtrl, listmix.ListCtrlAutoWidthMixin):
-    def __init__(self, parent, ID, pos=wx.DefaultPosition, size=wx.DefaultSize, style=0):
-        wx.ListCtrl.__init__(self, parent, ID, pos, size, style)
-        listmix.ListCtrlAutoWidthMixin.__init__(self)
+from virtual_list import ListModel, VirtualListCtrl
 
 
 # ============================================================================
 #                               Class PartitionManager
 # ============================================================================
-class PartitionManager(wx.Dialog, listmix.ColumnSorterMixin):
+class PartitionManager(wx.Dialog):
     def __init__(self, *args, **kwargs):
         wx.Dialog.__init__(self, *args, **kwargs, style = wx.RESIZE_BORDER | wx.DEFAULT_DIALOG_STYLE)
         self.SetTitle("Partition Manager")
@@ -104,14 +97,15 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
         self.sm_up = self.il.Add(images.SmallUpArrow.GetBitmap())
         self.sm_dn = self.il.Add(images.SmallDnArrow.GetBitmap())
 
-        self.list  = ListCtrl(self, -1, size=wx.Size(-1, -1), style=wx.LC_REPORT | wx.LC_SINGLE_SEL | wx.BORDER_NONE)
+        self.model = ListModel(["Partition"])
+        self.list  = VirtualListCtrl(self, -1, self.model, size=wx.Size(-1, -1), style=wx.LC_REPORT | wx.LC_SINGLE_SEL | wx.BORDER_NONE)
         if sys.platform == "win32":
             self.list.SetHeaderAttr(wx.ItemAttr(wx.Colour('BLACK'),wx.Colour('DARK GREY'), wx.Font(wx.FontInfo(10).Bold())))
         self.list.SetImageList(self.il, wx.IMAGE_LIST_SMALL)
         self.list.EnableCheckBoxes(enable=True)
-        itemDataMap = self.PopulateList()
-        if itemDataMap != -1:
-            self.itemDataMap = itemDataMap
+        self.list.SetSortImages(self.sm_dn, self.sm_up)
+        self.list.SetColumns()
+        self.PopulateList()
 
         self.erase_button = wx.Button(self, wx.ID_ANY, u"Erase", wx.DefaultPosition, wx.DefaultSize, 0)
         self.erase_button.SetToolTip(u"Erase checked partitions")
@@ -121,6 +115,12 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
         self.dump_partition.SetToolTip(u"Dumps / Backups the checked partitions")
         self.dump_partition.Enable(False)
 
+        # only the formats that can be written here are offered (img.zst needs the zstandard package)
+        format_labels = {'': u"img", 'gz': u"img.gz", 'xz': u"img.xz", 'zst': u"img.zst", 'sparse': u"sparse img"}
+        self.dump_formats = get_dump_formats()
+        self.compression_choice = wx.Choice(self, wx.ID_ANY, wx.DefaultPosition, wx.DefaultSize, [format_labels[compression] for compression in self.dump_formats], 0)
+        self.compression_choice.SetSelection(0)
+        self.compression_choice.SetToolTip(u"Output format of the dumps, compressed while they are streamed from the device")
 
         self.close_button = wx.Button(self, wx.ID_ANY, u"Close", wx.DefaultPosition, wx.DefaultSize, 0)
         self.close_button.SetToolTip(u"Closes this dialog")
@@ -139,6 +139,7 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
         buttons_sizer.Add((0, 0), 1, wx.EXPAND, 5)
         buttons_sizer.Add(self.erase_button, 0, wx.ALL, 20)
         buttons_sizer.Add(self.dump_partition, 0, wx.ALL, 20)
+        buttons_sizer.Add(self.compression_choice, 0, wx.ALIGN_CENTER_VERTICAL|wx.RIGHT, 20)
         buttons_sizer.Add(self.close_button, 0, wx.ALL, 20)
         buttons_sizer.Add((0, 0), 1, wx.EXPAND, 5)
         vSizer.Add(warning_sizer, 0, wx.EXPAND, 5)
@@ -163,8 +164,8 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
         self.close_button.Bind(wx.EVT_BUTTON, self.OnClose)
         self.Bind(wx.EVT_LIST_ITEM_SELECTED, self.OnItemSelected, self.list)
         self.list.Bind(wx.EVT_RIGHT_DOWN, self.OnRightDown)
-        self.list.Bind(wx.EVT_LIST_ITEM_CHECKED, self.OnItemCheck)
-        self.list.Bind(wx.EVT_LIST_ITEM_UNCHECKED, self.OnItemUncheck)
+        self.Bind(wx.EVT_LIST_ITEM_CHECKED, self.OnItemCheck, self.list)
+        self.Bind(wx.EVT_LIST_ITEM_UNCHECKED, self.OnItemUncheck, self.list)
         # for wxMSW
         self.list.Bind(wx.EVT_COMMAND_RIGHT_CLICK, self.OnRightClick)
         # for wxGTK
@@ -176,42 +177,21 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
     #              Function PopulateList
     # -----------------------------------------------
     def PopulateList(self):
+        self.model.clear()
         if not self.device:
-            return -1
-        info = wx.ListItem()
-        info.Mask = wx.LIST_MASK_TEXT | wx.LIST_MASK_IMAGE | wx.LIST_MASK_FORMAT
-        info.Image = -1
-        info.Align = 0
-        info.Width = -1
-        info.SetWidth(-1)
-        info.Text = "Partition"
-        self.list.InsertColumn(0, info)
-
+            return
         res = self.device.get_partitions()
-        itemDataMap = {}
         if res != -1:
-            self.partitionCount = len(res)
-            self.message_label.Label = f"{self.partitionCount} Partitions"
-            i = 0
-            for i, key in enumerate(res):
+            for key in res:
                 if key:
-                    index = self.list.InsertItem(self.list.GetItemCount(), key)
-                    itemDataMap[i + 1] = (key)
-                    row = self.list.GetItem(index)
-                    self.list.SetItem(row)
-                    self.list.SetItemData(index, i + 1)
-                    # hide image
-                    self.list.SetItemColumnImage(i, 0, -1)
-            self.partitionCount = i
-            self.message_label.Label = f"{str(i)} Partitions"
+                    self.model.append((key,))
+            self.partitionCount = len(self.model)
+            self.message_label.Label = f"{self.partitionCount} Partitions"
+        self.model.update_view()
+        self.list.RefreshView()
         self.list.SetColumnWidth(0, -2)
         grow_column(self.list, 0, 20)
-
         self.currentItem = 0
-        if itemDataMap:
-            return itemDataMap
-        else:
-            return -1
 
     # -----------------------------------------------
     #              Function Check_UncheckAll
@@ -219,8 +199,7 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
     def Check_UncheckAll(self, state):
         # Set this so that we skip processing OnItemChecked, OnItemUnchecked events
         self.Set_all_cb_clicked (True)
-        itemcount = self.list.GetItemCount()
-        [self.list.CheckItem(item=i, check=state) for i in range(itemcount)]
+        self.list.CheckAll(state)
         if state and self.device and self.device.rooted:
             print("checking all Partitions\n")
             self.EnableDisableButton(True)
@@ -255,7 +234,7 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
     def OnItemCheck(self, event):
         if self.Get_all_cb_clicked():
             return
-        print(f"{event.Item.Text} is checked")
+        print(f"{self.list.GetItemText(event.Index)} is checked")
         self.Update_all_checkbox()
 
     # -----------------------------------------------
@@ -264,7 +243,7 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
     def OnItemUncheck(self, event):
         if self.Get_all_cb_clicked():
             return
-        print(f"{event.Item.Text} is unchecked")
+        print(f"{self.list.GetItemText(event.Index)} is unchecked")
         self.Update_all_checkbox()
 
     # -----------------------------------------------
@@ -351,6 +330,129 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
             print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: You must first select a valid device.")
             return
 
+        if multiple:
+            if not self.GetDownloadFolder():
+                return
+            pathname =  os.path.join(self.downloadFolder, f"{partition}.img")
+        else:
+            with wx.FileDialog(self, "Dump partition", '', f"{partition}.img", wildcard="IMG files (*.img)|*.img", style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as fileDialog:
+                if fileDialog.ShowModal() == wx.ID_CANCEL:
+                    print(f"User Cancelled dumping partition: {partition}")
+                    return     # the user changed their mind
+                pathname = fileDialog.GetPath()
+        self.StreamDump([(partition, pathname)])
+
+    # -----------------------------------------------
+    #                  GetDownloadFolder
+    # -----------------------------------------------
+    def GetDownloadFolder(self):
+        if not self.downloadFolder:
+            with wx.DirDialog(None, "Choose a directory where all the partition dumps should be saved.", style=wx.DD_DEFAULT_STYLE) as folderDialog:
+                if folderDialog.ShowModal() == wx.ID_CANCEL:
+                    print("User Cancelled dumping partitions (option: folder).")
+                    self.abort = True
+                    return None     # the user changed their mind
+                self.downloadFolder = folderDialog.GetPath()
+                print(f"Selected Download Directory: {self.downloadFolder}")
+        return self.downloadFolder
+
+    # -----------------------------------------------
+    #                  StreamDump
+    # -----------------------------------------------
+    def StreamDump(self, targets):
+        # targets is a list of (partition, pathname)
+        compression = self.GetCompression()
+        self.dump_progress = {}
+        done = set()
+        try:
+            self.SetCursor(wx.Cursor(wx.CURSOR_WAIT))
+            for partition, pathname in targets:
+                print(f"Dump partition {partition} to: {pathname}{'.' + compression if compression else ''}")
+            res, results = self.device.stream_partitions(targets, compression=compression, progress=self.OnDumpProgress)
+            for result in results:
+                print(f"Dumped {result['partition']} ({result['size']} bytes in {result['seconds']}s) sha256: {result['sha256']}")
+                done.add(result['partition'])
+            if res != 0:
+                print(f"\n⚠️ {datetime.now():%Y-%m-%d %H:%M:%S} WARNING: Streaming dump failed, falling back to dumping through /data/local/tmp ...")
+                for partition, pathname in targets:
+                    if partition not in done:
+                        self.StagedDump(partition, pathname, compression)
+        except IOError:
+            traceback.print_exc()
+            wx.LogError(f"Cannot save img file.")
+        self.SetCursor(wx.Cursor(wx.CURSOR_ARROW))
+
+    # -----------------------------------------------
+    #                  GetCompression
+    # -----------------------------------------------
+    def GetCompression(self):
+        return self.dump_formats[max(self.compression_choice.GetSelection(), 0)]
+
+    # -----------------------------------------------
+    #                  BackupDump
+    # -----------------------------------------------
+    def BackupDump(self, partitions):
+        # Runs in a worker thread so that the dialog stays responsive, OnBackupDone restores it.
+        compression = self.GetCompression()
+        concurrency = get_config().partition_dump_concurrency
+        download_folder = self.downloadFolder
+        self.dump_progress = {}
+        self.SetCursor(wx.Cursor(wx.CURSOR_WAIT))
+        self.EnableDisableButton(False)
+        self.close_button.Enable(False)
+        print(f"Backing up {len(partitions)} partitions to: {download_folder} ({concurrency} at a time) ...")
+
+        def backup_thread():
+            try:
+                res, manifest = self.device.backup_partitions(partitions, download_folder, compression=compression, concurrency=concurrency, progress=self.OnDumpProgress)
+                for entry in manifest['partitions']:
+                    print(f"Dumped {entry['partition']} to {entry['file']} ({entry['size']} bytes, stored {entry['stored_size']} bytes) sha256: {entry['sha256']}")
+                if manifest['partitions']:
+                    print(f"Backup of {manifest['size']} bytes stored in {manifest['stored_size']} bytes in {manifest.get('seconds', 0)}s, manifest: partitions_manifest.json")
+                if res != 0:
+                    done = {entry['partition'] for entry in manifest['partitions']}
+                    print(f"\n⚠️ {datetime.now():%Y-%m-%d %H:%M:%S} WARNING: Streaming backup failed, falling back to dumping through /data/local/tmp ...")
+                    for partition in partitions:
+                        if partition not in done:
+                            self.StagedDump(partition, os.path.join(download_folder, f"{partition}.img"), compression)
+            except IOError:
+                traceback.print_exc()
+                wx.CallAfter(wx.LogError, f"Cannot save img file.")
+            except Exception:
+                traceback.print_exc()
+                print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Backup of the partitions failed")
+            finally:
+                wx.CallAfter(self.OnBackupDone)
+
+        threading.Thread(target=backup_thread).start()
+
+    # -----------------------------------------------
+    #                  OnBackupDone
+    # -----------------------------------------------
+    def OnBackupDone(self):
+        # the dialog may have been closed while the backup was running
+        if not self:
+            return
+        self.SetCursor(wx.Cursor(wx.CURSOR_ARROW))
+        self.close_button.Enable(True)
+        self.Update_all_checkbox()
+
+    # -----------------------------------------------
+    #                  OnDumpProgress
+    # -----------------------------------------------
+    def OnDumpProgress(self, partition, done, total):
+        percent = done * 100 // total if total else 100
+        step = percent // 10 * 10
+        if self.dump_progress.get(partition, -1) < step:
+            self.dump_progress[partition] = step
+            print(f"  {partition}: {step}% ({done} / {total} bytes)")
+
+    # -----------------------------------------------
+    #                  StagedDump
+    # -----------------------------------------------
+    def StagedDump(self, partition, pathname, compression=''):
+        # The image is pulled raw, then written in the requested format (see open_dump_writer).
+        # Called from the backup worker thread too, so no UI is touched here.
         # delete existing partition dump if it exists on the phone
         path = f"/data/local/tmp/{partition}.img"
         res = self.device.delete(path)
@@ -366,41 +468,28 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
             puml("#red:Failed to dump partition on the phone;\n}\n")
             return
 
-        if multiple:
-            if not self.downloadFolder:
-                with wx.DirDialog(None, "Choose a directory where all the partition dumps should be saved.", style=wx.DD_DEFAULT_STYLE) as folderDialog:
-                    if folderDialog.ShowModal() == wx.ID_CANCEL:
-                        print("User Cancelled dumping partitions (option: folder).")
-                        self.abort = True
-                        return     # the user changed their mind
-                    self.downloadFolder = folderDialog.GetPath()
-                    print(f"Selected Download Directory: {self.downloadFolder}")
-            pathname =  os.path.join(self.downloadFolder, f"{partition}.img")
-        else:
-            with wx.FileDialog(self, "Dump partition", '', f"{partition}.img", wildcard="IMG files (*.img)|*.img", style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as fileDialog:
-                if fileDialog.ShowModal() == wx.ID_CANCEL:
-                    print(f"User Cancelled dumping partition: {partition}")
-                    return     # the user changed their mind
-                pathname = fileDialog.GetPath()
         try:
             if self.device:
-                self.SetCursor(wx.Cursor(wx.CURSOR_WAIT))
                 print(f"Dump partition to: {pathname}")
                 self.device.pull_file(path, pathname)
                 res = self.device.delete(path)
+                if compression and os.path.exists(pathname):
+                    target = f"{pathname}{DUMP_FORMATS[compression]}"
+                    print(f"Converting {pathname} to {target} ...")
+                    writer = open_dump_writer(target, compression)
+                    try:
+                        with open(pathname, 'rb') as f:
+                            shutil.copyfileobj(f, writer, DUMP_BLOCK_SIZE)
+                    finally:
+                        writer.close()
+                    os.remove(pathname)
+        except ValueError as e:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: {e}, the dump is kept as raw image: {pathname}")
         except IOError:
             traceback.print_exc()
-            wx.LogError(f"Cannot save img file '{pathname}'.")
-        self.SetCursor(wx.Cursor(wx.CURSOR_ARROW))
+            wx.CallAfter(wx.LogError, f"Cannot save img file '{pathname}'.")
 
 
-    # -----------------------------------------------
-    #                  GetListCtrl
-    # -----------------------------------------------
-    # Used by the ColumnSorterMixin, see wx/lib/mixins/listctrl.py
-    def GetListCtrl(self):
-        return self.list
-
     # -----------------------------------------------
     #                  OnRightDown
     # -----------------------------------------------
@@ -417,8 +506,7 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
     #                  getColumnText
     # -----------------------------------------------
     def getColumnText(self, index, col):
-        item = self.list.GetItem(index, col)
-        return item.GetText()
+        return self.list.GetItemText(index, col)
 
     # -----------------------------------------------
     #                  OnItemSelected
@@ -508,24 +596,19 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
     #                  OnCopyClipboard
     # -----------------------------------------------
     def OnCopyClipboard(self, event):
-        item = self.list.GetItem(self.currentItem)
-        pyperclip.copy(item.Text)
+        pyperclip.copy(self.list.GetItemText(self.currentItem))
 
     # -----------------------------------------------
     #         Function GetItemsCheckedCount
     # -----------------------------------------------
     def GetItemsCheckedCount(self):
-        checked_count = 0
-        for i in range(self.list.GetItemCount()):
-            if self.list.IsItemChecked(i):
-                checked_count += 1
-        return checked_count
+        return len(self.list.GetCheckedItems())
 
     # -----------------------------------------------
     #          Function ApplySingleAction
     # -----------------------------------------------
     def ApplySingleAction(self, index, action, fromMulti = False):
-        partition = self.list.GetItem(index).Text
+        partition = self.list.GetItemText(index)
 
         if not self.device:
             print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: You must first select a valid device.")
@@ -550,6 +633,16 @@ IT IS YOUR RESPONSIBILITY TO ENSURE THAT YOU KNOW WHAT YOU ARE DOING.
             multi = True
         if action == 'dump':
             self.downloadFolder = None
+            if multi:
+                # back up all the checked partitions in parallel streams
+                if not self.GetDownloadFolder():
+                    self.abort = False
+                    return
+                partitions = [self.list.GetItemText(index) for index in self.list.GetCheckedItems()]
+                print(f"Dumping {', '.join(partitions)} ...")
+                self.BackupDump(partitions)
+                print(f"Total count of partition actions attempted: {len(partitions)}")
+                return
         for index in range(self.list.GetItemCount()):
             if self.abort:
                 self.abort = False
@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+
+# This file is part of PixelFlasher https://github.com/badabing2005/PixelFlasher
+#
+# Copyright (C) 2025 Badabing2005
+# SPDX-FileCopyrightText: 2025 Badabing2005
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+# for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark payload_dumper extraction on synthetic payload.bin files."""
+
+import os
+os.environ.setdefault("PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION", "python")
+
+import argparse
+import bz2
+import contextlib
+import hashlib
+import json
+import lzma
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import bsdiff4
+import psutil
+
+import payload_dumper
+import update_metadata_pb2 as um
+
+OP_TYPES = {
+    'REPLACE': um.InstallOperation.REPLACE,  # type: ignore[attr-defined]
+    'REPLACE_XZ': um.InstallOperation.REPLACE_XZ,  # type: ignore[attr-defined]
+    'REPLACE_BZ': um.InstallOperation.REPLACE_BZ,  # type: ignore[attr-defined]
+    'ZERO': um.InstallOperation.ZERO,  # type: ignore[attr-defined]
+    'SOURCE_COPY': um.InstallOperation.SOURCE_COPY,  # type: ignore[attr-defined]
+    'SOURCE_BSDIFF': um.InstallOperation.SOURCE_BSDIFF,  # type: ignore[attr-defined]
+}
+DIFF_OPS = ('SOURCE_COPY', 'SOURCE_BSDIFF')
+DEFAULT_MIX = 'REPLACE=1,REPLACE_XZ=4,REPLACE_BZ=1,ZERO=1'
+# bsdiff4.diff is slow, keep the generated patches small.
+MAX_BSDIFF_BLOCKS = 64
+
+
+# -----------------------------------------------
+#           parse_mix function
+# -----------------------------------------------
+def parse_mix(mix):
+    # "REPLACE_XZ=4,ZERO=1" -> {'REPLACE_XZ': 4, 'ZERO': 1}
+    weights = {}
+    for item in mix.split(','):
+        if not item:
+            continue
+        name, _, weight = item.partition('=')
+        name = name.strip().upper()
+        if name not in OP_TYPES:
+            raise ValueError(f"Unknown operation type in mix: {name}")
+        weights[name] = float(weight) if weight else 1.0
+    if not weights:
+        raise ValueError("Empty operation mix")
+    return weights
+
+
+# -----------------------------------------------
+#           block_data function
+# -----------------------------------------------
+def block_data(rnd, size, compressibility):
+    # Random bytes followed by zeros, compressibility is the zero fraction.
+    random_size = int(size * (1 - compressibility))
+    return rnd.randbytes(random_size) + bytes(size - random_size)
+
+
+# -----------------------------------------------
+#           generate_payload function
+# -----------------------------------------------
+def generate_payload(payload_path, partitions=4, partition_size=64 * 1024 * 1024, block_size=4096, op_blocks=512, mix=DEFAULT_MIX, compressibility=0.5, seed=0, old_dir=None):
+    """Write a synthetic payload.bin, returns the list of partition names.
+
+    When the mix contains SOURCE_COPY / SOURCE_BSDIFF, the matching old images
+    are written to old_dir.
+    """
+    rnd = random.Random(seed)
+    weights = parse_mix(mix)
+    names = list(weights)
+    name_weights = [weights[name] for name in names]
+    if any(name in DIFF_OPS for name in names) and not old_dir:
+        raise ValueError("old_dir is required when the mix contains SOURCE_COPY or SOURCE_BSDIFF")
+
+    dam = um.DeltaArchiveManifest()
+    dam.block_size = block_size  # type: ignore[attr-defined]
+    dam.minor_version = 0  # type: ignore[attr-defined]
+    num_blocks = max(1, partition_size // block_size)
+    partition_names = []
+
+    with tempfile.TemporaryFile() as blobs:
+        data_length = 0
+        for p in range(partitions):
+            part = dam.partitions.add()  # type: ignore[attr-defined]
+            part.partition_name = f"part{p}"
+            partition_names.append(part.partition_name)
+            image_hash = hashlib.sha256()
+            if old_dir:
+                os.makedirs(old_dir, exist_ok=True)
+                old_image = block_data(rnd, num_blocks * block_size, compressibility)
+                with open(os.path.join(old_dir, f"{part.partition_name}.img"), 'wb') as old_file:
+                    old_file.write(old_image)
+                part.old_partition_info.size = len(old_image)
+                part.old_partition_info.hash = hashlib.sha256(old_image).digest()
+
+            block = 0
+            while block < num_blocks:
+                name = rnd.choices(names, name_weights)[0]
+                count = min(op_blocks, num_blocks - block)
+                if name == 'SOURCE_BSDIFF':
+                    count = min(count, MAX_BSDIFF_BLOCKS)
+                size = count * block_size
+                op = part.operations.add()
+                op.type = OP_TYPES[name]
+                dst = op.dst_extents.add()
+                dst.start_block = block
+                dst.num_blocks = count
+                blob = b''
+                if name == 'ZERO':
+                    data = bytes(size)
+                elif name in DIFF_OPS:
+                    src = op.src_extents.add()
+                    src.start_block = block
+                    src.num_blocks = count
+                    source = old_image[block * block_size:block * block_size + size]
+                    if name == 'SOURCE_COPY':
+                        data = source
+                    else:
+                        data = bytearray(source)
+                        for _ in range(8):
+                            pos = rnd.randrange(size)
+                            data[pos:pos + 64] = rnd.randbytes(min(64, size - pos))
+                        data = bytes(data)
+                        blob = bsdiff4.diff(source, data)
+                else:
+                    data = block_data(rnd, size, compressibility)
+                    if name == 'REPLACE':
+                        blob = data
+                    elif name == 'REPLACE_XZ':
+                        blob = lzma.compress(data)
+                    else:
+                        blob = bz2.compress(data)
+                if blob:
+                    op.data_offset = data_length
+                    op.data_length = len(blob)
+                    op.data_sha256_hash = hashlib.sha256(blob).digest()
+                    blobs.write(blob)
+                    data_length += len(blob)
+                image_hash.update(data)
+                block += count
+
+            part.new_partition_info.size = num_blocks * block_size
+            part.new_partition_info.hash = image_hash.digest()
+
+        manifest = dam.SerializeToString()  # type: ignore[attr-defined]
+        with open(payload_path, 'wb') as payload_file:
+            payload_file.write(b'CrAU')
+            payload_file.write(struct.pack('>Q', 2))
+            payload_file.write(struct.pack('>Q', len(manifest)))
+            payload_file.write(struct.pack('>I', 0))
+            payload_file.write(manifest)
+            blobs.seek(0)
+            shutil.copyfileobj(blobs, payload_file, 4 * 1024 * 1024)
+    return partition_names
+
+
+# ============================================================================
+#                               Class PeakRss
+# ============================================================================
+class PeakRss():
+    # Samples the RSS of this process plus all its children (process pool workers)
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        self.peak = max(self.peak, rss)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+
+
+# -----------------------------------------------
+#           run_benchmark function
+# -----------------------------------------------
+def run_benchmark(payload_path, out_dir, workers_list, verify_list, repeat=1, old_dir=None):
+    results = []
+    payload_size = os.path.getsize(payload_path)
+    for workers in workers_list:
+        for verify in verify_list:
+            for run in range(repeat):
+                shutil.rmtree(out_dir, ignore_errors=True)
+                os.makedirs(out_dir)
+                # keep the extraction progress off stdout, which may carry the JSON results
+                with PeakRss() as rss, contextlib.redirect_stdout(sys.stderr):
+                    start = time.perf_counter()
+                    report = payload_dumper.extract_partitions(payload_path, out=out_dir, diff=bool(old_dir), old=old_dir or 'old', workers=workers, verify=verify)
+                    wall = time.perf_counter() - start
+                out_bytes = report['stages']['extract']['bytes']
+                results.append({
+                    'workers': workers,
+                    'verify': verify,
+                    'run': run,
+                    'payload_bytes': payload_size,
+                    'output_bytes': out_bytes,
+                    'wall_seconds': round(wall, 3),
+                    'output_mb_s': round(out_bytes / wall / (1024 * 1024), 2) if wall > 0 else None,
+                    'payload_mb_s': round(payload_size / wall / (1024 * 1024), 2) if wall > 0 else None,
+                    'peak_rss_mb': round(rss.peak / (1024 * 1024), 1),
+                    'stages': report['stages'],
+                    'op_latency': report['op_latency'],
+                })
+    return results
+
+
+# -----------------------------------------------
+#           parse_args function
+# -----------------------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark payload.bin extraction on a synthetic payload.")
+    parser.add_argument("--payload", help="Use this payload.bin instead of generating one.")
+    parser.add_argument("--partitions", type=int, default=4, help="Number of partitions to generate.")
+    parser.add_argument("--size", type=float, default=64, help="Size of each generated partition in MB.")
+    parser.add_argument("--block-size", type=int, default=4096, help="Block size of the generated payload.")
+    parser.add_argument("--op-blocks", type=int, default=512, help="Blocks per generated operation.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted operation mix, one of {', '.join(OP_TYPES)} (default: {DEFAULT_MIX}).")
+    parser.add_argument("--compressibility", type=float, default=0.5, help="Fraction of zeros in generated data (0 to 1).")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the generator.")
+    parser.add_argument("--workers", default=f"1,{payload_dumper.default_workers()}", help="Comma separated worker counts to benchmark.")
+    parser.add_argument("--verify", default="off,ops,full", help="Comma separated verify modes to benchmark.")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per configuration.")
+    parser.add_argument("--work-dir", help="Directory for the generated files (default: a temporary directory).")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+    return parser.parse_args(argv)
+
+
+# ============================================================================
+#                               Function Main
+# ============================================================================
+def main(argv=None):
+    args = parse_args(argv)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="payload_benchmark_")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        old_dir = None
+        if args.payload:
+            payload_path = args.payload
+            generator = None
+        else:
+            payload_path = os.path.join(work_dir, "payload.bin")
+            if any(name in DIFF_OPS for name in parse_mix(args.mix)):
+                old_dir = os.path.join(work_dir, "old")
+            generator = {
+                'partitions': args.partitions,
+                'partition_size': int(args.size * 1024 * 1024),
+                'block_size': args.block_size,
+                'op_blocks': args.op_blocks,
+                'mix': args.mix,
+                'compressibility': args.compressibility,
+                'seed': args.seed,
+            }
+            start = time.perf_counter()
+            generate_payload(payload_path, old_dir=old_dir, **generator)
+            generator['seconds'] = round(time.perf_counter() - start, 3)
+
+        workers_list = [int(w) for w in args.workers.split(',') if w]
+        verify_list = [v for v in args.verify.split(',') if v]
+        results = run_benchmark(payload_path, os.path.join(work_dir, "out"), workers_list, verify_list, repeat=args.repeat, old_dir=old_dir)
+        output = json.dumps({'payload': payload_path, 'generator': generator, 'cpu_count': os.cpu_count(), 'results': results}, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(output)
+        else:
+            print(output)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-
 # Ref: https://github.com/vm03/payload_dumper/blob/35134a28d641deda899c30aed57aace21bfd4a3c/payload_dumper.py
 
 import struct
@@ -7,7 +6,13 @@ import bz2
 import sys
 import bsdiff4
 import io
+import mmap
 import os
+import time
+import zipfile
+import requests
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
 try:
     import lzma
 except ImportError as e:
@@ -16,137 +21,898 @@ except ImportError as e:
 
 import update_metadata_pb2 as um
 
+# Size of the reads from payload.bin and of the decompressed pieces written out,
+# this is what bounds the per worker memory regardless of the operation size.
+CHUNK_SIZE = 1024 * 1024
+# Operations are handed to workers in batches of roughly this much payload data
+# (or BATCH_OPS operations) so that process overhead is amortized.
+BATCH_BYTES = 16 * 1024 * 1024
+BATCH_OPS = 64
+# Remote payloads: operation data ranges closer than this are fetched with a
+# single range request, up to COALESCE_LIMIT bytes per request.
+COALESCE_GAP = 64 * 1024
+COALESCE_LIMIT = 32 * 1024 * 1024
+# Upper bounds (ms) of the per operation latency histogram buckets
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+HTTP_TIMEOUT = 30
 
-def extract_payload(payload_file_path, out='output', diff=False, old='old', images=''):
-    def u32(x):
-        return struct.unpack('>I', x)[0]
+_http_session = None
 
-    def u64(x):
-        return struct.unpack('>Q', x)[0]
+# Operation types newer than update_metadata_pb2
+BROTLI_BSDIFF = 10
+ZUCCHINI = 11
+LZ4DIFF_BSDIFF = 12
+LZ4DIFF_PUFFDIFF = 13
+OP_NAMES = {value: name for name, value in um.InstallOperation.Type.items()}  # type: ignore[attr-defined]
+OP_NAMES.update({BROTLI_BSDIFF: 'BROTLI_BSDIFF', ZUCCHINI: 'ZUCCHINI', LZ4DIFF_BSDIFF: 'LZ4DIFF_BSDIFF', LZ4DIFF_PUFFDIFF: 'LZ4DIFF_PUFFDIFF'})
+SUPPORTED_OPS = (um.InstallOperation.REPLACE, um.InstallOperation.REPLACE_BZ, um.InstallOperation.REPLACE_XZ, um.InstallOperation.ZERO, um.InstallOperation.DISCARD)  # type: ignore[attr-defined]
+# Operations that read from the old image, only usable in diff mode
+SOURCE_OPS = (um.InstallOperation.SOURCE_COPY, um.InstallOperation.SOURCE_BSDIFF, BROTLI_BSDIFF)  # type: ignore[attr-defined]
 
-    def verify_contiguous(exts):
-        blocks = 0
 
-        for ext in exts:
-            if ext.start_block != blocks:
-                return False
+def u32(x):
+    return struct.unpack('>I', x)[0]
 
-            blocks += ext.num_blocks
 
-        return True
+def u64(x):
+    return struct.unpack('>Q', x)[0]
 
-    def data_for_op(op, out_file, old_file):
-        payload_file.seek(data_offset + op.data_offset)
-        data = payload_file.read(op.data_length)
 
-        # assert hashlib.sha256(data).digest() == op.data_sha256_hash, 'operation data hash mismatch'
+def default_workers():
+    workers = os.cpu_count() or 1
+    if sys.platform == "win32":
+        # ProcessPoolExecutor limit on Windows
+        workers = min(workers, 61)
+    return workers
 
-        if op.type == op.REPLACE_XZ:
-            dec = lzma.LZMADecompressor()
-            data = dec.decompress(data)
-            out_file.seek(op.dst_extents[0].start_block * block_size)
-            out_file.write(data)
-        elif op.type == op.REPLACE_BZ:
-            dec = bz2.BZ2Decompressor()
-            data = dec.decompress(data)
-            out_file.seek(op.dst_extents[0].start_block * block_size)
-            out_file.write(data)
-        elif op.type == op.REPLACE:
-            out_file.seek(op.dst_extents[0].start_block * block_size)
-            out_file.write(data)
-        elif op.type == op.SOURCE_COPY:
-            if not diff:
-                print("SOURCE_COPY supported only for differential OTA")
-                sys.exit(-2)
-            out_file.seek(op.dst_extents[0].start_block * block_size)
-            for ext in op.src_extents:
-                old_file.seek(ext.start_block * block_size)
-                data = old_file.read(ext.num_blocks * block_size)
-                out_file.write(data)
-        elif op.type == op.SOURCE_BSDIFF:
-            if not diff:
-                print("SOURCE_BSDIFF supported only for differential OTA")
-                sys.exit(-3)
-            out_file.seek(op.dst_extents[0].start_block * block_size)
-            tmp_buff = io.BytesIO()
-            for ext in op.src_extents:
-                old_file.seek(ext.start_block * block_size)
-                old_data = old_file.read(ext.num_blocks * block_size)
-                tmp_buff.write(old_data)
-            tmp_buff.seek(0)
-            old_data = tmp_buff.read()
-            tmp_buff.seek(0)
-            tmp_buff.write(bsdiff4.patch(old_data, data))
-            n = 0
-            tmp_buff.seek(0)
-            for ext in op.dst_extents:
-                tmp_buff.seek(n * block_size)
-                n += ext.num_blocks
-                data = tmp_buff.read(ext.num_blocks * block_size)
-                out_file.seek(ext.start_block * block_size)
-                out_file.write(data)
-        elif op.type == op.ZERO:
-            for ext in op.dst_extents:
-                out_file.seek(ext.start_block * block_size)
-                out_file.write(b'\x00' * ext.num_blocks * block_size)
+
+# ============================================================================
+#                               Function pwrite
+# ============================================================================
+def pwrite(out_file, data, offset):
+    # Positional write, out_file must be unbuffered (buffering=0).
+    # os.pwrite is not available on Windows, but each worker owns its file handle
+    # so a seek + write is just as safe there.
+    view = memoryview(data)
+    if hasattr(os, 'pwrite'):
+        fd = out_file.fileno()
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    else:
+        out_file.seek(offset)
+        while view:
+            written = out_file.write(view)
+            view = view[written:]
+
+
+# ============================================================================
+#                               Class ExtentWriter
+# ============================================================================
+class ExtentWriter():
+    # Maps a linear stream of data onto the destination extents of an operation
+    def __init__(self, out_file, extents, block_size):
+        self.out_file = out_file
+        self.extents = [(ext.start_block * block_size, ext.num_blocks * block_size) for ext in extents]
+        self.index = 0
+        self.pos = 0
+
+    def write(self, data):
+        view = memoryview(data)
+        while view and self.index < len(self.extents):
+            offset, length = self.extents[self.index]
+            n = min(len(view), length - self.pos)
+            pwrite(self.out_file, view[:n], offset + self.pos)
+            self.pos += n
+            view = view[n:]
+            if self.pos == length:
+                self.index += 1
+                self.pos = 0
+
+
+# ============================================================================
+#                               Function decompress_chunks
+# ============================================================================
+def decompress_chunks(dec, chunks, chunk_size=CHUNK_SIZE):
+    # Feed the decompressor piece by piece and never let it return more than
+    # chunk_size at a time, so the output of a large op is never fully in memory.
+    for chunk in chunks:
+        if dec.eof:
+            break
+        yield dec.decompress(chunk, max_length=chunk_size)
+        while not dec.eof and not dec.needs_input:
+            yield dec.decompress(b'', max_length=chunk_size)
+
+
+# ============================================================================
+#                               Function iter_chunks
+# ============================================================================
+def iter_chunks(view, chunk_size=CHUNK_SIZE):
+    for i in range(0, len(view), chunk_size):
+        yield view[i:i + chunk_size]
+
+
+# ============================================================================
+#                               Function zip_member_offset
+# ============================================================================
+def zip_member_offset(zip_path, name='payload.bin'):
+    # Returns (offset, size) of the data of a stored (uncompressed) zip member,
+    # None when the member does not exist or is compressed.
+    # OTA zips store payload.bin, so it can be used in place without extracting it.
+    # zip_path can also be a seekable file object (e.g. an HttpRangeFile).
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            info = zf.getinfo(name)
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+        if isinstance(zip_path, (str, os.PathLike)):
+            with open(zip_path, 'rb') as f:
+                f.seek(info.header_offset)
+                header = f.read(30)
+        else:
+            zip_path.seek(info.header_offset)
+            header = zip_path.read(30)
+        if header[:4] != b'PK\x03\x04':
+            return None
+        name_len, extra_len = struct.unpack('<HH', header[26:30])
+        return info.header_offset + 30 + name_len + extra_len, info.file_size
+    except (KeyError, OSError, zipfile.BadZipFile):
+        return None
+
+
+# ============================================================================
+#                               Function is_remote
+# ============================================================================
+def is_remote(payload_file_path):
+    return isinstance(payload_file_path, str) and payload_file_path.lower().startswith(('http://', 'https://'))
+
+
+# ============================================================================
+#                               Function get_http_session
+# ============================================================================
+def get_http_session():
+    # One keep-alive session per (worker) process
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+    return _http_session
+
+
+# ============================================================================
+#                               Function coalesce_ranges
+# ============================================================================
+def coalesce_ranges(ranges, gap=COALESCE_GAP, limit=COALESCE_LIMIT):
+    # Merges (start, end) ranges that are adjacent or closer than gap bytes,
+    # without letting a merged range grow beyond limit bytes.
+    merged = []
+    for start, end in sorted(r for r in ranges if r[1] > r[0]):
+        if merged and start - merged[-1][1] <= gap and max(end, merged[-1][1]) - merged[-1][0] <= limit:
+            merged[-1][1] = max(end, merged[-1][1])
         else:
-            print("Unsupported type = %d" % op.type)
-            sys.exit(-1)
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+# ============================================================================
+#                               Class HttpRangeFile
+# ============================================================================
+class HttpRangeFile(io.RawIOBase):
+    # Read-only, seekable file object over HTTP range requests.
+    # Good enough for zipfile to parse the central directory of a remote OTA zip.
+    def __init__(self, url, session=None, timeout=HTTP_TIMEOUT, verify=True):
+        super().__init__()
+        self.url = url
+        self.session = session or get_http_session()
+        self.timeout = timeout
+        self.verify = verify
+        self.pos = 0
+        self.bytes_fetched = 0
+        self.requests = 0
+        self.size = self._get_size()
 
+    def _get_size(self):
+        response = self.session.head(self.url, headers={"Accept-Encoding": "identity"}, allow_redirects=True, timeout=self.timeout, verify=self.verify)
+        if response.ok and response.headers.get('Content-Length') and response.headers.get('Accept-Ranges', 'bytes') == 'bytes':
+            self.url = response.url
+            return int(response.headers['Content-Length'])
+        # Some servers do not answer HEAD properly, ask for the first byte instead.
+        response = self.session.get(self.url, headers={"Range": "bytes=0-0", "Accept-Encoding": "identity"}, timeout=self.timeout, verify=self.verify)
+        content_range = response.headers.get('Content-Range', '')
+        if response.status_code != 206 or '/' not in content_range:
+            raise OSError(f"{self.url} does not support range requests (status {response.status_code})")
+        self.url = response.url
+        return int(content_range.rsplit('/', 1)[1])
+
+    def fetch(self, offset, length):
+        if length <= 0 or offset >= self.size:
+            return b''
+        end = min(offset + length, self.size) - 1
+        headers = {
+            "Range": f"bytes={offset}-{end}",
+            "Accept-Encoding": "identity"
+        }
+        response = self.session.get(self.url, headers=headers, timeout=self.timeout, verify=self.verify)
+        if response.status_code != 206:
+            # a 200 would be the whole file, never what we want here.
+            raise OSError(f"Range request bytes={offset}-{end} failed with status {response.status_code}")
+        data = response.content
+        if len(data) != end - offset + 1:
+            raise EOFError(f"Range request bytes={offset}-{end} returned {len(data)} bytes")
+        self.bytes_fetched += len(data)
+        self.requests += 1
         return data
 
-    def dump_part(part):
-        sys.stdout.write(f"Processing {part.partition_name} partition")
-        sys.stdout.flush()
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        elif whence == io.SEEK_END:
+            self.pos = self.size + offset
+        if self.pos < 0:
+            raise ValueError("negative seek position")
+        return self.pos
 
-        with open(f'{out}/{part.partition_name}.img', 'wb') as out_file:
-            h = hashlib.sha256()
+    def readinto(self, b):
+        data = self.fetch(self.pos, len(b))
+        n = len(data)
+        b[:n] = data
+        self.pos += n
+        return n
 
-            if diff:
-                with open(f'{old}/{part.partition_name}.img', 'rb') as old_file:
-                    for op in part.operations:
-                        data = data_for_op(op, out_file, old_file)
-                        sys.stdout.write(".")
-                        sys.stdout.flush()
-            else:
+
+# ============================================================================
+#                               Class PayloadFile
+# ============================================================================
+class PayloadFile():
+    # Memory mapped payload.bin
+    # The manifest is parsed once and indexed by partition name, operation data
+    # is handed out as zero-copy memoryview slices of the mapping, so only the
+    # pages of the operations actually used are ever read from disk.
+    # offset is the position of the payload inside payload_file_path, which
+    # allows reading payload.bin directly out of a (stored) OTA zip.
+    # With index=False only the header is read (used by the extraction workers).
+    def __init__(self, payload_file_path, offset=0, index=True):
+        self.path = payload_file_path
+        self.offset = offset
+        self._file = open(payload_file_path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self._view = memoryview(self._mmap)
+        try:
+            self._parse(offset, index)
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self, offset, index):
+        self.manifest = None
+        self.block_size = 0
+        self.partitions = {}
+        self.ranges = {}
+
+        header = self.read(offset, 24)
+        if bytes(header[:4]) != b'CrAU':
+            raise ValueError(f"{self.path} is not a payload.bin (bad magic)")
+        self.file_format_version = u64(header[4:12])
+        if self.file_format_version != 2:
+            raise ValueError(f"Unsupported payload.bin version {self.file_format_version}")
+        manifest_size = u64(header[12:20])
+        metadata_signature_size = u32(header[20:24])
+        manifest_offset = offset + 24
+        self.data_offset = manifest_offset + manifest_size + metadata_signature_size
+
+        if index:
+            self.manifest = um.DeltaArchiveManifest()
+            self.manifest.ParseFromString(self.read(manifest_offset, manifest_size))  # type: ignore[attr-defined]
+            self.block_size = self.manifest.block_size  # type: ignore[attr-defined]
+            for part in self.manifest.partitions:  # type: ignore[attr-defined]
+                self.partitions[part.partition_name] = part
+                start = None
+                end = None
                 for op in part.operations:
-                    data = data_for_op(op, out_file, None)
-                    sys.stdout.write(".")
-                    sys.stdout.flush()
+                    if op.data_length:
+                        op_start = self.data_offset + op.data_offset
+                        op_end = op_start + op.data_length
+                        start = op_start if start is None else min(start, op_start)
+                        end = op_end if end is None else max(end, op_end)
+                if start is not None:
+                    self.ranges[part.partition_name] = (start, end)
+
+    def read(self, offset, length):
+        return self._view[offset:offset + length]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # a caller still holds a slice, the mapping goes away with it.
+            pass
+        self._file.close()
+
+    def partition(self, name):
+        return self.partitions.get(name)
+
+    def partition_range(self, name):
+        # Absolute (start, end) byte range holding the data of a partition's operations
+        return self.ranges.get(name)
+
+    def prefetch(self, ops):
+        # Nothing to do, the mapping pages in what is used.
+        pass
+
+    def op_data(self, op):
+        start = self.data_offset + op.data_offset
+        if start + op.data_length > len(self._view):
+            raise EOFError(f"payload.bin is truncated, operation data at {start} is out of bounds")
+        return self._view[start:start + op.data_length]
+
+
+# ============================================================================
+#                               Class RemotePayloadFile
+# ============================================================================
+class RemotePayloadFile(PayloadFile):
+    # payload.bin served over HTTP (plain or inside an OTA zip at offset).
+    # Only the header and manifest are fetched up front, operation data is
+    # fetched with coalesced range requests by prefetch().
+    def __init__(self, url, offset=0, index=True, verify=True):
+        self.path = url
+        self.offset = offset
+        self.reader = HttpRangeFile(url, verify=verify)
+        self._buffers = []
+        self._parse(offset, index)
+
+    def read(self, offset, length):
+        return self.reader.fetch(offset, length)
+
+    def close(self):
+        self._buffers = []
+        self.reader.close()
+
+    def prefetch(self, ops):
+        ranges = [(self.data_offset + op.data_offset, self.data_offset + op.data_offset + op.data_length) for op in ops if op.data_length]
+        self._buffers = [(start, memoryview(self.read(start, end - start))) for start, end in coalesce_ranges(ranges)]
+
+    def op_data(self, op):
+        start = self.data_offset + op.data_offset
+        for buffer_start, buffer in self._buffers:
+            if buffer_start <= start and start + op.data_length <= buffer_start + len(buffer):
+                return buffer[start - buffer_start:start - buffer_start + op.data_length]
+        return memoryview(self.read(start, op.data_length))
 
-        print("Done")
 
-    with open(payload_file_path, 'rb') as payload_file:
-        magic = payload_file.read(4)
-        assert magic == b'CrAU'
+# ============================================================================
+#                               Function open_payload
+# ============================================================================
+def open_payload(payload_file_path, offset=0, index=True):
+    if is_remote(payload_file_path):
+        return RemotePayloadFile(payload_file_path, offset=offset, index=index)
+    return PayloadFile(payload_file_path, offset=offset, index=index)
 
-        file_format_version = u64(payload_file.read(8))
-        assert file_format_version == 2
 
-        manifest_size = u64(payload_file.read(8))
+# ============================================================================
+#                               Function remote_payload_offset
+# ============================================================================
+def remote_payload_offset(url):
+    # Offset of payload.bin behind url, 0 when url is the payload itself,
+    # otherwise it is located through the central directory of the remote zip.
+    with HttpRangeFile(url) as remote:
+        if remote.fetch(0, 4) == b'CrAU':
+            return 0
+        member = zip_member_offset(remote, 'payload.bin')
+        if not member:
+            raise ValueError(f"No stored payload.bin found in {url}")
+        return member[0]
 
-        metadata_signature_size = 0
 
-        if file_format_version > 1:
-            metadata_signature_size = u32(payload_file.read(4))
+# ============================================================================
+#                               Function pread_into
+# ============================================================================
+def pread_into(in_file, view, offset):
+    # Fills view with the data of in_file at offset
+    view = memoryview(view)
+    if hasattr(os, 'preadv'):
+        fd = in_file.fileno()
+        while view:
+            n = os.preadv(fd, [view], offset)
+            if n == 0:
+                raise EOFError(f"Source image is too short, nothing to read at offset {offset}")
+            view = view[n:]
+            offset += n
+    else:
+        in_file.seek(offset)
+        while view:
+            n = in_file.readinto(view)
+            if not n:
+                raise EOFError(f"Source image is too short, nothing to read at offset {offset}")
+            view = view[n:]
 
-        manifest = payload_file.read(manifest_size)
-        metadata_signature = payload_file.read(metadata_signature_size)
 
-        data_offset = payload_file.tell()
+# ============================================================================
+#                               Function copy_range
+# ============================================================================
+def copy_range(in_file, in_offset, out_file, out_offset, length):
+    # Copies without bringing the data into Python when the OS can do it (Linux copy_file_range),
+    # otherwise through a single bounded buffer.
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while length > 0:
+                n = os.copy_file_range(in_file.fileno(), out_file.fileno(), length, in_offset, out_offset)
+                if n == 0:
+                    raise EOFError(f"Source image is too short, nothing to copy at offset {in_offset}")
+                in_offset += n
+                out_offset += n
+                length -= n
+            return
+        except OSError:
+            # e.g. not supported by the filesystem, continue with whatever is left
+            pass
+    buffer = bytearray(min(CHUNK_SIZE, length))
+    while length > 0:
+        view = memoryview(buffer)[:min(len(buffer), length)]
+        pread_into(in_file, view, in_offset)
+        pwrite(out_file, view, out_offset)
+        in_offset += len(view)
+        out_offset += len(view)
+        length -= len(view)
 
-        dam = um.DeltaArchiveManifest()
-        dam.ParseFromString(manifest)  # type: ignore[attr-defined]
-        block_size = dam.block_size  # type: ignore[attr-defined]
 
-        if images == "":
-            for part in dam.partitions:  # type: ignore[attr-defined]
-                dump_part(part)
+# ============================================================================
+#                               Function gather_extents
+# ============================================================================
+def gather_extents(in_file, extents, block_size):
+    # Reads the source extents of an op into a single buffer.
+    total = sum(ext.num_blocks for ext in extents) * block_size
+    if len(extents) == 1:
+        # bsdiff4 wants bytes, reading a single extent gives us exactly that without an extra copy
+        data = os.pread(in_file.fileno(), total, extents[0].start_block * block_size) if hasattr(os, 'pread') else None
+        if data is None:
+            in_file.seek(extents[0].start_block * block_size)
+            data = in_file.read(total)
+        if len(data) != total:
+            raise EOFError("Source image is too short")
+        return data
+    buffer = bytearray(total)
+    view = memoryview(buffer)
+    pos = 0
+    for ext in extents:
+        length = ext.num_blocks * block_size
+        pread_into(in_file, view[pos:pos + length], ext.start_block * block_size)
+        pos += length
+    return bytes(buffer)
+
+
+# ============================================================================
+#                               Function unsupported_ops
+# ============================================================================
+def unsupported_ops(parts, diff):
+    # Returns a list of human readable problems for the operations that cannot
+    # be applied, so that it can be reported before any work is done.
+    problems = []
+    for part in parts:
+        counts = {}
+        for op in part.operations:
+            if op.type in SUPPORTED_OPS or (diff and op.type in SOURCE_OPS):
+                continue
+            counts[op.type] = counts.get(op.type, 0) + 1
+        for op_type, count in sorted(counts.items()):
+            reason = "need a differential OTA (diff=True) and the old images" if op_type in SOURCE_OPS else "are not supported"
+            problems.append(f"{part.partition_name}: {count} {OP_NAMES.get(op_type, op_type)} ({op_type}) operation(s) {reason}")
+    return problems
+
+
+# ============================================================================
+#                               Function apply_op
+# ============================================================================
+def apply_op(op, payload, block_size, out_file, old_file, diff):
+    if op.type in (op.REPLACE_XZ, op.REPLACE_BZ, op.REPLACE):
+        writer = ExtentWriter(out_file, op.dst_extents, block_size)
+        chunks = iter_chunks(payload.op_data(op))
+        if op.type == op.REPLACE_XZ:
+            chunks = decompress_chunks(lzma.LZMADecompressor(), chunks)
+        elif op.type == op.REPLACE_BZ:
+            chunks = decompress_chunks(bz2.BZ2Decompressor(), chunks)
+        for chunk in chunks:
+            writer.write(chunk)
+    elif op.type in (op.ZERO, op.DISCARD):
+        # The image is preallocated with truncate, which leaves holes (sparse on
+        # filesystems that support it) that already read back as zeros.
+        pass
+    elif diff and op.type == op.SOURCE_COPY:
+        # walk source and destination extents in step, copying the overlapping pieces
+        dst = [(ext.start_block * block_size, ext.num_blocks * block_size) for ext in op.dst_extents]
+        dst_index = 0
+        dst_pos = 0
+        for ext in op.src_extents:
+            src_offset = ext.start_block * block_size
+            src_remaining = ext.num_blocks * block_size
+            while src_remaining > 0 and dst_index < len(dst):
+                dst_offset, dst_length = dst[dst_index]
+                n = min(src_remaining, dst_length - dst_pos)
+                copy_range(old_file, src_offset, out_file, dst_offset + dst_pos, n)
+                src_offset += n
+                src_remaining -= n
+                dst_pos += n
+                if dst_pos == dst_length:
+                    dst_index += 1
+                    dst_pos = 0
+    elif diff and op.type in (op.SOURCE_BSDIFF, BROTLI_BSDIFF):
+        data = payload.op_data(op)
+        if bytes(data[:8]) != b'BSDIFF40':
+            # BROTLI_BSDIFF ops may also carry the BSDF2 format, which bsdiff4 cannot apply.
+            raise ValueError(f"Unsupported {OP_NAMES.get(op.type)} patch format {bytes(data[:5])}")
+        patched = bsdiff4.patch(gather_extents(old_file, op.src_extents, block_size), bytes(data))
+        ExtentWriter(out_file, op.dst_extents, block_size).write(patched)
+    else:
+        raise ValueError(f"Unsupported operation type {OP_NAMES.get(op.type, op.type)} ({op.type})")
+
+
+# ============================================================================
+#                               Function record_latency
+# ============================================================================
+def record_latency(latency, op_name, seconds):
+    # latency[op_name] = [count, total seconds, count per LATENCY_BUCKETS_MS bucket...]
+    entry = latency.setdefault(op_name, [0, 0.0] + [0] * (len(LATENCY_BUCKETS_MS) + 1))
+    entry[0] += 1
+    entry[1] += seconds
+    ms = seconds * 1000
+    for i, bucket in enumerate(LATENCY_BUCKETS_MS):
+        if ms <= bucket:
+            entry[2 + i] += 1
+            break
+    else:
+        entry[-1] += 1
+
+
+# ============================================================================
+#                               Function merge_latency
+# ============================================================================
+def merge_latency(total, latency):
+    for op_name, entry in latency.items():
+        if op_name in total:
+            total[op_name] = [a + b for a, b in zip(total[op_name], entry)]
         else:
-            images_list = images.split(",")
-            for image in images_list:
-                partition = [part for part in dam.partitions if part.partition_name == image]  # type: ignore[attr-defined]
-                if partition:
-                    dump_part(partition[0])
+            total[op_name] = list(entry)
+
+
+# ============================================================================
+#                               Function latency_report
+# ============================================================================
+def latency_report(latency):
+    report = {}
+    for op_name, entry in sorted(latency.items()):
+        labels = [f"<={bucket}ms" for bucket in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        report[op_name] = {
+            'count': entry[0],
+            'mean_ms': round(entry[1] * 1000 / entry[0], 3) if entry[0] else None,
+            'histogram': dict(zip(labels, entry[2:])),
+        }
+    return report
+
+
+# ============================================================================
+#                               Function sha256_digest
+# ============================================================================
+def sha256_digest(data):
+    # Returns the digest and the time it took, runs on the hashing thread.
+    start = time.perf_counter()
+    digest = hashlib.sha256(data).digest()
+    return digest, time.perf_counter() - start
+
+
+# ============================================================================
+#                               Function extract_ops
+# ============================================================================
+def extract_ops(task):
+    # Worker entry point, this must stay a module level function so that it can
+    # be pickled for the process pool.
+    # Each task opens its own handles, which is what allows out of order
+    # completion with positional writes into the preallocated image.
+    # With verify enabled, the data of each op is hashed on a separate thread
+    # while it is being decompressed and written on this one.
+    stats = {'ops': 0, 'data_bytes': 0, 'out_bytes': 0, 'extract_seconds': 0.0, 'hash_bytes': 0, 'hash_seconds': 0.0, 'errors': [], 'latency': {}}
+    block_size = task['block_size']
+    hasher = None
+    hashes = []
+    with open_payload(task['payload'], offset=task['offset'], index=False) as payload, open(task['out'], 'r+b', buffering=0) as out_file:
+        old_file = open(task['old'], 'rb') if task['diff'] else None
+        try:
+            if task['verify'] != 'off':
+                hasher = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            ops = []
+            for blob in task['ops']:
+                op = um.InstallOperation()
+                op.ParseFromString(blob)  # type: ignore[attr-defined]
+                ops.append(op)
+            payload.prefetch(ops)
+            for index, op in enumerate(ops, start=task['first_op']):
+                if hasher and op.data_length and op.data_sha256_hash:
+                    hashes.append((index, op, hasher.submit(sha256_digest, payload.op_data(op))))
+                start = time.perf_counter()
+                try:
+                    apply_op(op, payload, block_size, out_file, old_file, task['diff'])
+                except Exception:
+                    # corrupt data usually fails decompression first, report it as what it is.
+                    if hashes and hashes[-1][1] is op and hashes[-1][2].result()[0] != op.data_sha256_hash:
+                        hashes.pop()
+                        stats['errors'].append(f"operation {index} data hash mismatch")
+                        continue
+                    raise
+                elapsed = time.perf_counter() - start
+                stats['extract_seconds'] += elapsed
+                record_latency(stats['latency'], OP_NAMES.get(op.type, str(op.type)), elapsed)
+                stats['ops'] += 1
+                stats['data_bytes'] += op.data_length
+                stats['out_bytes'] += sum(ext.num_blocks for ext in op.dst_extents) * block_size
+            for index, op, future in hashes:
+                digest, seconds = future.result()
+                stats['hash_bytes'] += op.data_length
+                stats['hash_seconds'] += seconds
+                if digest != op.data_sha256_hash:
+                    stats['errors'].append(f"operation {index} data hash mismatch")
+        finally:
+            if hasher:
+                hasher.shutdown(wait=True)
+            hashes = []
+            if old_file:
+                old_file.close()
+    return stats
+
+
+# ============================================================================
+#                               Function hash_image
+# ============================================================================
+def hash_image(path):
+    start = time.perf_counter()
+    h = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE * 4), b''):
+            h.update(chunk)
+            size += len(chunk)
+    return h.digest(), size, time.perf_counter() - start
+
+
+# ============================================================================
+#                               Function partition_size
+# ============================================================================
+def partition_size(part, block_size):
+    size = part.new_partition_info.size
+    if not size:
+        for op in part.operations:
+            for ext in op.dst_extents:
+                size = max(size, (ext.start_block + ext.num_blocks) * block_size)
+    return size
+
+
+# ============================================================================
+#                               Function make_tasks
+# ============================================================================
+def make_tasks(payload_file_path, payload_offset, block_size, out_path, old_path, diff, verify, part):
+    tasks = []
+    batch = []
+    batch_bytes = 0
+    first_op = 0
+
+    def add_task():
+        tasks.append({
+            'payload': payload_file_path,
+            'offset': payload_offset,
+            'block_size': block_size,
+            'out': out_path,
+            'old': old_path,
+            'diff': diff,
+            'verify': verify,
+            'first_op': first_op,
+            'ops': batch,
+        })
+
+    for index, op in enumerate(part.operations):
+        batch.append(op.SerializeToString())
+        batch_bytes += op.data_length
+        if batch_bytes >= BATCH_BYTES or len(batch) >= BATCH_OPS:
+            add_task()
+            batch = []
+            batch_bytes = 0
+            first_op = index + 1
+    if batch:
+        add_task()
+    return tasks
+
+
+# ============================================================================
+#                               Function run_tasks
+# ============================================================================
+def run_tasks(tasks, workers, on_done):
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            on_done(task, extract_ops(task))
+        return
+
+    workers = min(workers, len(tasks))
+    remaining = list(tasks)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(extract_ops, task): task for task in tasks}
+            for future in concurrent.futures.as_completed(futures):
+                task = futures[future]
+                on_done(task, future.result())
+                remaining.remove(task)
+        return
+    except (BrokenProcessPool, NotImplementedError, PermissionError) as e:
+        # Process pools can be unavailable (restricted or frozen environments),
+        # decompression and file I/O release the GIL so threads are the next best thing.
+        # Operations are idempotent positional writes, redoing unfinished ones is harmless.
+        print(f"\nProcess pool unavailable ({e}), falling back to threads.")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(extract_ops, task): task for task in remaining}
+        for future in concurrent.futures.as_completed(futures):
+            on_done(futures[future], future.result())
+
+
+# ============================================================================
+#                               Function stage_report
+# ============================================================================
+def stage_report(num_bytes, seconds):
+    return {
+        'bytes': num_bytes,
+        'seconds': round(seconds, 3),
+        'mb_s': round(num_bytes / seconds / (1024 * 1024), 2) if seconds > 0 else None,
+    }
+
+
+# ============================================================================
+#                               Function extract_partitions
+# ============================================================================
+def extract_partitions(payload_file_path, out='output', partitions=None, diff=False, old='old', workers=None, payload_offset=0, verify='off'):
+    # Extracts the requested partitions (all when partitions is empty) from payload_file_path into out.
+    # Operations of all partitions are fanned out over a pool of workers.
+    # payload_offset is the offset of payload.bin inside payload_file_path (see zip_member_offset).
+    # payload_file_path can also be an http(s) url of a payload.bin or of an OTA zip, in which
+    # case only the manifest and the data of the requested partitions are downloaded.
+    # verify:
+    #   off:  no verification
+    #   ops:  the data of every operation is checked against its sha256
+    #   full: ops + every extracted image is checked against new_partition_info.hash
+    # Returns a report with the per partition results and the throughput of each stage,
+    # raises ValueError when verification fails.
+    if verify not in ('off', 'ops', 'full'):
+        raise ValueError(f"Invalid verify mode: {verify}")
+    if workers is None:
+        workers = default_workers()
+    wall_start = time.perf_counter()
+
+    if is_remote(payload_file_path) and not payload_offset:
+        payload_offset = remote_payload_offset(payload_file_path)
+
+    with open_payload(payload_file_path, offset=payload_offset) as payload:
+        block_size = payload.block_size
+        if partitions:
+            selected = []
+            for image in partitions:
+                part = payload.partition(image)
+                if part:
+                    selected.append(part)
                 else:
                     sys.stderr.write("Partition %s not found in payload!\n" % image)
+        else:
+            selected = list(payload.partitions.values())
+
+    problems = unsupported_ops(selected, diff)
+    if diff:
+        problems.extend(f"{part.partition_name}: old image {old}/{part.partition_name}.img not found" for part in selected if not os.path.exists(f'{old}/{part.partition_name}.img'))
+    if problems:
+        for problem in problems:
+            sys.stderr.write(f"{problem}\n")
+        raise ValueError("Cannot extract payload:\n" + "\n".join(problems))
+
+    report = {'partitions': {}, 'stages': {}, 'errors': []}
+    totals = {'data_bytes': 0, 'out_bytes': 0, 'extract_seconds': 0.0, 'hash_bytes': 0, 'hash_seconds': 0.0, 'image_bytes': 0, 'image_seconds': 0.0}
+    latency = {}
+    tasks = []
+    pending = {}
+    # full images are hashed on a separate thread as soon as a partition is complete,
+    # while the remaining partitions are still being extracted.
+    image_hasher = concurrent.futures.ThreadPoolExecutor(max_workers=1) if verify == 'full' else None
+    image_hashes = []
+
+    def partition_done(part, out_path):
+        print(f"{part.partition_name} Done")
+        if image_hasher and part.new_partition_info.hash:
+            image_hashes.append((part, image_hasher.submit(hash_image, out_path)))
+
+    for part in selected:
+        out_path = f'{out}/{part.partition_name}.img'
+        old_path = f'{old}/{part.partition_name}.img'
+        report['partitions'][part.partition_name] = {'operations': len(part.operations), 'size': partition_size(part, block_size), 'errors': [], 'verified': None}
+        # preallocate the image so that operations can land in any order.
+        with open(out_path, 'wb') as out_file:
+            out_file.truncate(partition_size(part, block_size))
+        part_tasks = make_tasks(payload_file_path, payload_offset, block_size, out_path, old_path, diff, verify, part)
+        print(f"Processing {part.partition_name} partition ({len(part.operations)} operations)")
+        if not part_tasks:
+            partition_done(part, out_path)
+            continue
+        pending[out_path] = [part, len(part_tasks)]
+        tasks.extend(part_tasks)
+
+    def on_done(task, stats):
+        sys.stdout.write(".")
+        sys.stdout.flush()
+        for key in ('data_bytes', 'out_bytes', 'extract_seconds', 'hash_bytes', 'hash_seconds'):
+            totals[key] += stats[key]
+        merge_latency(latency, stats['latency'])
+        entry = pending[task['out']]
+        report['partitions'][entry[0].partition_name]['errors'].extend(stats['errors'])
+        entry[1] -= 1
+        if entry[1] == 0:
+            partition_done(entry[0], task['out'])
+
+    try:
+        run_tasks(tasks, workers, on_done)
+    finally:
+        if image_hasher:
+            image_hasher.shutdown(wait=True)
+
+    for part, future in image_hashes:
+        digest, size, seconds = future.result()
+        totals['image_bytes'] += size
+        totals['image_seconds'] += seconds
+        if digest != part.new_partition_info.hash:
+            report['partitions'][part.partition_name]['errors'].append("partition image hash mismatch")
+
+    for name, entry in report['partitions'].items():
+        if verify != 'off':
+            entry['verified'] = not entry['errors']
+        report['errors'].extend(f"{name}: {error}" for error in entry['errors'])
+
+    # seconds are the busy time summed over all workers
+    report['stages']['extract'] = stage_report(totals['out_bytes'], totals['extract_seconds'])
+    if verify != 'off':
+        report['stages']['op_hash'] = stage_report(totals['hash_bytes'], totals['hash_seconds'])
+    if verify == 'full':
+        report['stages']['image_hash'] = stage_report(totals['image_bytes'], totals['image_seconds'])
+    report['op_latency'] = latency_report(latency)
+    report['wall_seconds'] = round(time.perf_counter() - wall_start, 3)
+    report['workers'] = workers
+    report['verify'] = verify
+
+    for stage, entry in report['stages'].items():
+        print(f"{stage}: {entry['bytes'] / (1024 * 1024):.1f} MB in {entry['seconds']} s ({entry['mb_s']} MB/s)")
+    if report['errors']:
+        for error in report['errors']:
+            sys.stderr.write(f"Verification failed: {error}\n")
+        raise ValueError(f"payload verification failed: {len(report['errors'])} error(s)")
+    return report
+
+
+# ============================================================================
+#                               Function extract_payload
+# ============================================================================
+def extract_payload(payload_file_path, out='output', diff=False, old='old', images='', workers=None, payload_offset=0, verify='off'):
+    # Compatibility wrapper, images is a comma separated list of partition names.
+    partitions = [image for image in images.split(",") if image] if images else None
+    return extract_partitions(payload_file_path, out=out, partitions=partitions, diff=diff, old=old, workers=workers, payload_offset=payload_offset, verify=verify)
@@ -54,9 +54,10 @@ from i18n import _
 
 from constants import *
 from file_editor import FileEditor
+from fleet_flash import FleetFlasher, FleetPlan
 from magisk_downloads import MagiskDownloads
 from message_box_ex import MessageBoxEx
-from payload_dumper import extract_payload
+from payload_dumper import extract_payload, zip_member_offset
 from phone import get_connected_devices, update_phones
 from runtime import *
 
@@ -678,7 +679,6 @@ def process_file(self, file_type):
         print(get_printable_memory())
         puml(f"#cyan:Process {file_type};\n", True)
         config_path = get_config_path()
-        path_to_7z = get_path_to_7z()
         boot_images = os.path.join(config_path, get_boot_images_dir())
         tmp_dir_full = os.path.join(config_path, 'tmp')
         con = get_db_con()
@@ -691,6 +691,8 @@ def process_file(self, file_type):
         is_init_boot = False
         is_stock_boot = False
         image_file_path = None
+        firmware_cache = None
+        artefacts = None
 
         is_payload_bin = False
         factory_images = os.path.join(config_path, 'factory_images')
@@ -714,20 +716,35 @@ def process_file(self, file_type):
             package_sig = get_firmware_id()
             package_dir_full = os.path.join(factory_images, package_sig or '')
             wx.Yield()
-            found_flash_all_bat = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="flash-all.bat", nested=False)
-            wx.Yield()
-            found_flash_all_sh = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="flash-all.sh", nested=False)
-            wx.Yield()
-            found_boot_img = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="boot.img", nested=True)
-            wx.Yield()
-            found_init_boot_img = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="init_boot.img", nested=True)
-            wx.Yield()
-            found_vbmeta_img = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="vbmeta.img", nested=True)
-            wx.Yield()
-            found_vendor_boot_img = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="vendor_boot.img", nested=True)
-            wx.Yield()
-            found_vendor_kernel_boot_img = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="vendor_kernel_boot.img", nested=True)
-            wx.Yield()
+            firmware_cache = FirmwareCache()
+            artefacts = firmware_cache.lookup(file_to_process)
+            if artefacts:
+                print(f"Found {file_to_process} in the firmware cache.")
+                puml(":Firmware cache hit;\n")
+                members = artefacts['members']
+                found_flash_all_bat = members.get('flash-all.bat', '')
+                found_flash_all_sh = members.get('flash-all.sh', '')
+                found_boot_img = members.get('boot.img', '')
+                found_init_boot_img = members.get('init_boot.img', '')
+                found_vbmeta_img = members.get('vbmeta.img', '')
+                found_vendor_boot_img = members.get('vendor_boot.img', '')
+                found_vendor_kernel_boot_img = members.get('vendor_kernel_boot.img', '')
+            else:
+                archive_index = ArchiveIndex(file_to_process)
+                found_flash_all_bat = archive_index.find("flash-all.bat")
+                wx.Yield()
+                found_flash_all_sh = archive_index.find("flash-all.sh")
+                wx.Yield()
+                found_boot_img = archive_index.find("boot.img", nested=True)
+                wx.Yield()
+                found_init_boot_img = archive_index.find("init_boot.img", nested=True)
+                wx.Yield()
+                found_vbmeta_img = archive_index.find("vbmeta.img", nested=True)
+                wx.Yield()
+                found_vendor_boot_img = archive_index.find("vendor_boot.img", nested=True)
+                wx.Yield()
+                found_vendor_kernel_boot_img = archive_index.find("vendor_kernel_boot.img", nested=True)
+                wx.Yield()
             found_boot_img_lz4 = ''
             set_firmware_has_init_boot(False)
             set_ota(self, False)
@@ -741,12 +758,28 @@ def process_file(self, file_type):
                 package_sig = str(found_flash_all_bat).split('/')[0]
                 package_dir_full = os.path.join(factory_images, package_sig)
                 image_file_path = os.path.join(package_dir_full, f"image-{package_sig}.zip")
-                # Unzip the factory image
+                # Unzip the factory image, on a cache hit only what is missing from the package directory
                 wx.Yield()
-                debug(f"Unzipping Image: {file_to_process} into {package_dir_full} ...")
-                theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{factory_images}\" \"{file_to_process}\""
-                debug(theCmd)
-                res = run_shell2(theCmd)
+                missing = None
+                if artefacts:
+                    for name in ['flash-all.bat', 'flash-all.sh']:
+                        if not os.path.exists(os.path.join(package_dir_full, name)):
+                            firmware_cache.restore(artefacts, [name], package_dir_full)
+                    archive_index = ArchiveIndex(file_to_process)
+                    package_members = archive_index.match(f"{package_sig}/*")
+                    if package_members:
+                        # an interrupted extraction leaves truncated files behind, they are extracted again
+                        sizes = archive_index.sizes
+                        missing = [name for name in package_members if not name.endswith('/') and not (os.path.exists(os.path.join(factory_images, name)) and os.path.getsize(os.path.join(factory_images, name)) == sizes[name])]
+                if missing == []:
+                    print(f"Reusing the extracted firmware in {package_dir_full}")
+                    res = subprocess.CompletedProcess(args=[], returncode=0, stdout='', stderr='')
+                elif missing:
+                    print(f"Restoring {', '.join(os.path.basename(name) for name in missing)} into {package_dir_full} ...")
+                    res = extract_archive(file_to_process, factory_images, missing)
+                else:
+                    debug(f"Unzipping Image: {file_to_process} into {package_dir_full} ...")
+                    res = extract_archive(file_to_process, factory_images)
                 if res and isinstance(res, subprocess.CompletedProcess):
                     debug(f"Return Code: {res.returncode}")
                     debug(f"Stdout: {res.stdout}")
@@ -857,10 +890,8 @@ def process_file(self, file_type):
                     image_file_path = os.path.join(package_dir_full, found_ap)
                     # Unzip the factory image
                     debug(f"Unzipping Image: {file_to_process} into {package_dir_full} ...")
-                    theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{package_dir_full}\" \"{file_to_process}\""
-                    debug(theCmd)
                     wx.Yield()
-                    res = run_shell2(theCmd)
+                    res = extract_archive(file_to_process, package_dir_full)
                     wx.Yield()
                     # see if there is boot.img.lz4 in AP file
                     boot_image_file = ''
@@ -875,10 +906,8 @@ def process_file(self, file_type):
                     if boot_image_file:
                         print(f"Extracting {boot_image_file} from {found_ap} ...")
                         puml(f":Extract {boot_image_file};\n")
-                        theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{package_dir_full}\" \"{image_file_path}\" {boot_image_file}"
                         wx.Yield()
-                        debug(f"{theCmd}")
-                        res = run_shell(theCmd)
+                        res = extract_archive(image_file_path, package_dir_full, [boot_image_file])
                         wx.Yield()
                         # expect ret 0
                         if res and isinstance(res, subprocess.CompletedProcess):
@@ -938,15 +967,16 @@ def process_file(self, file_type):
                 puml("#orange:Large firmware file detected;\n")
                 wx.Yield()
             wx.Yield()
-            found_boot_img = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="boot.img", nested=False)
+            archive_index = ArchiveIndex(file_to_process, nested=False)
+            found_boot_img = archive_index.find("boot.img")
             wx.Yield()
-            found_init_boot_img = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="init_boot.img", nested=False)
+            found_init_boot_img = archive_index.find("init_boot.img")
             wx.Yield()
-            found_vbmeta_img = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="vbmeta.img", nested=False)
+            found_vbmeta_img = archive_index.find("vbmeta.img")
             wx.Yield()
-            found_vendor_boot_img = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="vendor_boot.img", nested=False)
+            found_vendor_boot_img = archive_index.find("vendor_boot.img")
             wx.Yield()
-            found_vendor_kernel_boot_img = check_archive_contains_file(archive_file_path=file_to_process, file_to_check="vendor_kernel_boot.img", nested=False)
+            found_vendor_kernel_boot_img = archive_index.find("vendor_kernel_boot.img")
             wx.Yield()
             set_rom_has_init_boot(False)
             if found_init_boot_img:
@@ -971,38 +1001,45 @@ def process_file(self, file_type):
             temp_dir = tempfile.TemporaryDirectory()
             temp_dir_path = temp_dir.name
             try:
-                print(f"Extracting payload.bin from {file_to_process} ...")
-                puml(":Extract payload.bin;\n")
-                theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{temp_dir_path}\" \"{file_to_process}\" payload.bin"
-                debug(f"{theCmd}")
-                wx.Yield()
-                res = run_shell(theCmd)
-                wx.Yield()
-                # expect ret 0
-                if res and isinstance(res, subprocess.CompletedProcess):
-                    debug(f"Return Code: {res.returncode}")
-                    debug(f"Stdout: {res.stdout}")
-                    debug(f"Stderr: {res.stderr}")
-                    if res.returncode != 0:
+                # OTA zips store payload.bin uncompressed, in that case it is read in place
+                # and only the pages of the requested partitions are touched.
+                payload_offset = 0
+                payload_member = zip_member_offset(file_to_process, 'payload.bin')
+                if payload_member:
+                    payload_file_path = file_to_process
+                    payload_offset = payload_member[0]
+                    debug(f"payload.bin is stored in {file_to_process} at offset {payload_offset}, reading it in place.")
+                else:
+                    print(f"Extracting payload.bin from {file_to_process} ...")
+                    puml(":Extract payload.bin;\n")
+                    wx.Yield()
+                    res = extract_archive(file_to_process, temp_dir_path, ['payload.bin'])
+                    wx.Yield()
+                    # expect ret 0
+                    if res and isinstance(res, subprocess.CompletedProcess):
+                        debug(f"Return Code: {res.returncode}")
+                        debug(f"Stdout: {res.stdout}")
+                        debug(f"Stderr: {res.stderr}")
+                        if res.returncode != 0:
+                            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not extract payload.bin.")
+                            puml("#red:ERROR: Could not extract payload.bin;\n")
+                            print("Aborting ...\n")
+                            self.toast(_("Process action"), _("❌ Could not extract payload.bin."))
+                            return
+                    else:
                         print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not extract payload.bin.")
                         puml("#red:ERROR: Could not extract payload.bin;\n")
                         print("Aborting ...\n")
                         self.toast(_("Process action"), _("❌ Could not extract payload.bin."))
                         return
-                else:
-                    print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not extract payload.bin.")
-                    puml("#red:ERROR: Could not extract payload.bin;\n")
-                    print("Aborting ...\n")
-                    self.toast(_("Process action"), _("❌ Could not extract payload.bin."))
-                    return
+                    payload_file_path = os.path.join(temp_dir_path, "payload.bin")
                 # extract boot.img, init_boot.img, vbmeta.img from payload.bin, ...
-                payload_file_path = os.path.join(temp_dir_path, "payload.bin")
                 if not os.path.exists(package_dir_full):
                     os.makedirs(package_dir_full, exist_ok=True)
                 if self.config.extra_img_extracts:
                     print("Option to copy extra img files is enabled.")
                     wx.Yield()
-                    extract_payload(payload_file_path, out=package_dir_full, diff=False, old='old', images='boot,vbmeta,init_boot,dtbo,super_empty,vendor_boot,vendor_kernel_boot')
+                    extract_payload(payload_file_path, out=package_dir_full, diff=False, old='old', images='boot,vbmeta,init_boot,dtbo,super_empty,vendor_boot,vendor_kernel_boot', payload_offset=payload_offset, verify='full')
                     wx.Yield()
                     if os.path.exists(os.path.join(package_dir_full, 'dtbo.img')):
                         dtbo_img_file = os.path.join(package_dir_full, 'dtbo.img')
@@ -1023,7 +1060,7 @@ def process_file(self, file_type):
                 else:
                     print("Extracting files from payload.bin ...")
                     wx.Yield()
-                    extract_payload(payload_file_path, out=package_dir_full, diff=False, old='old', images='boot,vbmeta,init_boot,vendor_boot')
+                    extract_payload(payload_file_path, out=package_dir_full, diff=False, old='old', images='boot,vbmeta,init_boot,vendor_boot', payload_offset=payload_offset, verify='full')
                     wx.Yield()
                 if os.path.exists(os.path.join(package_dir_full, 'boot.img')):
                     boot_img_file = os.path.join(package_dir_full, 'boot.img')
@@ -1092,7 +1129,9 @@ def process_file(self, file_type):
                     print("This could take some more time, please wait ...")
                     puml(f":Extract {files_to_extract};\n")
                     wx.Yield()
-                    if file_ext in ['.tgz']:
+                    if artefacts and firmware_cache.restore(artefacts, files_to_extract.split(), tmp_dir_full):
+                        print(f"Restored {files_to_extract} from the firmware cache")
+                    elif file_ext in ['.tgz']:
                         res = extract_from_nested_tgz(image_file_path, files_to_extract, tmp_dir_full)
                         if not res:
                             print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not extract {boot_file_name}.")
@@ -1101,10 +1140,8 @@ def process_file(self, file_type):
                             print("Aborting ...\n")
                             return
                     else:
-                        theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{tmp_dir_full}\" \"{image_file_path}\" {files_to_extract}"
-                        debug(f"{theCmd}")
                         wx.Yield()
-                        res = run_shell(theCmd)
+                        res = extract_archive(image_file_path, tmp_dir_full, files_to_extract.split())
                         # expect ret 0
                         if res and isinstance(res, subprocess.CompletedProcess):
                             debug(f"Return Code: {res.returncode}")
@@ -1123,6 +1160,22 @@ def process_file(self, file_type):
                             print("Aborting ...\n")
                             return
 
+                    # keep what was extracted from the Pixel factory image for the next time it is processed
+                    if firmware_cache and not artefacts and found_flash_all_bat and found_flash_all_sh:
+                        cached_files = {name: os.path.join(tmp_dir_full, name) for name in files_to_extract.split()}
+                        cached_files['flash-all.bat'] = os.path.join(package_dir_full, 'flash-all.bat')
+                        cached_files['flash-all.sh'] = os.path.join(package_dir_full, 'flash-all.sh')
+                        members = {
+                            'flash-all.bat': found_flash_all_bat,
+                            'flash-all.sh': found_flash_all_sh,
+                            'boot.img': found_boot_img,
+                            'init_boot.img': found_init_boot_img,
+                            'vbmeta.img': found_vbmeta_img,
+                            'vendor_boot.img': found_vendor_boot_img,
+                            'vendor_kernel_boot.img': found_vendor_kernel_boot_img,
+                        }
+                        firmware_cache.store(file_to_process, package_sig, package_dir_full, cached_files, members)
+
         # sometimes the return code is 0 but no file to extract, handle that case.
         # also handle the case of extraction from payload.bin
         if image_file_path:
@@ -6077,6 +6130,97 @@ def live_flash_boot_phone(self, option):  # sourcery skip: de-morgan
     return
 
 
+# ============================================================================
+#                               Function flash_fleet
+# ============================================================================
+def flash_fleet(self, serials, usb_slots=FLEET_USB_SLOTS, progress=None):
+    """Flashes the selected factory firmware, and the selected boot image, to several devices at once.
+
+    Headless counterpart of flash_phone for a fleet of devices of the same model:
+    no dialogs are shown, wipe and the fastboot options come from the config.
+    Only Keep Data and Wipe Data modes are supported, and every device's
+    fastboot product is checked against the firmware model before flashing.
+    Extracting the firmware (if it has not been processed yet) and copying the
+    boot image into the package happen once, before the first device needs them.
+
+    Args:
+        serials:    adb / fastboot serials of the devices to flash.
+        usb_slots:  Number of devices transferring images at the same time.
+        progress:   Optional callable receiving a FleetStatus on every change.
+
+    Returns:
+        {serial: 0 / -1}, -1 if flashing could not start.
+    """
+    try:
+        if not get_adb() or not get_fastboot():
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Android Platform Tools must be set.\n")
+            return -1
+        if self.config.flash_mode not in ['keepData', 'wipeData']:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Fleet flashing only supports factory images in Keep Data or Wipe Data mode, {self.config.flash_mode} is not supported.")
+            return -1
+        package_sig = get_firmware_id()
+        if not package_sig or not serials:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: You must first select a factory firmware file and the devices to flash.")
+            return -1
+        firmware_model = get_firmware_model()
+        if not firmware_model:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: The model of the selected firmware is unknown, devices can not be checked against it.")
+            return -1
+        factory_images = os.path.join(get_config_path(), 'factory_images')
+        boot = get_boot()
+
+        def prepare(plan):
+            flash_all = os.path.join(plan.package_dir, "flash-all.bat" if sys.platform == "win32" else "flash-all.sh")
+            if not os.path.exists(flash_all) and self.config.firmware_path:
+                print(f"Unzipping Image: {self.config.firmware_path} into {plan.package_dir} ...")
+                res = extract_archive(self.config.firmware_path, factory_images)
+                if not (res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0):
+                    print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not extract {self.config.firmware_path}")
+                    return -1
+            flash_file = process_flash_all_file(flash_all)
+            if flash_file == 'ERROR':
+                return -1
+            plan.flash_file = flash_file
+            # do not flash the patch if Temporary root is selected
+            if boot and boot.boot_path and not (self.config.advanced_options and self.config.temporary_root and boot.is_patched):
+                if not os.path.exists(boot.boot_path):
+                    print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: boot file: {boot.boot_path} is not found.")
+                    return -1
+                plan.boot_image = os.path.join(plan.package_dir, "pf_boot.img")
+                debug(f"Copying {boot.boot_path} to {plan.boot_image}")
+                shutil.copy(boot.boot_path, plan.boot_image, follow_symlinks=True)
+                plan.boot_partition = get_selected_boot_partition() or ("init_boot" if boot.is_init_boot else "boot")
+            return 0
+
+        fastboot_options = ''
+        if self.config.advanced_options:
+            if self.config.disable_verity:
+                fastboot_options += '--disable-verity '
+            if self.config.disable_verification:
+                fastboot_options += '--disable-verification '
+            if self.config.fastboot_verbose:
+                fastboot_options += '--verbose '
+        plan = FleetPlan(
+            package_sig,
+            os.path.join(factory_images, package_sig),
+            wipe=self.config.flash_mode == 'wipeData',
+            fastboot_options=fastboot_options.strip(),
+            reboot=not (self.config.advanced_options and self.config.no_reboot),
+            prepare=prepare,
+            hardware=firmware_model
+        )
+        puml("#cyan:Flash Fleet;\n", True)
+        puml(f"note right:{', '.join(serials)}\n")
+        for serial in serials:
+            clear_prop_snapshot(serial)
+        return FleetFlasher({serial: plan for serial in serials}, usb_slots=usb_slots, progress=progress).run()
+    except Exception as e:
+        print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Encountered an error while flashing the fleet.")
+        puml("#red:Encountered an error while flashing the fleet;\n")
+        traceback.print_exc()
+        return -1
+
+
 # ============================================================================
 #                               Function flash_phone
 # ============================================================================
@@ -7070,6 +7214,7 @@ def flash_phone(self):
         # -------------------------------------------------------------------------
         print(f"\nℹ️ {datetime.now():%Y-%m-%d %H:%M:%S} Flashing device: {device_id} ...")
         puml(f":Flashing device: {device_id};\n", True)
+        clear_prop_snapshot(device_id)
         theCmd = flash_pf_file
         os.chdir(package_dir_full)
         theCmd = f"\"{theCmd}\""
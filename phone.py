@@ -34,6 +34,8 @@
 # <https://www.gnu.org/licenses/>.
 
 import contextlib
+import hashlib
+import os
 import re
 import subprocess
 import time
@@ -46,7 +48,9 @@ from packaging.version import parse
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any
 
+from adb_session import adb_devices, adb_exec_out, adb_get_state, adb_shell, adb_transfer, close_sessions, session_stats
 from constants import *
+from device_tracker import ADB_READY_STATES, get_device_tracker
 from runtime import *
 from i18n import _
 
@@ -70,6 +74,40 @@ class Package():
         self.uid = ''
 
 
+# ============================================================================
+#                               Class PackageInventory
+# ============================================================================
+class PackageInventory():
+    """Columnar snapshot of the packages on a device, one list per attribute."""
+    COLUMNS = ('name', 'type', 'installed', 'enabled', 'user0', 'uid', 'version_code', 'last_update', 'path')
+
+    def __init__(self):
+        self.columns = {column: [] for column in self.COLUMNS}
+        self.index = {}
+
+    def __len__(self):
+        return len(self.columns['name'])
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def append(self, name, **values):
+        self.index[name] = len(self.columns['name'])
+        self.columns['name'].append(name)
+        for column in self.COLUMNS[1:]:
+            self.columns[column].append(values.get(column, ''))
+
+    def get(self, name, column):
+        return self.columns[column][self.index[name]]
+
+    def signature(self, name):
+        """Returns what identifies an installed build of the package, (versionCode, lastUpdateTime)."""
+        i = self.index.get(name)
+        if i is None:
+            return None
+        return self.columns['version_code'][i], self.columns['last_update'][i]
+
+
 # ============================================================================
 #                               Class Backup
 # ============================================================================
@@ -134,6 +172,8 @@ class DeviceProps:
 class Device():
     # Class variable
     vendor = "google"
+    # Properties that are read fresh even when the stored property snapshot is reused.
+    volatile_props = ('ro.boot.slot_suffix', 'ro.boot.verifiedbootstate', 'ro.boot.vbmeta.device_state', 'ro.boot.flash.locked', 'sys.boot_completed')
 
     def __init__(self, id, mode, true_mode = None):
         # Instance variables
@@ -191,7 +231,12 @@ class Device():
         self._kernel = None
         self._magisk_denylist_enforced = None
         self._magisk_zygisk_enabled = None
+        self._root_version = None
+        self._root_probe_done = False
+        self._root_probe_paths = {}
+        self.root_probe_timing = {}
         self.packages = {}
+        self.package_inventory: PackageInventory | None = None
         self.backups = {}
         self.vbmeta = {}
         self.props: DeviceProps = DeviceProps()
@@ -271,7 +316,7 @@ class Device():
             return '', ''
         try:
             theCmd = f"\"{get_adb()}\" -s {self.id} shell dumpsys package {package}"
-            res = run_shell(theCmd)
+            res = adb_shell(self.id, f"dumpsys package {package}", fallback_cmd=theCmd)
             if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
                 path = self.get_path_from_details(res.stdout)
                 return res.stdout, path
@@ -291,7 +336,7 @@ class Device():
             return
         try:
             theCmd = f"\"{get_adb()}\" -s {self.id} shell dumpsys battery"
-            res = run_shell(theCmd)
+            res = adb_shell(self.id, "dumpsys battery", fallback_cmd=theCmd)
             if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
                 return res.stdout
             else:
@@ -310,7 +355,7 @@ class Device():
             return
         try:
             theCmd = f"\"{get_adb()}\" -s {self.id} shell getconf PAGE_SIZE"
-            res = run_shell(theCmd)
+            res = adb_shell(self.id, "getconf PAGE_SIZE", fallback_cmd=theCmd)
             if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
                 return res.stdout.strip('\n')
             else:
@@ -360,6 +405,11 @@ class Device():
             If the mode is 'adb', it uses the `getprop` command to fetch the device information using ADB.
             If the mode is 'f.b', it uses the `getvar all` command to fetch the device information using Fastboot.
 
+            In adb mode the output is stored as a snapshot keyed by serial + build fingerprint
+            + boot id, when the key still matches the stored snapshot (and it is not older than
+            PROP_SNAPSHOT_TTL) it is reused and only the volatile properties are read again.
+            getvar all is a single fastboot call and is always run.
+
             Returns:
                 str: The device information.
 
@@ -375,17 +425,26 @@ class Device():
         """
         if self.mode == 'adb':
             if get_adb():
-                if self.rooted:
+                rooted = self.rooted
+                snapshot_mode = 'adb_su' if rooted else 'adb'
+                build_key, boot_id, volatile = self.get_volatile_props()
+                snapshot = get_prop_snapshot(self.id, snapshot_mode, build_key, boot_id)
+                if snapshot:
+                    debug(f"Reusing the property snapshot of {self.id}")
+                    return snapshot + volatile
+                if rooted:
                     theCmd = f"\"{get_adb()}\" -s {self.id} shell \"su -c \'/bin/getprop\'\""
                 else:
                     theCmd = f"\"{get_adb()}\" -s {self.id} shell /bin/getprop"
-                res = run_shell(theCmd, timeout=10)
-                if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 127 or "/system/bin/sh: /bin/getprop: not found" in res.stdout:
-                    if self.rooted:
+                res = adb_shell(self.id, '/bin/getprop', with_su=rooted, timeout=10, fallback_cmd=theCmd)
+                if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 127 or "/bin/getprop: not found" in res.stdout or "/bin/getprop: not found" in res.stderr:
+                    if rooted:
                         theCmd = f"\"{get_adb()}\" -s {self.id} shell \"su -c \'getprop\'\""
                     else:
                         theCmd = f"\"{get_adb()}\" -s {self.id} shell getprop"
-                    res = run_shell(theCmd, timeout=10)
+                    res = adb_shell(self.id, 'getprop', with_su=rooted, timeout=10, fallback_cmd=theCmd)
+                if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
+                    save_prop_snapshot(self.id, snapshot_mode, build_key, boot_id, res.stdout)
                 return ''.join(res.stdout)
             else:
                 print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: adb command is not found!")
@@ -402,6 +461,47 @@ class Device():
                 print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: fastboot command is not found!")
                 puml("#red:ERROR: fastboot command is not found!;\n", True)
 
+    # ----------------------------------------------------------------------------
+    #                               method get_volatile_props
+    # ----------------------------------------------------------------------------
+    def get_volatile_props(self):
+        """
+            Reads what is needed to validate the stored property snapshot, and the volatile properties.
+
+            A single shell script returns ro.build.fingerprint, the kernel boot id, the
+            volatile_props and the battery properties (adb mode only).
+
+            Returns:
+                tuple: (build_key, boot_id, volatile) where volatile is formatted as getprop
+                       output so it can be appended to the snapshot, build_key is '' if it can not be read.
+        """
+        build_key = ''
+        boot_id = ''
+        volatile = ''
+        try:
+            if self.mode == 'adb':
+                script = "echo @@PF:fingerprint; getprop ro.build.fingerprint; echo @@PF:boot_id; cat /proc/sys/kernel/random/boot_id; echo @@PF:volatile; "
+                script += ' '.join(f"echo \"[{prop}]: [$(getprop {prop})]\";" for prop in self.volatile_props)
+                script += " getprop | grep -i battery; true"
+                res = adb_shell(self.id, script, timeout=10)
+                if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
+                    output = {}
+                    section = None
+                    for line in res.stdout.splitlines():
+                        if line.startswith('@@PF:'):
+                            section = line[5:].strip()
+                            output[section] = []
+                        elif section and line.strip():
+                            output[section].append(line.strip())
+                    boot_id = ''.join(output.get('boot_id', []))
+                    if boot_id:
+                        build_key = ''.join(output.get('fingerprint', []))
+                    volatile = '\n' + '\n'.join(output.get('volatile', [])) + '\n'
+        except Exception:
+            traceback.print_exc()
+            return '', '', ''
+        return build_key, boot_id, volatile
+
     # ----------------------------------------------------------------------------
     #                               Method init
     # ----------------------------------------------------------------------------
@@ -752,6 +852,123 @@ class Device():
         except Exception:
             return False
 
+    # ----------------------------------------------------------------------------
+    #                               method probe_root_solutions
+    # ----------------------------------------------------------------------------
+    def probe_root_solutions(self):
+        """
+            Reads the root state, the root solution versions and the root apps paths and versions in one round-trip.
+
+            A single device-side script runs all the checks as background jobs (one after the other
+            if a work directory can't be created in /data/local/tmp), the results populate the
+            cached fields that the root related properties return. It runs once, on the first
+            access of any of these properties, anything it could not determine is left to the
+            property's own command. Apk paths are handed out once, later reads query the device.
+
+            The device-side duration of each check (ms) is kept in root_probe_timing.
+
+            Returns:
+                bool: True if the probe ran.
+        """
+        if self._root_probe_done or self.true_mode != 'adb':
+            return False
+        self._root_probe_done = True
+        solutions = {
+            'magisk': get_magisk_package(),
+            'ksu': KERNEL_SU_PKG_NAME,
+            'ksu_next': KSU_NEXT_PKG_NAME,
+            'sukisu': SUKISU_PKG_NAME,
+            'wild_ksu': WILD_KSU_PKG_NAME,
+            'apatch': APATCH_PKG_NAME,
+            'apatch_next': APATCH_NEXT_PKG_NAME,
+        }
+        try:
+            def section(name, cmd):
+                return f"echo \"@@PF:{name} $(date +%s%N)\"; {{ {cmd}; }} 2>/dev/null; echo \"@@PF:end $(date +%s%N)\""
+
+            jobs = []
+            for solution, pkg in solutions.items():
+                if pkg:
+                    jobs.append(section(f"path:{solution}", f"pm path {pkg}"))
+                    jobs.append(section(f"app:{solution}", f"dumpsys package {pkg} | grep -E \"versionCode=|versionName=\""))
+            jobs.append(section('su_version', "su --version"))
+            if self._rooted is not False:
+                su_sections = [
+                    ('rooted', "ls /data/adb/ >/dev/null && echo 1"),
+                    ('root_version', "su -v"),
+                    ('magisk', "magisk -c || /data/adb/magisk/magisk32 -c"),
+                    ('ksud', "ksud -V || /data/adb/ksud -V"),
+                    ('apd', "apd -V || /data/adb/apd -V"),
+                ]
+                jobs.append(f"$T su -c '{'; '.join(section(name, cmd) for name, cmd in su_sections)}' 2>/dev/null")
+            script = "T=; command -v timeout >/dev/null && T=\"timeout 5\"; d=$(mktemp -d /data/local/tmp/pf_root.XXXXXX 2>/dev/null); "
+            script += "if [ -n \"$d\" ]; then "
+            script += ' '.join(f"{{ {job}; }} > $d/{i} &" for i, job in enumerate(jobs))
+            script += " wait; cat " + ' '.join(f"$d/{i}" for i in range(len(jobs))) + "; rm -rf \"$d\"; "
+            script += "else " + ' '.join(f"{{ {job}; }};" for job in jobs) + " fi"
+            start = time.time()
+            res = adb_shell(self.id, script, timeout=30)
+            if not (res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0):
+                debug(f"Root solution probe failed on {self.id}")
+                return False
+
+            output = {}
+            name = None
+            name_start = None
+            for line in res.stdout.splitlines():
+                if line.startswith('@@PF:'):
+                    marker, _, stamp = line[5:].partition(' ')
+                    stamp = stamp.strip()
+                    if marker == 'end':
+                        if name and name_start is not None and stamp.isdigit():
+                            self.root_probe_timing[name] = round((int(stamp) - name_start) / 1000000, 1)
+                        name = None
+                    else:
+                        name = marker
+                        name_start = int(stamp) if stamp.isdigit() else None
+                        output[name] = []
+                elif name and line.strip():
+                    output[name].append(line.strip())
+            self.root_probe_timing['total'] = round((time.time() - start) * 1000, 1)
+
+            if 'rooted' in output:
+                self._rooted = '1' in output['rooted']
+                self._su_version = '\n'.join(output.get('su_version', [])) if self._rooted else ''
+            if self._rooted:
+                if output.get('root_version'):
+                    self._root_version = output['root_version'][0]
+                if output.get('magisk'):
+                    self._magisk_version, self._magisk_version_code = self._parse_magisk_version('\n'.join(output['magisk']))
+                if output.get('ksud'):
+                    for solution in ('ksu', 'sukisu', 'wild_ksu'):
+                        version, version_code = self._parse_root_solution_version(output['ksud'][0], 'ksud')
+                        setattr(self, f"_{solution}_version", version)
+                        setattr(self, f"_{solution}_version_code", version_code)
+                if output.get('apd'):
+                    self._apatch_version, self._apatch_version_code = self._parse_root_solution_version(output['apd'][0], 'apd')
+            for solution in solutions:
+                if f"app:{solution}" in output:
+                    version, version_code = self._parse_app_version(output[f"app:{solution}"])
+                    setattr(self, f"_{solution}_app_version", version)
+                    setattr(self, f"_{solution}_app_version_code", version_code)
+                path = output.get(f"path:{solution}")
+                if path and ':' in path[0]:
+                    self._root_probe_paths[solution] = path[0].split(':', 1)[1]
+            debug(f"Root solution probe on {self.id}: {self.root_probe_timing}")
+            return True
+        except Exception:
+            traceback.print_exc()
+            print(f"\n⚠️ {datetime.now():%Y-%m-%d %H:%M:%S} WARNING: Could not probe the root solutions.")
+            return False
+
+    # ----------------------------------------------------------------------------
+    #                               method _probed_path
+    # ----------------------------------------------------------------------------
+    def _probed_path(self, solution):
+        # apk path found by probe_root_solutions, None if it is not known or was already handed out.
+        self.probe_root_solutions()
+        return self._root_probe_paths.pop(solution, None)
+
     # ----------------------------------------------------------------------------
     #                               property magisk_path
     # ----------------------------------------------------------------------------
@@ -760,7 +977,7 @@ class Device():
         try:
             magisk_path = get_magisk_package()
             if self.true_mode == 'adb' and magisk_path is not None and magisk_path != '':
-                res = self.get_package_path(magisk_path, True)
+                res = self._probed_path('magisk') or self.get_package_path(magisk_path, True)
                 if res != -1:
                     return res
                 self._rooted = None
@@ -778,6 +995,11 @@ class Device():
     @property
     def root_version(self):
         try:
+            if self.true_mode == 'adb':
+                self.probe_root_solutions()
+                if self._root_version is not None:
+                    root_version, self._root_version = self._root_version, None
+                    return root_version
             if self.true_mode == 'adb' and self.rooted:
                 theCmd = f"\"{get_adb()}\" -s {self.id} shell \"su -c \'su -v\'\""
                 res = run_shell(theCmd)
@@ -796,7 +1018,7 @@ class Device():
     def ksu_path(self):
         try:
             if self.true_mode == 'adb':
-                res = self.get_package_path(KERNEL_SU_PKG_NAME, True)
+                res = self._probed_path('ksu') or self.get_package_path(KERNEL_SU_PKG_NAME, True)
                 if res != -1:
                     return res
                 self._rooted = None
@@ -816,7 +1038,7 @@ class Device():
     def ksu_next_path(self):
         try:
             if self.true_mode == 'adb':
-                res = self.get_package_path(KSU_NEXT_PKG_NAME, True)
+                res = self._probed_path('ksu_next') or self.get_package_path(KSU_NEXT_PKG_NAME, True)
                 if res != -1:
                     return res
                 self._rooted = None
@@ -836,7 +1058,7 @@ class Device():
     def sukisu_path(self):
         try:
             if self.true_mode == 'adb':
-                res = self.get_package_path(SUKISU_PKG_NAME, True)
+                res = self._probed_path('sukisu') or self.get_package_path(SUKISU_PKG_NAME, True)
                 if res != -1:
                     return res
                 self._rooted = None
@@ -856,7 +1078,7 @@ class Device():
     def wild_ksu_path(self):
         try:
             if self.true_mode == 'adb':
-                res = self.get_package_path(WILD_KSU_PKG_NAME, True)
+                res = self._probed_path('wild_ksu') or self.get_package_path(WILD_KSU_PKG_NAME, True)
                 if res != -1:
                     return res
                 self._rooted = None
@@ -876,7 +1098,7 @@ class Device():
     def apatch_path(self):
         try:
             if self.true_mode == 'adb':
-                res = self.get_package_path(APATCH_PKG_NAME, True)
+                res = self._probed_path('apatch') or self.get_package_path(APATCH_PKG_NAME, True)
                 if res != -1:
                     return res
                 self._rooted = None
@@ -894,21 +1116,14 @@ class Device():
     # ----------------------------------------------------------------------------
     @property
     def magisk_version(self):
+        if self._magisk_version is None and self.true_mode == 'adb':
+            self.probe_root_solutions()
         if self._magisk_version is None and self.true_mode == 'adb' and self.rooted:
             try:
                 theCmd = f"\"{get_adb()}\" -s {self.id} shell \"su -c \'magisk -c\'\""
                 res = run_shell(theCmd)
                 if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
-                    regex = re.compile(r"(.*?):.*\((.*?)\)")
-                    m = re.findall(regex, res.stdout)
-                    if m:
-                        self._magisk_version = f"{m[0][0]}:{m[0][1]}"
-                        self._magisk_version_code = f"{m[0][1]}"
-                    else:
-                        self._magisk_version = res.stdout
-                        self._magisk_version_code = res.stdout
-                        self._magisk_version_code = self._magisk_version.strip(':')
-                    self._magisk_version = self._magisk_version.strip('\n')
+                    self._magisk_version, self._magisk_version_code = self._parse_magisk_version(res.stdout)
             except Exception:
                 try:
                     theCmd = f"\"{get_adb()}\" -s {self.id} shell \"su -c \'/data/adb/magisk/magisk32 -c\'\""
@@ -925,6 +1140,37 @@ class Device():
                     self._magisk_zygisk_enabled = None
         return self._magisk_version
 
+    # ----------------------------------------------------------------------------
+    #                               method _parse_magisk_version
+    # ----------------------------------------------------------------------------
+    @staticmethod
+    def _parse_magisk_version(output):
+        # magisk -c output, returns (version, version_code)
+        regex = re.compile(r"(.*?):.*\((.*?)\)")
+        m = re.findall(regex, output)
+        if m:
+            return f"{m[0][0]}:{m[0][1]}", f"{m[0][1]}"
+        return output.strip('\n'), output.strip(':')
+
+    # ----------------------------------------------------------------------------
+    #                               method _parse_root_solution_version
+    # ----------------------------------------------------------------------------
+    @staticmethod
+    def _parse_root_solution_version(output, cmd_name):
+        # apd -V / ksud -V output, returns (version, version_code)
+        # Both APatch and KSU return format like "apd 10930" or "ksud 12345"
+        output = output.strip('\n')
+        parts = output.split()
+        if len(parts) >= 2 and parts[0] == cmd_name:
+            version_code = parts[1]
+            return f"{cmd_name}:{version_code}", version_code
+        # Fallback to original parsing for compatibility in case it changes to Magisk style
+        regex = re.compile(r"(.*?):.*\((.*?)\)")
+        m = re.findall(regex, output)
+        if m:
+            return f"{m[0][0]}:{m[0][1]}", f"{m[0][1]}"
+        return output, output.strip(':')
+
     # ----------------------------------------------------------------------------
     #                               method _get_root_solution_version
     # ----------------------------------------------------------------------------
@@ -951,25 +1197,7 @@ class Device():
         try:
             res = run_shell(primary_cmd)
             if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
-                # Both APatch and KSU return format like "apd 10930" or "ksud 12345"
-                output = res.stdout.strip('\n')
-                parts = output.split()
-                if len(parts) >= 2 and parts[0] == cmd_name:
-                    version_code = parts[1]
-                    version = f"{cmd_name}:{version_code}"
-                    return version, version_code
-                else:
-                    # Fallback to original parsing for compatibility in case it changes to Magisk style
-                    regex = re.compile(r"(.*?):.*\((.*?)\)")
-                    m = re.findall(regex, output)
-                    if m:
-                        version = f"{m[0][0]}:{m[0][1]}"
-                        version_code = f"{m[0][1]}"
-                        return version, version_code
-                    else:
-                        version = output
-                        version_code = output.strip(':')
-                        return version, version_code
+                return self._parse_root_solution_version(res.stdout, cmd_name)
         except Exception:
             try:
                 res = run_shell(fallback_cmd)
@@ -999,6 +1227,8 @@ class Device():
     # ----------------------------------------------------------------------------
     @property
     def apatch_version(self):
+        if self._apatch_version is None and self.true_mode == 'adb':
+            self.probe_root_solutions()
         if self._apatch_version is None and self.true_mode == 'adb' and self.rooted:
             self._apatch_version, self._apatch_version_code = self._get_root_solution_version('apatch')
         return self._apatch_version
@@ -1008,6 +1238,8 @@ class Device():
     # ----------------------------------------------------------------------------
     @property
     def ksu_version(self):
+        if self._ksu_version is None and self.true_mode == 'adb':
+            self.probe_root_solutions()
         if self._ksu_version is None and self.true_mode == 'adb' and self.rooted:
             self._ksu_version, self._ksu_version_code = self._get_root_solution_version('ksu')
         return self._ksu_version
@@ -1017,6 +1249,8 @@ class Device():
     # ----------------------------------------------------------------------------
     @property
     def sukisu_version(self):
+        if self._sukisu_version is None and self.true_mode == 'adb':
+            self.probe_root_solutions()
         if self._sukisu_version is None and self.true_mode == 'adb' and self.rooted:
             self._sukisu_version, self._sukisu_version_code = self._get_root_solution_version('sukisu')
         return self._sukisu_version
@@ -1026,6 +1260,8 @@ class Device():
     # ----------------------------------------------------------------------------
     @property
     def wild_ksu_version(self):
+        if self._wild_ksu_version is None and self.true_mode == 'adb':
+            self.probe_root_solutions()
         if self._wild_ksu_version is None and self.true_mode == 'adb' and self.rooted:
             self._wild_ksu_version, self._wild_ksu_version_code = self._get_root_solution_version('wild_ksu')
         return self._wild_ksu_version
@@ -2093,6 +2329,219 @@ add_hosts_module
             print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not dump the partition")
             return -1, ''
 
+    # ----------------------------------------------------------------------------
+    #                               Method get_partition_sizes
+    # ----------------------------------------------------------------------------
+    def get_partition_sizes(self, partitions) -> dict | int:
+        """Method gets the byte sizes of partitions with a single root shell call.
+
+        Args:
+            partitions:     List of partition names (including the slot suffix if any)
+
+        Returns:
+            {partition: size}   for the partitions that could be sized.
+            -1                  if an exception is raised.
+        """
+        if self.true_mode != 'adb' or not self.rooted:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not get partition sizes. Device must be in ADB mode and be rooted.")
+            return -1
+        try:
+            if self.bootdevice_string is None:
+                self.get_partitions()
+            names = ' '.join(partitions)
+            cmd = f"for p in {names}; do echo $p $(blockdev --getsize64 {self.bootdevice_string}/$p); done"
+            res = adb_shell(self.id, cmd, with_su=True, timeout=30)
+            sizes = {}
+            if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
+                for line in res.stdout.splitlines():
+                    fields = line.split()
+                    if len(fields) == 2 and fields[1].isdigit():
+                        sizes[fields[0]] = int(fields[1])
+            else:
+                debug(f"Returncode: {res.returncode}")
+                debug(f"Stderr: {res.stderr}")
+            return sizes
+        except Exception as e:
+            traceback.print_exc()
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not get partition sizes")
+            return -1
+
+    # ----------------------------------------------------------------------------
+    #                               Method stream_partitions
+    # ----------------------------------------------------------------------------
+    def stream_partitions(self, targets, compression: str = '', resume = True, progress = None, sizes = None) -> tuple[int, list]:
+        """Method streams partitions straight from the device into local files.
+
+        All partitions are read by one `su -c dd` script over a single adb
+        exec-out stream, so nothing is staged in /data/local/tmp. Each
+        partition is preceded by a header line and its size is known
+        beforehand, which lets a short read be detected.
+
+        Args:
+            targets:        List of (partition, local_file) tuples.
+            compression:    One of constants.DUMP_FORMATS: '' for a raw image, 'gz', 'xz', 'zst'
+                            or 'sparse' (Android sparse image). The format's extension
+                            is appended to local_file.
+            resume:         Resume raw dumps from a leftover <local_file>.part (Default: True)
+            progress:       Called as progress(partition, bytes_done, total_bytes) (Default: None)
+            sizes:          {partition: size} if already known (Default: None, queried)
+
+        Returns:
+            0, results      if all partitions are dumped.
+            -1, results     otherwise; results only lists the completed partitions.
+            Each result is a dict with partition, path, format, size, stored_size, sha256 and seconds.
+        """
+        results = []
+        if self.true_mode != 'adb' or not self.rooted:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not dump partition. Device must be in ADB mode and be rooted.")
+            return -1, results
+        stream = None
+        out = None
+        try:
+            if compression not in DUMP_FORMATS:
+                print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Unsupported compression: {compression}")
+                return -1, results
+            if sizes is None:
+                sizes = self.get_partition_sizes([partition for partition, local_file in targets])
+            if sizes == -1:
+                return -1, results
+
+            plan = []
+            script = []
+            for partition, local_file in targets:
+                if partition not in sizes:
+                    print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not get the size of partition {partition}")
+                    return -1, results
+                local_file = f"{local_file}{DUMP_FORMATS[compression]}"
+                partial = f"{local_file}.part"
+                offset = 0
+                if resume and not compression and os.path.exists(partial):
+                    offset = min(os.path.getsize(partial), sizes[partition]) // DUMP_BLOCK_SIZE * DUMP_BLOCK_SIZE
+                    if offset:
+                        print(f"Resuming dump of {partition} at offset {offset} ...")
+                elif os.path.exists(partial):
+                    os.remove(partial)
+                plan.append((partition, local_file, partial, sizes[partition], offset))
+                script.append(f"echo PFDUMP:{partition}; dd if={self.bootdevice_string}/{partition} bs={DUMP_BLOCK_SIZE} skip={offset // DUMP_BLOCK_SIZE} 2>/dev/null")
+            script.append("echo PFDUMP:END")
+            script = '; '.join(script)
+
+            puml(f":Stream Partitions;\nnote right:Partitions: {', '.join(partition for partition, local_file in targets)};\n", True)
+            fallback_cmd = f"\"{get_adb()}\" -s {self.id} exec-out \"su -c \'{script}\'\""
+            stream = adb_exec_out(self.id, f"su -c '{script}'", fallback_cmd=fallback_cmd)
+            for partition, local_file, partial, total, offset in plan:
+                start = time.time()
+                header = stream.readline()
+                if header != f"PFDUMP:{partition}\n".encode():
+                    print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Unexpected stream header before {partition}: {header[:64]!r}")
+                    return -1, results
+                sha256 = hashlib.sha256()
+                if offset:
+                    with open(partial, 'r+b') as f:
+                        f.truncate(offset)
+                        while chunk := f.read(DUMP_BLOCK_SIZE):
+                            sha256.update(chunk)
+                    out = open(partial, 'ab')
+                else:
+                    out = open_dump_writer(partial, compression)
+                done = offset
+                while done < total:
+                    chunk = stream.read(min(DUMP_BLOCK_SIZE, total - done))
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    out.write(chunk)
+                    done += len(chunk)
+                    if progress:
+                        progress(partition, done, total)
+                out.close()
+                out = None
+                if done != total:
+                    print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Stream of {partition} ended after {done} of {total} bytes")
+                    return -1, results
+                os.replace(partial, local_file)
+                seconds = time.time() - start
+                results.append({'partition': partition, 'path': local_file, 'format': compression or 'raw', 'size': total, 'stored_size': os.path.getsize(local_file), 'sha256': sha256.hexdigest(), 'seconds': round(seconds, 3)})
+                debug(f"Dumped {partition} ({total} bytes) in {seconds:.2f}s, {(total - offset) / max(seconds, 0.001) / 1048576:.1f} MB/s, sha256: {sha256.hexdigest()}")
+            if stream.readline() != b"PFDUMP:END\n":
+                print(f"\n⚠️ {datetime.now():%Y-%m-%d %H:%M:%S} WARNING: Partition stream did not end cleanly.")
+            return 0, results
+        except Exception as e:
+            traceback.print_exc()
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not stream the partitions")
+            return -1, results
+        finally:
+            if out is not None:
+                out.close()
+            if stream is not None:
+                stream.close()
+
+    # ----------------------------------------------------------------------------
+    #                               Method backup_partitions
+    # ----------------------------------------------------------------------------
+    def backup_partitions(self, partitions, out_dir: str, compression: str = 'sparse', concurrency: int = 2, progress = None) -> tuple[int, dict]:
+        """Method dumps several partitions concurrently and writes a manifest.
+
+        The partitions are spread over `concurrency` exec streams, largest
+        first, so the streams carry about the same number of bytes. A
+        partitions_manifest.json with the size and SHA-256 of every raw
+        partition is written to out_dir so restores can be verified.
+
+        Args:
+            partitions:     List of partition names.
+            out_dir:        Local directory for the images and the manifest.
+            compression:    Output format, see stream_partitions (Default: 'sparse')
+            concurrency:    Number of simultaneous device-side dd streams (Default: 2)
+            progress:       Called as progress(partition, bytes_done, total_bytes) (Default: None)
+
+        Returns:
+            0, manifest     if all partitions are backed up.
+            -1, manifest    otherwise; the manifest lists the completed partitions.
+        """
+        manifest = {'device': self.id, 'hardware': self.hardware, 'build': self.build, 'date': f"{datetime.now():%Y-%m-%d %H:%M:%S}", 'format': compression or 'raw', 'partitions': []}
+        try:
+            start = time.time()
+            sizes = self.get_partition_sizes(partitions)
+            if sizes == -1:
+                return -1, manifest
+            missing = [partition for partition in partitions if partition not in sizes]
+            if missing:
+                print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not get the size of partitions: {', '.join(missing)}")
+                return -1, manifest
+            concurrency = max(1, min(concurrency, len(partitions)))
+            groups = [[] for i in range(concurrency)]
+            loads = [0] * concurrency
+            for partition in sorted(partitions, key=lambda p: sizes[p], reverse=True):
+                i = loads.index(min(loads))
+                groups[i].append((partition, os.path.join(out_dir, f"{partition}.img")))
+                loads[i] += sizes[partition]
+
+            rc = 0
+            results = []
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = [executor.submit(self.stream_partitions, group, compression, True, progress, sizes) for group in groups]
+                for future in as_completed(futures):
+                    res, group_results = future.result()
+                    results.extend(group_results)
+                    if res != 0:
+                        rc = -1
+
+            order = {partition: i for i, partition in enumerate(partitions)}
+            for result in sorted(results, key=lambda r: order[r['partition']]):
+                entry = dict(result)
+                entry['file'] = os.path.basename(entry.pop('path'))
+                manifest['partitions'].append(entry)
+            manifest['seconds'] = round(time.time() - start, 3)
+            manifest['size'] = sum(entry['size'] for entry in manifest['partitions'])
+            manifest['stored_size'] = sum(entry['stored_size'] for entry in manifest['partitions'])
+            with open(os.path.join(out_dir, 'partitions_manifest.json'), 'w', encoding='utf-8', newline='\n') as f:
+                json.dump(manifest, f, indent=4)
+            return rc, manifest
+        except Exception as e:
+            traceback.print_exc()
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not back up the partitions")
+            return -1, manifest
+
     # ----------------------------------------------------------------------------
     #                               Method su_cp_on_device
     # ----------------------------------------------------------------------------
@@ -2164,7 +2613,7 @@ add_hosts_module
             else:
                 debug(f"Checking for {file_path} on the device ...")
                 theCmd = f"\"{get_adb()}\" -s {self.id} shell ls \"{file_path}\""
-            res = run_shell(theCmd, timeout=3)
+            res = adb_shell(self.id, f"ls \"{file_path}\"", with_su=with_su, timeout=3, fallback_cmd=theCmd) if theCmd else None
             if res and isinstance(res, subprocess.CompletedProcess):
                 # don't output debug when checking partitions as it's too verbose
                 if not '/dev/block/' in file_path:
@@ -2299,7 +2748,7 @@ add_hosts_module
             else:
                 debug(f"Getting file content of {file_path} on the device ...")
                 theCmd = f"\"{get_adb()}\" -s {self.id} shell cat \"{file_path}\""
-            res = run_shell(theCmd)
+            res = adb_shell(self.id, f"cat \"{file_path}\"", with_su=with_su, fallback_cmd=theCmd) if theCmd else None
             if res and isinstance(res, subprocess.CompletedProcess):
                 debug(f"Returncode: {res.returncode}")
                 debug(f"Stdout: {res.stdout}")
@@ -2319,7 +2768,7 @@ add_hosts_module
     # ----------------------------------------------------------------------------
     #                               Method push_file
     # ----------------------------------------------------------------------------
-    def push_file(self, local_file: str, file_path: str, with_su = False) -> int:
+    def push_file(self, local_file: str, file_path: str, with_su = False, progress = None) -> int:
         """
             Pushes a file to the device.
 
@@ -2327,6 +2776,7 @@ add_hosts_module
                 local_file (str): Local file path.
                 file_path (str): Full file path on the device.
                 with_su (bool, optional): Perform the action as root. Defaults to False.
+                progress (callable, optional): Called as progress(bytes_done, total_bytes) while streaming. Defaults to None.
 
             Returns:
                 int: 0 if the file is pushed, -1 if an exception is raised.
@@ -2353,7 +2803,7 @@ add_hosts_module
                     debug(f"Pushing local file as root: {local_file} to the device: {file_path} ...")
                     filename = os.path.basename(urlparse(local_file).path)
                     remote_file = f"\"/data/local/tmp/{filename}\""
-                    res = self.push_file(local_file, remote_file, with_su=False)
+                    res = self.push_file(local_file, remote_file, with_su=False, progress=progress)
                     if res != 0:
                         print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not push {local_file}")
                         return -1
@@ -2368,7 +2818,7 @@ add_hosts_module
             else:
                 debug(f"Pushing local file: {local_file} to the device: {file_path} ...")
                 theCmd = f"\"{get_adb()}\" -s {self.id} push \"{local_file}\" \"{file_path}\""
-                res = run_shell(theCmd)
+                res = adb_transfer(self.id, 'push', local_file, file_path, progress=progress, fallback_cmd=theCmd)
                 if res and isinstance(res, subprocess.CompletedProcess):
                     debug(f"Returncode: {res.returncode}")
                     debug(f"Stdout: {res.stdout}")
@@ -2388,13 +2838,14 @@ add_hosts_module
     # ----------------------------------------------------------------------------
     #                               Method pull_file
     # ----------------------------------------------------------------------------
-    def pull_file(self, remote_file: str, local_file: str, with_su = False, quiet = False) -> int:
+    def pull_file(self, remote_file: str, local_file: str, with_su = False, quiet = False, progress = None) -> int:
         """Method pulls a file from the device.
 
         Args:
             remote_file:    Full file path on the device
             local_file:     Local file path.
             with_su:        Perform the action as root (Default: False)
+            progress:       Called as progress(bytes_done, total_bytes) while streaming (Default: None)
 
         Returns:
             0               if file is pulled.
@@ -2433,7 +2884,7 @@ add_hosts_module
                 os.remove(local_file)
             debug(f"Pulling remote file: {remote_file} from the device to: {local_file} ...")
             theCmd = f"\"{get_adb()}\" -s {self.id} pull \"{remote_file}\" \"{local_file}\""
-            res = run_shell(theCmd)
+            res = adb_transfer(self.id, 'pull', remote_file, local_file, progress=progress, fallback_cmd=theCmd)
             if res and isinstance(res, subprocess.CompletedProcess):
                 debug(f"Returncode: {res.returncode}")
                 debug(f"Stdout: {res.stdout}")
@@ -2692,6 +3143,87 @@ add_hosts_module
             print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not get package {pkg} label.")
             return -1, -1
 
+    # ----------------------------------------------------------------------------
+    #                               Method get_package_labels
+    # ----------------------------------------------------------------------------
+    def get_package_labels(self, pkg_paths: dict, workers = 4, aapt2 = "/data/local/tmp/aapt2") -> dict | int:
+        """Method gets the labels (App names) of many packages in one shell invocation.
+
+        The package list is pushed to the device and split across `workers`
+        background jobs, each running aapt2 badging over its share of the APKs.
+        aapt2 must already be on the device (see push_aapt2).
+
+        Args:
+            pkg_paths:  dict of package -> APK path, an empty path is looked up with pm path on the device.
+            workers:    Number of concurrent aapt2 jobs on the device. Default 4
+            aapt2:      aapt2 path on the device (Default: /data/local/tmp/aapt2)
+
+        Returns:
+            dict        package -> (label, icon, pkg_path) on success, packages aapt2 could not label are left out.
+            -1          if an exception is raised.
+        """
+        if self.true_mode != 'adb':
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not get package labels. Device is not in ADB mode.")
+            return -1
+        if not pkg_paths:
+            return {}
+        list_path = "/data/local/tmp/pf_labels.list"
+        try:
+            workers = max(1, min(workers, len(pkg_paths)))
+            the_list = os.path.join(get_config_path(), 'tmp', 'pf_labels.list')
+            with open(the_list, "w", encoding="utf-8", newline='\n') as f:
+                for pkg, pkg_path in pkg_paths.items():
+                    f.write(f"{pkg} {pkg_path or ''}\n")
+            res = self.push_file(the_list, list_path)
+            with contextlib.suppress(Exception):
+                os.remove(the_list)
+            if res != 0:
+                print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not push the package list.")
+                return -1
+
+            # job i handles every workers-th line of the list, starting at line i
+            job = f"job() {{ n=0; while read -r pkg p; do if [ $((n % {workers})) -eq $1 ]; then "
+            job += "[ -z \"$p\" ] && p=$(pm path $pkg 2>/dev/null | head -n 1 | cut -d: -f2); "
+            job += f"echo \"@@PF:$pkg $p\"; [ -n \"$p\" ] && {aapt2} d badging \"$p\" 2>/dev/null | grep -E \"^application-label:|^application: label=\"; "
+            job += f"fi; n=$((n+1)); done < {list_path}; }}; "
+            script = f"d=$(mktemp -d /data/local/tmp/pf_labels.XXXXXX) && {{ {job}"
+            script += ' '.join(f"job {i} > $d/{i} &" for i in range(workers))
+            script += f" wait; cat $d/*; rm -rf \"$d\" {list_path}; }}"
+            print(f"Getting {len(pkg_paths)} package labels from the device ({workers} jobs) ...")
+            start = time.time()
+            res = adb_shell(self.id, script, timeout=max(120, len(pkg_paths)))
+            if not res or not isinstance(res, subprocess.CompletedProcess) or res.returncode != 0:
+                print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not get package labels.")
+                if res and isinstance(res, subprocess.CompletedProcess):
+                    print(f"Return Code: {res.returncode}")
+                    print(f"Stderr: {res.stderr}")
+                return -1
+
+            regex = re.compile("application: label='(.*)' icon='([^']*)'")
+            regex_fallback = re.compile("application-label:'(.*)'")
+            labels = {}
+            pkg = None
+            for line in res.stdout.splitlines():
+                if line.startswith('@@PF:'):
+                    pkg, _sep, pkg_path = line[5:].partition(' ')
+                    pkg_path = pkg_path.strip()
+                    continue
+                if not pkg:
+                    continue
+                m = regex.match(line)
+                if m and m.group(1):
+                    labels[pkg] = (m.group(1), m.group(2), pkg_path)
+                    continue
+                m = regex_fallback.match(line)
+                if m and pkg not in labels:
+                    labels[pkg] = (m.group(1), '', pkg_path)
+            debug(f"Resolved {len(labels)} / {len(pkg_paths)} package labels in {time.time() - start:.2f}s")
+            return labels
+        except Exception as e:
+            traceback.print_exc()
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not get package labels.")
+            return -1
+
     # ----------------------------------------------------------------------------
     #                               Method get_package_permissions
     # ----------------------------------------------------------------------------
@@ -2809,6 +3341,8 @@ add_hosts_module
     # ----------------------------------------------------------------------------
     @property
     def magisk_app_version(self):
+        if self._magisk_app_version is None and self.true_mode == 'adb' and get_magisk_package():
+            self.probe_root_solutions()
         if self._magisk_app_version is None and self.true_mode == 'adb' and get_magisk_package():
             self._magisk_app_version, self._magisk_app_version_code = self.get_app_version(get_magisk_package())
         return self._magisk_app_version
@@ -2818,6 +3352,8 @@ add_hosts_module
     # ----------------------------------------------------------------------------
     @property
     def ksu_app_version(self):
+        if self._ksu_app_version is None and self.true_mode == 'adb':
+            self.probe_root_solutions()
         if self._ksu_app_version is None and self.true_mode == 'adb':
             self._ksu_app_version, self._ksu_app_version_code = self.get_app_version(KERNEL_SU_PKG_NAME)
         return self._ksu_app_version
@@ -2827,6 +3363,8 @@ add_hosts_module
     # ----------------------------------------------------------------------------
     @property
     def ksu_next_app_version(self):
+        if self._ksu_next_app_version is None and self.true_mode == 'adb':
+            self.probe_root_solutions()
         if self._ksu_next_app_version is None and self.true_mode == 'adb':
             self._ksu_next_app_version, self._ksu_next_app_version_code = self.get_app_version(KSU_NEXT_PKG_NAME)
         return self._ksu_next_app_version
@@ -2836,6 +3374,8 @@ add_hosts_module
     # ----------------------------------------------------------------------------
     @property
     def sukisu_app_version(self):
+        if self._sukisu_app_version is None and self.true_mode == 'adb':
+            self.probe_root_solutions()
         if self._sukisu_app_version is None and self.true_mode == 'adb':
             self._sukisu_app_version, self._sukisu_app_version_code = self.get_app_version(SUKISU_PKG_NAME)
         return self._sukisu_app_version
@@ -2845,6 +3385,8 @@ add_hosts_module
     # ----------------------------------------------------------------------------
     @property
     def wild_ksu_app_version(self):
+        if self._wild_ksu_app_version is None and self.true_mode == 'adb':
+            self.probe_root_solutions()
         if self._wild_ksu_app_version is None and self.true_mode == 'adb':
             self._wild_ksu_app_version, self._wild_ksu_app_version_code = self.get_app_version(WILD_KSU_PKG_NAME)
         return self._wild_ksu_app_version
@@ -2854,6 +3396,8 @@ add_hosts_module
     # ----------------------------------------------------------------------------
     @property
     def apatch_app_version(self):
+        if self._apatch_app_version is None and self.true_mode == 'adb':
+            self.probe_root_solutions()
         if self._apatch_app_version is None and self.true_mode == 'adb':
             self._apatch_app_version, self._apatch_app_version_code = self.get_app_version(APATCH_PKG_NAME)
         return self._apatch_app_version
@@ -2863,6 +3407,8 @@ add_hosts_module
     # ----------------------------------------------------------------------------
     @property
     def apatch_next_app_version(self):
+        if self._apatch_next_app_version is None and self.true_mode == 'adb':
+            self.probe_root_solutions()
         if self._apatch_next_app_version is None and self.true_mode == 'adb':
             self._apatch_next_app_version, self._apatch_next_app_version_code = self.get_app_version(APATCH_NEXT_PKG_NAME)
         return self._apatch_next_app_version
@@ -2935,24 +3481,35 @@ add_hosts_module
     #                               method app_version
     # ----------------------------------------------------------------------------
     def get_app_version(self, pkg):
-        version = ''
-        versionCode = ''
         if pkg and self.true_mode == 'adb':
             try:
                 theCmd = f"\"{get_adb()}\" -s {self.id} shell dumpsys package {pkg}"
                 res = run_shell(theCmd)
-                data = res.stdout.split('\n')
-                for line in data:
-                    if re.search('versionCode', line):
-                        versionCode = line.split('=')
-                        versionCode = versionCode[1]
-                        versionCode = versionCode.split(' ')
-                        versionCode = versionCode[0]
-                    if re.search('versionName', line):
-                        version = line.split('=')
-                        version = version[1]
+                return self._parse_app_version(res.stdout.split('\n'))
             except Exception:
                 return '', ''
+        return '', ''
+
+    # ----------------------------------------------------------------------------
+    #                               method _parse_app_version
+    # ----------------------------------------------------------------------------
+    @staticmethod
+    def _parse_app_version(lines):
+        # dumpsys package lines, returns (versionName:versionCode, versionCode)
+        version = ''
+        versionCode = ''
+        try:
+            for line in lines:
+                if re.search('versionCode', line):
+                    versionCode = line.split('=')
+                    versionCode = versionCode[1]
+                    versionCode = versionCode.split(' ')
+                    versionCode = versionCode[0]
+                if re.search('versionName', line):
+                    version = line.split('=')
+                    version = version[1]
+        except Exception:
+            return '', ''
         # return version, versionCode
         if version == '' and versionCode == '':
             return '', ''
@@ -4287,8 +4844,21 @@ add_hosts_module
             retry_text = f"retry [{retry + 1}] times" if retry > 0 else ''
             print(f"\n{datetime.now():%Y-%m-%d %H:%M:%S} Getting device: {device_id} state {retry_text} ...")
             puml(f":Getting device: {device_id} state {retry_text};\n", True)
+            tracker = get_device_tracker()
             for i in range(retry + 1):
-                if get_adb():
+                # the live device table answers without spawning adb, fastboot devices is run when fastboot is not enumerated live
+                state = tracker.state(device_id)
+                if state in ADB_READY_STATES and tracker.adb_live:
+                    mode = 'adb' if state == 'device' else state
+                    puml(f"note right:State {mode};\n")
+                    debug(f"Device: {device_id} is in {mode} mode (tracked).")
+                    return mode
+                if state == 'fastboot':
+                    mode = 'fastboot'
+                    puml(f"note right:State bootloader or fastbootd;\n")
+                    debug(f"Device: {device_id} is in bootloader or fastbootd mode.")
+                    return mode
+                if get_adb() and not tracker.adb_live:
                     puml(f":[{i + 1}/{retry + 1}] using get-state;\n", True)
                     debug(f"[{i + 1}/{retry + 1}] using get-state")
                     theCmd = f"\"{get_adb()}\" -s {device_id} get-state"
@@ -4303,18 +4873,9 @@ add_hosts_module
                         puml(f"note right:State {mode};\n")
                         debug(f"Device: {device_id} is in {mode} mode.")
                         return mode
-                if get_fastboot():
-                    puml(f":[{i + 1}/{retry + 1}] using fastboot devices;\n", True)
-                    debug(f"[{i + 1}/{retry + 1}] using fastboot devices")
-                    theCmd = f"\"{get_fastboot()}\" devices"
-                    res = run_shell(theCmd, timeout=timeout)
-                    if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0 and device_id in res.stdout:
-                        mode = 'fastboot'
-                        mode_text = 'bootloader or fastbootd'
-                        puml(f"note right:State {mode_text};\n")
-                        debug(f"Device: {device_id} is in {mode_text} mode.")
-                        return mode
-                time.sleep(1)
+                if i < retry:
+                    # wake up as soon as the device shows up instead of sleeping a fixed second
+                    tracker.wait_for(device_id, ADB_READY_STATES + ('fastboot',), timeout=1)
             return 'ERROR'
         except Exception as e:
             print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Exception during get_device_state for device: {device_id}")
@@ -4381,6 +4942,21 @@ add_hosts_module
                 puml(f"#red:ERROR: Wrong wait-for [{wait_for}] request;\n", True)
                 return -1
 
+            tracker = get_device_tracker()
+            if tracker.adb_live:
+                target = (None,) if wait_for == 'disconnect' else (wait_for,)
+                state = tracker.wait_for(device_id, target, timeout=timeout)
+                if state:
+                    print(f"device: {device_id} is now in {wait_for} mode.")
+                    puml(f":device: {device_id} is now in {wait_for} mode;\n", True)
+                    return 0
+                print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Command wait-for-{wait_for} timed out after {timeout} seconds")
+                mode = self.get_device_state(device_id, update=False)
+                if mode:
+                    print(f"Device is now in {mode} mode.")
+                    puml(f":device is now in {mode} mode;\n", True)
+                return -1
+
             if get_adb():
                 theCmd = f"\"{get_adb()}\" -s {device_id} wait-for-{wait_for}"
                 debug(theCmd)
@@ -4414,25 +4990,22 @@ add_hosts_module
                 device_id = self.id
             print(f"Fastboot waiting for device: {device_id} ...")
             puml(f":Fastboot waiting for device: {device_id};\n", True)
-            start_time = time.time()
-            while time.time() - start_time < timeout:
-                with contextlib.suppress(Exception):
-                    theCmd = f"\"{get_fastboot()}\" devices"
-                    res = run_shell(theCmd, timeout=timeout)
-                    if res and isinstance(res, subprocess.CompletedProcess) and f"{device_id}\t" in res.stdout:
-                        # sometimes fastboot devices returns the device in the list but it's not in bootloader mode
-                        # so we need to check the state of the device again
-                        time.sleep(1)
-                        mode = self.get_device_state(device_id, update=False)
-                        if mode == 'fastboot':
-                            print(f"device: {device_id} is now in bootloader or fastbootd mode.")
-                            puml(f":device: {device_id} is now in bootloader or fastbootd mode;\n", True)
-                            return 0
-                        else:
-                            print(f"device: {device_id} is in {mode} mode.")
-                            puml(f":device: {device_id} is in {mode} mode;\n", True)
-                            return -1
+            tracker = get_device_tracker()
+            # USB enumeration (or fastboot devices while waiting) reports the device as soon as it appears
+            state = tracker.wait_for(device_id, ('fastboot',), timeout=timeout)
+            if state == 'fastboot':
+                # sometimes fastboot devices returns the device in the list but it's not in bootloader mode
+                # so we need to check the state of the device again
                 time.sleep(1)
+                mode = self.get_device_state(device_id, update=False)
+                if mode == 'fastboot':
+                    print(f"device: {device_id} is now in bootloader or fastbootd mode.")
+                    puml(f":device: {device_id} is now in bootloader or fastbootd mode;\n", True)
+                    return 0
+                else:
+                    print(f"device: {device_id} is in {mode} mode.")
+                    puml(f":device: {device_id} is in {mode} mode;\n", True)
+                    return -1
             print(f"Timeout: [{timeout}] Fastboot could not detect device: {device_id} in bootloader or fastbootd mode ")
             puml(f":Timeout: [{timeout}] Fastboot could not detect device: {device_id} in bootloader or fastbootd mode;\n", True)
             return -1
@@ -4456,7 +5029,7 @@ add_hosts_module
                 return []
             theCmd = f"\"{get_adb()}\" -s {self.id} shell \"su -c \'magisk --denylist ls\'\""
             debug(theCmd)
-            res = run_shell(theCmd)
+            res = adb_shell(self.id, "magisk --denylist ls", with_su=True, fallback_cmd=theCmd)
             if res and isinstance(res, subprocess.CompletedProcess):
                 debug(f"Return Code: {res.returncode}")
                 debug(f"Stdout: {res.stdout}")
@@ -4634,6 +5207,7 @@ add_hosts_module
             if self.mode == 'f.b' and get_fastboot():
                 print(f"Setting active slot to slot [{slot}] for device: {self.id} ...")
                 puml(f":Setting Active slot to [{slot}];\n", True)
+                clear_prop_snapshot(self.id)
                 theCmd = f"\"{get_fastboot()}\" -s {self.id} --set-active={slot}"
                 debug(theCmd)
                 return run_shell(theCmd)
@@ -4666,6 +5240,7 @@ add_hosts_module
                     print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Unknown Slot.")
                     puml("#red:ERROR: Unknown Slot;\n", True)
                     return 1
+                clear_prop_snapshot(self.id)
                 theCmd = f"\"{get_fastboot()}\" -s {self.id} --set-active={switch_to_slot}"
                 debug(theCmd)
                 res = run_shell(theCmd, timeout=timeout)
@@ -4695,6 +5270,7 @@ add_hosts_module
             if self.mode == 'f.b' and get_fastboot():
                 print(f"Erasing Partition [{partition}] for device: {self.id} ...")
                 puml(f":Erasing Partition [{partition}];\n", True)
+                clear_prop_snapshot(self.id)
                 theCmd = f"\"{get_fastboot()}\" -s {self.id} erase {partition}"
                 debug(theCmd)
                 # return run_shell(theCmd)
@@ -4720,6 +5296,7 @@ add_hosts_module
             if self.mode == 'f.b' and get_fastboot():
                 # add a popup warning before continuing.
                 print(f"Locking bootloader for device: {self.id} ...")
+                clear_prop_snapshot(self.id)
                 theCmd = f"\"{get_fastboot()}\" -s {self.id} flashing lock"
                 debug(theCmd)
                 res = run_shell(theCmd)
@@ -4752,6 +5329,7 @@ add_hosts_module
                 self.refresh_phone_mode()
             if self.mode == 'f.b' and get_fastboot():
                 print(f"Unlocking bootloader for device: {self.id} ...")
+                clear_prop_snapshot(self.id)
                 theCmd = f"\"{get_fastboot()}\" -s {self.id} flashing unlock"
                 debug(theCmd)
                 res = run_shell(theCmd)
@@ -5204,7 +5782,9 @@ add_hosts_module
                 else:
                     debug(f"Executing command: {cmd} on the device ...")
                     theCmd = f"\"{get_adb()}\" -s {self.id} shell \"{cmd}\""
-                res = run_shell(theCmd)
+                if not theCmd:
+                    return None
+                res = adb_shell(self.id, cmd, with_su=with_su, fallback_cmd=theCmd)
                 data = res.stdout
                 debug(f"Return Code: {res.returncode}")
                 return data
@@ -5281,7 +5861,7 @@ add_hosts_module
             return None
         try:
             theCmd = f"\"{get_adb()}\" -s {self.id} shell pm list packages -f {pkg}"
-            res = run_shell(theCmd)
+            res = adb_shell(self.id, f"pm list packages -f {pkg}", fallback_cmd=theCmd)
             if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
                 # Check if package is in the output
                 if pkg in res.stdout:
@@ -5318,28 +5898,29 @@ add_hosts_module
             return
         try:
             if state == 'all':
-                theCmd = f"\"{get_adb()}\" -s {self.id} shell pm list packages"
+                pm_cmd = "pm list packages"
             elif state == 'all+uninstalled':
-                theCmd = f"\"{get_adb()}\" -s {self.id} shell pm list packages -u"
+                pm_cmd = "pm list packages -u"
             elif state == 'disabled':
-                theCmd = f"\"{get_adb()}\" -s {self.id} shell pm list packages -d"
+                pm_cmd = "pm list packages -d"
             elif state == 'enabled':
-                theCmd = f"\"{get_adb()}\" -s {self.id} shell pm list packages -e"
+                pm_cmd = "pm list packages -e"
             elif state == 'system':
-                theCmd = f"\"{get_adb()}\" -s {self.id} shell pm list packages -s"
+                pm_cmd = "pm list packages -s"
             elif state == '3rdparty':
-                theCmd = f"\"{get_adb()}\" -s {self.id} shell pm list packages -3"
+                pm_cmd = "pm list packages -3"
             elif state == 'user0':
-                theCmd = f"\"{get_adb()}\" -s {self.id} shell pm list packages -s --user 0"
+                pm_cmd = "pm list packages -s --user 0"
             elif state == 'uid':
-                theCmd = f"\"{get_adb()}\" -s {self.id} shell pm list packages -U"
+                pm_cmd = "pm list packages -U"
             elif state == 'apex-only':
-                theCmd = f"\"{get_adb()}\" -s {self.id} shell pm list packages --apex-only --show-versioncode"
+                pm_cmd = "pm list packages --apex-only --show-versioncode"
             else:
                 # Default to all packages if no state specified
-                theCmd = f"\"{get_adb()}\" -s {self.id} shell pm list packages"
+                pm_cmd = "pm list packages"
+            theCmd = f"\"{get_adb()}\" -s {self.id} shell {pm_cmd}"
 
-            res = run_shell(theCmd)
+            res = adb_shell(self.id, pm_cmd, fallback_cmd=theCmd)
             if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
                 return res.stdout.replace('package:','')
             print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not get package list of {state}.")
@@ -5353,81 +5934,178 @@ add_hosts_module
             return None
 
 
+    # ----------------------------------------------------------------------------
+    #                               method get_package_inventory
+    # ----------------------------------------------------------------------------
+    def get_package_inventory(self) -> PackageInventory | int:
+        """Method collects the package lists of the device in one shell invocation.
+
+        The `pm list packages` variants and the versionCode / lastUpdateTime
+        of every package are gathered by a single script that runs the
+        queries concurrently on the device. Any list missing from its output
+        is fetched with get_package_list.
+
+        Returns:
+            PackageInventory    on success.
+            -1                  if the package list could not be obtained.
+        """
+        if self.true_mode != 'adb':
+            return -1
+        sections = {
+            'all+uninstalled': "pm list packages -u",
+            'all': "pm list packages",
+            '3rdparty': "pm list packages -3",
+            'disabled': "pm list packages -d",
+            'enabled': "pm list packages -e",
+            'user0': "pm list packages -s --user 0",
+            'uid': "pm list packages -U",
+            'paths': "pm list packages -f",
+            'versions': "dumpsys package packages | grep -E '^  Package \\[|versionCode=|lastUpdateTime='",
+        }
+        output = {}
+        try:
+            names = list(sections)
+            script = "d=$(mktemp -d /data/local/tmp/pf_pkgs.XXXXXX) && { "
+            script += ' '.join(f"{sections[name]} > $d/{i} 2>/dev/null &" for i, name in enumerate(names))
+            script += " wait; "
+            script += ' '.join(f"echo @@PF:{name}; cat $d/{i};" for i, name in enumerate(names))
+            script += ' rm -rf "$d"; }'
+            start = time.time()
+            res = adb_shell(self.id, script, timeout=120)
+            if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
+                section = None
+                for line in res.stdout.splitlines():
+                    if line.startswith('@@PF:'):
+                        section = line[5:].strip()
+                        output[section] = []
+                    elif section and line:
+                        output[section].append(line)
+            debug(f"Package inventory script took {time.time() - start:.2f}s")
+        except Exception:
+            traceback.print_exc()
+
+        try:
+            for name in ('all+uninstalled', 'all', '3rdparty', 'disabled', 'enabled', 'user0', 'uid'):
+                if name not in output:
+                    data = self.get_package_list(name)
+                    output[name] = [f"package:{line}" for line in data.split('\n') if line] if data else []
+            if not output['all+uninstalled']:
+                return -1
+
+            def names_of(section):
+                return {line.replace('package:', '', 1).strip() for line in output.get(section, []) if line.strip()}
+
+            installed = names_of('all')
+            third_party = names_of('3rdparty')
+            disabled = names_of('disabled')
+            enabled = names_of('enabled')
+            user0 = names_of('user0')
+            uids = {}
+            for line in output.get('uid', []):
+                line = line.replace('package:', '', 1).strip()
+                if ' ' in line:
+                    package, uid = line.split(' ', 1)
+                    uids[package] = uid.replace('uid:', '')
+            paths = {}
+            for line in output.get('paths', []):
+                # package:/data/app/~~xxx==/com.foo-yyy==/base.apk=com.foo
+                line = line.replace('package:', '', 1).strip()
+                if '=' in line:
+                    apk, package = line.rsplit('=', 1)
+                    paths[package] = apk
+            versions = {}
+            package = None
+            for line in output.get('versions', []):
+                line = line.strip()
+                if line.startswith('Package ['):
+                    package = line[len('Package ['):line.find(']')]
+                    if package in versions:
+                        # hidden system packages are listed again further down
+                        package = None
+                    else:
+                        versions[package] = ['', '']
+                elif package and line.startswith('versionCode='):
+                    versions[package][0] = line.split()[0].split('=', 1)[1]
+                elif package and line.startswith('lastUpdateTime='):
+                    versions[package][1] = line.split('=', 1)[1]
+
+            inventory = PackageInventory()
+            for line in output['all+uninstalled']:
+                package = line.replace('package:', '', 1).strip()
+                if not package or package in inventory:
+                    continue
+                version_code, last_update = versions.get(package, ('', ''))
+                inventory.append(package,
+                    type='3rd Party' if package in third_party else 'System',
+                    installed=package in installed,
+                    enabled=package in enabled and package not in disabled,
+                    user0=package in user0,
+                    uid=uids.get(package, ''),
+                    version_code=version_code,
+                    last_update=last_update,
+                    path=paths.get(package, ''))
+            return inventory
+        except Exception as e:
+            traceback.print_exc()
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not get package inventory.")
+            puml("#red:ERROR: Could not get package inventory;\n", True)
+            return -1
+
     # ----------------------------------------------------------------------------
     #                               method get_detailed_packages
     # ----------------------------------------------------------------------------
-    def get_detailed_packages(self, simplified=False):
+    def get_detailed_packages(self, simplified=False, incremental=True):
+        """Method refreshes self.packages from a package inventory.
+
+        With incremental, Package objects of packages whose versionCode and
+        lastUpdateTime did not change since the previous call are kept, so
+        their label, path and details do not need to be fetched again.
+        """
         if self.true_mode != 'adb':
             return -1
         try:
-            self.packages.clear()
+            inventory = self.get_package_inventory()
+            if inventory == -1:
+                return -1
             # get labels
             labels = get_labels()
-            # Get all packages including uninstalled ones
-            list = self.get_package_list('all+uninstalled')
-            if not list:
-                return -1
-            for item in list.split("\n"):
-                if item:
+            previous = self.package_inventory if incremental else None
+            packages = {}
+            changes = []
+            columns = inventory.columns
+            for i, item in enumerate(columns['name']):
+                package = self.packages.get(item) if previous is not None else None
+                if package is None or previous.signature(item) != inventory.signature(item) or not inventory.signature(item)[0]:
                     package = Package(item)
-                    package.type = "System"
-                    package.installed = False
-                    with contextlib.suppress(Exception):
-                        package.label = labels[item]
-                    self.packages[item] = package
-
-            # Get all packages
-            list = self.get_package_list('all')
-            if list:
-                for item in list.split("\n"):
-                    if item and item in self.packages:
-                        self.packages[item].installed = True
-
-            # Get 3rd party packages
-            list = self.get_package_list('3rdparty')
-            if list:
-                for item in list.split("\n"):
-                    if item and item in self.packages:
-                        self.packages[item].type = '3rd Party'
-
-            # Get disabled packages
-            list = self.get_package_list('disabled')
-            if list:
-                for item in list.split("\n"):
-                    if item and item in self.packages:
-                        self.packages[item].enabled = False
-
-            # Get enabled packages
-            list = self.get_package_list('enabled')
-            if list:
-                for item in list.split("\n"):
-                    if item and item in self.packages:
-                        self.packages[item].enabled = True
-
-            # Get user 0 packages
-            list = self.get_package_list('user0')
-            if list:
-                for item in list.split("\n"):
-                    if item and item in self.packages:
-                        self.packages[item].user0 = True
+                    package.path = columns['path'][i]
+                    cached = labels.lookup(item, columns['version_code'][i], package.path)
+                    if cached:
+                        package.label, package.icon = cached
+                    else:
+                        package.label = labels.get(item, '')
+                    changes.append(item)
+                package.type = columns['type'][i]
+                package.installed = columns['installed'][i]
+                package.enabled = columns['enabled'][i]
+                package.user0 = columns['user0'][i]
+                package.magisk_denylist = False
+                if not simplified:
+                    package.uid = columns['uid'][i]
+                packages[item] = package
 
             if not simplified:
                 # Get magisk denylist packages
                 list = self.get_magisk_denylist()
                 if list:
                     for item in list:
-                        if item and item in self.packages:
-                            self.packages[item].magisk_denylist = True
+                        if item and item in packages:
+                            packages[item].magisk_denylist = True
 
-                # Get package UIDs
-                list = self.get_package_list('uid')
-                if list:
-                    for item in list.split("\n"):
-                        if item:
-                            package, uid = item.split(" ", 1)
-                            uid = uid.replace("uid:", "")
-                            if package in self.packages:
-                                self.packages[package].uid = uid
+            # keep the same dict object, callers hold references to it
+            self.packages.clear()
+            self.packages.update(packages)
+            self.package_inventory = inventory
+            debug(f"Packages: {len(packages)}, new or changed: {len(changes)}")
 
         except Exception as e:
             traceback.print_exc()
@@ -5442,6 +6120,8 @@ add_hosts_module
 # ============================================================================
 def update_phones(device_id, mode=None):
     devices = []
+    # the device may have rebooted or changed state, its shell sessions are stale
+    close_sessions(device_id)
     try:
         phones = get_phones()
         devices = get_device_list()
@@ -5471,7 +6151,7 @@ def update_phones(device_id, mode=None):
             if get_adb():
                 theCmd = f"\"{get_adb()}\" -s {device_id} get-state"
                 debug(theCmd)
-                res = run_shell(theCmd, timeout=60)
+                res = adb_get_state(device_id, timeout=60, fallback_cmd=theCmd)
                 if res and isinstance(res, subprocess.CompletedProcess) and res.returncode == 0:
                     device_mode = res.stdout.strip('\n')
                     debug(f"device_mode: {device_mode}")
@@ -5569,7 +6249,7 @@ def get_connected_devices(respect_device_filter=True, scan_all=False):
             theCmd = f"\"{get_adb()}\" devices"
             debug(theCmd)
             adb_start = time.time()
-            res = run_shell(theCmd, timeout=60)
+            res = adb_devices(timeout=60, fallback_cmd=theCmd)
             adb_duration = time.time() - adb_start
             debug(f"ADB devices command took {adb_duration:.2f}s")
             if res and isinstance(res, subprocess.CompletedProcess):
@@ -5682,6 +6362,8 @@ def get_connected_devices(respect_device_filter=True, scan_all=False):
 
         # Update connection status for all known devices
         update_all_devices_connection_status(all_detected_device_ids)
+        # Drop shell sessions of devices that went away
+        close_sessions(keep=all_detected_device_ids)
 
         set_phones(phones)
 
@@ -5694,6 +6376,7 @@ def get_connected_devices(respect_device_filter=True, scan_all=False):
             print(f"  Total device initialization: {total_init_time:.2f}s (avg: {avg_init_time:.2f}s per device)")
             for d_id, duration in device_init_times:
                 print(f"    {d_id}: {duration:.2f}s")
+        debug(f"adb shell stats: {session_stats()}")
     except Exception as e:
         print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Encountered an error while getting connected devices.")
         traceback.print_exc()
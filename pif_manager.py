@@ -1317,9 +1317,7 @@ class PifManager(wx.Dialog):
             # Create a simplified package manager dialog
             self._on_spin('start')
             # load labels if not already loaded
-            if not get_labels() and os.path.exists(get_labels_file_path()):
-                with open(get_labels_file_path(), "r", encoding='ISO-8859-1', errors="replace") as f:
-                    set_labels(json.load(f))
+            get_labels()
             dlg = PackageManager(self, title="Select Package for TargetedFix Target", simplified_mode=True)
             self._on_spin('stop')
             result = dlg.ShowModal()
@@ -38,19 +38,23 @@ import binascii
 import contextlib
 import chardet
 import fnmatch
+import gzip
 import hashlib
 import html
 import io
 import json
 import json5
 import logging
+import lzma
 import math
+import mmap
 import ntpath
 import os
 import re
 import shutil
 import signal
 import sqlite3 as sl
+import struct
 import subprocess
 import sys
 import random
@@ -89,7 +93,8 @@ from packaging.version import parse
 from platformdirs import user_data_dir
 
 from constants import *
-from payload_dumper import extract_payload
+from payload_dumper import HttpRangeFile, extract_payload, get_http_session, zip_member_offset
+from fs_image import FsImageError, read_image_file
 from ksu_asset_selector import show_ksu_asset_selector
 import cProfile, pstats, io
 import avbtool
@@ -129,7 +134,7 @@ _patched_with = ''
 # _customize_font = False
 # _pf_font_face = ''
 # _pf_font_size = 12
-_app_labels = {}
+_app_labels = None
 _xiaomi_list = {}
 _favorite_pifs = {}
 _a_only = False
@@ -154,6 +159,9 @@ _window_shown = False
 _puml_enabled = True
 _rooting_app_apks = None
 _selected_boot_partition = None
+_cache_db_local = threading.local()
+_boot_scan_cache = {}
+_extract_stats = {}
 
 
 # ============================================================================
@@ -413,17 +421,12 @@ def set_boot(value) -> None:
 # ============================================================================
 def get_labels() -> dict:
     global _app_labels
+    if _app_labels is None:
+        _app_labels = LabelStore()
+        _app_labels.load()
     return _app_labels
 
 
-# ============================================================================
-#                               Function set_labels
-# ============================================================================
-def set_labels(value) -> None:
-    global _app_labels
-    _app_labels = value
-
-
 # ============================================================================
 #                               Function get_xiaomi
 # ============================================================================
@@ -1243,6 +1246,74 @@ def init_db():
                 );
             """)
 
+            # FILE_HASH Table, digest cache of the hashing service
+            # Added in version 9.2
+            _db.execute("""
+                CREATE TABLE IF NOT EXISTS FILE_HASH (
+                    file_path TEXT NOT NULL PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    md5 TEXT NOT NULL,
+                    sha1 TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    epoch INTEGER NOT NULL
+                );
+            """)
+
+            # APP_LABEL Table, application labels keyed by package, versionCode and apk path
+            # Added in version 9.2
+            _db.execute("""
+                CREATE TABLE IF NOT EXISTS APP_LABEL (
+                    package TEXT NOT NULL,
+                    version_code TEXT NOT NULL,
+                    path_hash TEXT NOT NULL,
+                    label TEXT NOT NULL,
+                    icon TEXT,
+                    epoch INTEGER NOT NULL,
+                    PRIMARY KEY (package, version_code, path_hash)
+                );
+            """)
+
+            # DEVICE_PROPS Table, last property snapshot of each device and mode
+            # Added in version 9.2
+            _db.execute("""
+                CREATE TABLE IF NOT EXISTS DEVICE_PROPS (
+                    serial TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    build_key TEXT NOT NULL,
+                    boot_id TEXT NOT NULL,
+                    props TEXT NOT NULL,
+                    epoch INTEGER NOT NULL,
+                    PRIMARY KEY (serial, mode)
+                );
+            """)
+
+            # FIRMWARE_CACHE Table, artefacts extracted from processed firmware archives
+            # Added in version 9.2
+            _db.execute("""
+                CREATE TABLE IF NOT EXISTS FIRMWARE_CACHE (
+                    archive_sha256 TEXT NOT NULL PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    package_sig TEXT NOT NULL,
+                    package_dir TEXT NOT NULL,
+                    members TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used INTEGER NOT NULL,
+                    epoch INTEGER NOT NULL
+                );
+            """)
+
+            # ARCHIVE_INDEX Table, member names of archives, nested archives included
+            # Added in version 9.2
+            _db.execute("""
+                CREATE TABLE IF NOT EXISTS ARCHIVE_INDEX (
+                    archive_sha256 TEXT NOT NULL PRIMARY KEY,
+                    members TEXT NOT NULL,
+                    epoch INTEGER NOT NULL
+                );
+            """)
+
             # Check if the patch_method and is_odin column already exists in the BOOT table
             # Added in version 5.1
             cursor = _db.execute("PRAGMA table_info(BOOT)")
@@ -1275,6 +1346,7 @@ def init_db():
             if 'full_ota' not in column_names:
                 # Add the full_ota column to the BOOT table (values: 0:Not Full OTA, 1:Full OTA NULL:UNKNOWN)
                 _db.execute("ALTER TABLE PACKAGE ADD COLUMN full_ota INTEGER;")
+        prune_file_hash()
     except Exception as e:
         print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Encountered an error while init_db")
         traceback.print_exc()
@@ -1859,6 +1931,188 @@ def get_compression_method(zip_path, file_to_replace):
         return None
 
 
+# ============================================================================
+#                               Function extract_from_nested_zip
+# ============================================================================
+def extract_from_nested_zip(archive_path, nested_name, file_names, output_dir):
+    # Extracts file_names from the zip nested_name, which is stored (uncompressed) inside
+    # the zip archive_path, without extracting nested_name itself.
+    # The nested zip is read in place, and each member is inflated straight to output_dir.
+    # Returns the list of extracted files (members that are missing are skipped),
+    # None when nested_name is compressed or unreadable, callers then extract it instead.
+    member = zip_member_offset(archive_path, nested_name)
+    if not member:
+        debug(f"{nested_name} is not stored in {archive_path}, it can not be read in place.")
+        return None
+    offset, size = member
+    extracted = []
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(archive_path, 'rb') as f:
+            nested = io.BufferedReader(ArchiveRange(f, offset, size), 1024 * 1024)
+            with zipfile.ZipFile(nested, 'r') as nested_zip:
+                names = nested_zip.namelist()
+                for file_name in file_names:
+                    if file_name not in names:
+                        debug(f"{file_name} is not in {nested_name}")
+                        continue
+                    print(f"Extracting {file_name} from {archive_path}/{nested_name} ...")
+                    wx.Yield()
+                    target = os.path.join(output_dir, file_name)
+                    with nested_zip.open(file_name, 'r') as source, open(target, 'wb') as dest:
+                        shutil.copyfileobj(source, dest, 1024 * 1024)
+                    extracted.append(target)
+        return extracted
+    except Exception as e:
+        print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not read {nested_name} in {archive_path}. Reason: {e}")
+        traceback.print_exc()
+        return None
+
+
+# ============================================================================
+#                               Class NativeExtractor
+# ============================================================================
+class NativeExtractor():
+    """In process extraction of zip, tar (plain, gzip, bzip2 or xz) and lz4 files.
+
+    Zip members are independent, so they are inflated by EXTRACT_THREADS
+    threads, each with its own handle on the archive (zlib releases the
+    GIL while inflating). A tar archive is a single stream and is
+    extracted sequentially. extract returns the number of bytes written.
+    """
+    name = 'native'
+
+    def supports(self, archive):
+        file_ext = os.path.splitext(archive)[1].lower()
+        if file_ext in ['.zip']:
+            return zipfile.is_zipfile(archive)
+        if file_ext in ['.tgz', '.gz', '.tar', '.md5']:
+            return tarfile.is_tarfile(archive)
+        return file_ext in ['.lz4']
+
+    @staticmethod
+    def wanted(name, members):
+        # members are paths or glob patterns, matched against the full member path,
+        # or directories, which are extracted with everything under them (as 7z does).
+        if not members:
+            return True
+        name = name[2:] if name.startswith('./') else name
+        return any(fnmatch.fnmatch(name, member) or name.startswith(f"{member.rstrip('/')}/") for member in members)
+
+    def extract(self, archive, output_dir, members=None):
+        os.makedirs(output_dir, exist_ok=True)
+        file_ext = os.path.splitext(archive)[1].lower()
+        if file_ext in ['.zip']:
+            return self.extract_zip(archive, output_dir, members)
+        if file_ext in ['.lz4']:
+            return self.extract_lz4(archive, output_dir)
+        return self.extract_tar(archive, output_dir, members)
+
+    def extract_zip(self, archive, output_dir, members):
+        with zipfile.ZipFile(archive, 'r') as zip_file:
+            infos = [info for info in zip_file.infolist() if self.wanted(info.filename, members)]
+        # largest first, so that one big image does not end up last on a busy worker
+        infos.sort(key=lambda info: info.file_size, reverse=True)
+        batches = [infos[i::EXTRACT_THREADS] for i in range(EXTRACT_THREADS)]
+
+        def extract_batch(batch):
+            with zipfile.ZipFile(archive, 'r') as zip_file:
+                for info in batch:
+                    debug(f"Extracting {info.filename} ...")
+                    zip_file.extract(info, output_dir)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=EXTRACT_THREADS) as executor:
+            for future in [executor.submit(extract_batch, batch) for batch in batches if batch]:
+                future.result()
+        return sum(info.file_size for info in infos)
+
+    def extract_tar(self, archive, output_dir, members):
+        written = 0
+        with tarfile.open(archive, 'r') as tar_file:
+            for member in tar_file:
+                if not self.wanted(member.name, members):
+                    continue
+                debug(f"Extracting {member.name} ...")
+                if hasattr(tarfile, 'data_filter'):
+                    tar_file.extract(member, output_dir, filter='data')
+                else:
+                    tar_file.extract(member, output_dir)
+                written += member.size
+        return written
+
+    def extract_lz4(self, archive, output_dir):
+        target = os.path.join(output_dir, os.path.splitext(os.path.basename(archive))[0])
+        with lz4.frame.open(archive, 'rb') as source, open(target, 'wb') as dest:
+            shutil.copyfileobj(source, dest, EXTRACT_CHUNK_SIZE)
+        return os.path.getsize(target)
+
+
+# ============================================================================
+#                               Class SevenZipExtractor
+# ============================================================================
+class SevenZipExtractor():
+    """Extraction with the bundled 7z, for the formats NativeExtractor does not read."""
+    name = '7z'
+
+    def supports(self, archive):
+        return get_path_to_7z() is not None
+
+    def extract(self, archive, output_dir, members=None):
+        members = ' '.join(f"\"{member}\"" for member in members or [])
+        theCmd = f"\"{get_path_to_7z()}\" x -bd -y -o\"{output_dir}\" \"{archive}\" {members}".strip()
+        debug(theCmd)
+        res = run_shell(theCmd)
+        debug(f"Return Code: {res.returncode}")
+        debug(f"Stdout: {res.stdout}")
+        debug(f"Stderr: {res.stderr}")
+        if res.returncode != 0:
+            raise RuntimeError(f"7z returned {res.returncode}: {res.stderr}")
+        # 7z reports the unpacked size as "Size: <bytes>"
+        match = re.search(r'^Size:\s+(\d+)', res.stdout or '', re.MULTILINE)
+        return int(match[1]) if match else 0
+
+
+EXTRACT_BACKENDS = [NativeExtractor(), SevenZipExtractor()]
+
+
+# ============================================================================
+#                               Function extract_archive
+# ============================================================================
+def extract_archive(archive, output_dir, members=None):
+    # Extracts members (names or glob patterns, everything when None) of archive into output_dir,
+    # with the first backend in EXTRACT_BACKENDS that reads the format, the next one is tried if it fails.
+    # Returns a CompletedProcess like run_shell does, so callers keep their return code checks.
+    # Throughput is reported per backend, see get_extract_stats.
+    args = ['extract', archive, output_dir] + list(members or [])
+    error = ''
+    for backend in EXTRACT_BACKENDS:
+        if not backend.supports(archive):
+            continue
+        start = time.time()
+        try:
+            written = backend.extract(archive, output_dir, members)
+        except Exception as e:
+            error = f"{backend.name} could not extract {archive}: {e}"
+            print(f"⚠️ {datetime.now():%Y-%m-%d %H:%M:%S} WARNING: {error}")
+            continue
+        elapsed = max(time.time() - start, 0.001)
+        stats = _extract_stats.setdefault(backend.name, {'bytes': 0, 'seconds': 0.0})
+        stats['bytes'] += written
+        stats['seconds'] += elapsed
+        print(f"Extracted {format_memory_size(written)} from {os.path.basename(archive)} with {backend.name} in {elapsed:.1f} seconds ({format_memory_size(written / elapsed)}/s)")
+        return subprocess.CompletedProcess(args=args, returncode=0, stdout='', stderr='')
+    print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not extract {archive}")
+    return subprocess.CompletedProcess(args=args, returncode=1, stdout='', stderr=error)
+
+
+# ============================================================================
+#                               Function get_extract_stats
+# ============================================================================
+def get_extract_stats():
+    # {backend name: {'bytes', 'seconds', 'rate'}} accumulated over this session's extractions
+    return {name: dict(stats, rate=stats['bytes'] / stats['seconds']) for name, stats in _extract_stats.items() if stats['seconds']}
+
+
 # ============================================================================
 #                               Function extract_from_nested_tgz
 # ============================================================================
@@ -1866,6 +2120,10 @@ def extract_from_nested_tgz(archive_path, file_paths, output_dir):
     """
     Extract files from nested archives (like tgz -> tar -> folder structure).
 
+    The files are looked up by name in any folder of the archive, or of a tar
+    inside it, and written straight to output_dir in a single pass over the
+    compressed stream, nothing else is unpacked.
+
     Args:
         archive_path: Path to the outer archive file
         file_paths: List of filenames to extract
@@ -1875,83 +2133,41 @@ def extract_from_nested_tgz(archive_path, file_paths, output_dir):
         True if all files were successfully extracted, False otherwise
     """
 
-    temp_dir = tempfile.mkdtemp(dir=tempfile.gettempdir())
-    success = True
-
-    try:
-        path_to_7z = get_path_to_7z()
-
-        # First extract the outer archive (tgz) to get the inner archive (tar)
-        debug(f"Extracting outer archive to {temp_dir}")
-
-        cmd = f"\"{path_to_7z}\" x -bd -y -o\"{temp_dir}\" \"{archive_path}\""
-        debug(f"{cmd}")
-        result = run_shell(cmd)
-        if result.returncode != 0:
-            print(f"❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Failed to extract outer archive")
-            return False
-
-        # Find the inner tar file
-        tar_file = None
-        for root, _, files in os.walk(temp_dir):
-            for file in files:
-                if file.endswith('.tar'):
-                    tar_file = os.path.join(root, file)
-                    break
-            if tar_file:
-                break
-
-        if not tar_file:
-            print(f"❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not find inner tar archive")
-            return False
-
-        # Extract the tar file to the temp directory
-        debug(f"Extracting inner archive {tar_file}")
-
-        inner_extract_dir = os.path.join(temp_dir, "inner")
-        os.makedirs(inner_extract_dir, exist_ok=True)
+    file_names = list(dict.fromkeys(file_paths.split()))
+    found = set()
 
-        cmd = f"\"{path_to_7z}\" x -bd -y -o\"{inner_extract_dir}\" \"{tar_file}\""
-        debug(f"{cmd}")
-        result = run_shell(cmd)
-        if result.returncode != 0:
-            print(f"❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Failed to extract inner archive")
-            return False
-        # delete the tar file
-        os.remove(tar_file)
-
-        # Copy each needed file to the output directory
-        for file_name in file_paths.split():
-            found = False
-            file_path = None
-
-            for root, _, files in os.walk(inner_extract_dir):
-                for file in files:
-                    if file == file_name:
-                        file_path = os.path.join(root, file)
-                        found = True
-                        break
-                if found:
-                    break
-
-            if file_path and os.path.exists(file_path):
+    def extract_members(tar_file, nested):
+        for member in tar_file:
+            if len(found) == len(file_names):
+                return
+            if not member.isfile():
+                continue
+            file_name = os.path.basename(member.name)
+            if file_name in file_names and file_name not in found:
                 output_file = os.path.join(output_dir, file_name)
-                shutil.copy2(file_path, output_file)
+                with tar_file.extractfile(member) as source, open(output_file, 'wb') as dest:
+                    shutil.copyfileobj(source, dest, EXTRACT_CHUNK_SIZE)
+                found.add(file_name)
                 debug(f"Extracted {file_name} to {output_file}")
-            else:
-                print(f"❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not find {file_name} in extracted content")
-                success = False
+            elif not nested and file_name.endswith('.tar'):
+                debug(f"Looking into inner archive {member.name}")
+                with tar_file.extractfile(member) as source, tarfile.open(fileobj=source, mode='r|') as inner_tar:
+                    extract_members(inner_tar, True)
 
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        debug(f"Extracting {file_names} from {archive_path}")
+        with tarfile.open(archive_path, 'r|*') as tar_file:
+            extract_members(tar_file, False)
     except Exception as e:
         print(f"❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Failed to extract from nested archive: {str(e)}")
         traceback.print_exc()
-        success = False
-    finally:
-        try:
-            shutil.rmtree(temp_dir)
-        except Exception as e:
-            debug(f"❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: cleaning up temp directory: {str(e)}")
-    return success
+        return False
+
+    for file_name in file_names:
+        if file_name not in found:
+            print(f"❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not find {file_name} in extracted content")
+    return len(found) == len(file_names)
 
 
 # ============================================================================
@@ -1983,6 +2199,193 @@ def replace_file_in_zip_with_7zip(zip_path, file_to_replace, new_file_path):
         return False
 
 
+# ============================================================================
+#                               Class ArchiveRange
+# ============================================================================
+class ArchiveRange(io.RawIOBase):
+    """Read only view of size bytes at offset of an open file.
+
+    Lets zipfile read the central directory of a stored (uncompressed) zip
+    member in place, without copying the member out of its archive.
+    """
+    def __init__(self, fileobj, offset, size):
+        super().__init__()
+        self.fileobj = fileobj
+        self.offset = offset
+        self.size = size
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self.pos
+        elif whence == io.SEEK_END:
+            pos += self.size
+        self.pos = max(0, min(pos, self.size))
+        return self.pos
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.size - self.pos)
+        self.fileobj.seek(self.offset + self.pos)
+        data = self.fileobj.read(size)
+        buffer[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+
+# ============================================================================
+#                               Class ArchiveIndex
+# ============================================================================
+class ArchiveIndex():
+    """Member names of a zip or tar archive, nested zip / tar members included.
+
+    The archive is scanned once, and the names are persisted in the
+    ARCHIVE_INDEX table keyed by the archive sha256, so further membership
+    queries are answered from memory. Nested archives that are stored
+    uncompressed are indexed by reading their central directory in place,
+    compressed ones are decompressed once to a temporary file.
+
+    Nested member names are prefixed with the name of the archive holding
+    them, the way check_archive_contains_file reports them. With nested
+    False only the archive's own directory is read, which is cheap enough
+    not to be persisted.
+    """
+    def __init__(self, archive_file_path, nested=True):
+        # Instance variables
+        self.archive_file_path = archive_file_path
+        self.nested = nested
+        self._members = None
+
+    @property
+    def members(self):
+        # list of (name, depth, size), depth is 0 for members of the archive itself.
+        # None if the archive could not be indexed.
+        if self._members is None and self.indexable:
+            self._members = self.load()
+        return self._members
+
+    @property
+    def sizes(self):
+        # {name: uncompressed size}
+        return {name: size for name, depth, size in self.members or []}
+
+    def load(self):
+        if not self.nested:
+            return self.scan()
+        key = None
+        try:
+            key = file_digests(self.archive_file_path, ('sha256',))['sha256']
+            row = get_cache_db().execute("SELECT members FROM ARCHIVE_INDEX WHERE archive_sha256 = ?", (key,)).fetchone()
+            members = [tuple(member) for member in json.loads(row[0])] if row else []
+            # indexes written before sizes were recorded are scanned again
+            if members and all(len(member) == 3 for member in members):
+                debug(f"Loaded the member index of {self.archive_file_path}")
+                return members
+        except Exception as e:
+            debug(f"Archive index lookup failed: {e}")
+        start = time.time()
+        members = self.scan()
+        if members is None:
+            return None
+        debug(f"Indexed {len(members)} members of {self.archive_file_path} in {math.ceil(time.time() - start)} seconds")
+        if key:
+            try:
+                con = get_cache_db()
+                with con:
+                    con.execute("INSERT OR REPLACE INTO ARCHIVE_INDEX (archive_sha256, members, epoch) VALUES (?, ?, ?)", (key, json.dumps(members), int(time.time())))
+            except Exception as e:
+                debug(f"Archive index update failed: {e}")
+        return members
+
+    def scan(self):
+        members = []
+        file_ext = os.path.splitext(self.archive_file_path)[1].lower()
+        try:
+            if file_ext in ['.zip']:
+                with open(self.archive_file_path, 'rb') as f:
+                    self.scan_zip(f, '', 0, members)
+            elif file_ext in ['.tgz', '.gz', '.tar', '.md5']:
+                self.scan_tar(self.archive_file_path, None, '', 0, members, seekable=file_ext in ['.tar', '.md5'])
+        except Exception as e:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Failed to index {self.archive_file_path}. Reason: {e}")
+            traceback.print_exc()
+            return None
+        return members
+
+    def scan_zip(self, fileobj, prefix, depth, members):
+        try:
+            with zipfile.ZipFile(fileobj, 'r') as zip_file:
+                for info in zip_file.infolist():
+                    name = f"{prefix}{info.filename}"
+                    members.append((name, depth, info.file_size))
+                    if self.nested and (info.filename.endswith('.zip') or info.filename.endswith('.tar')):
+                        debug(f"Indexing nested archive: {name}")
+                        wx.Yield()
+                        if info.compress_type == zipfile.ZIP_STORED:
+                            fileobj.seek(info.header_offset)
+                            name_len, extra_len = struct.unpack('<26xHH', fileobj.read(30))
+                            nested = io.BufferedReader(ArchiveRange(fileobj, info.header_offset + 30 + name_len + extra_len, info.file_size))
+                            self.scan_nested(nested, info.filename, f"{name}/", depth + 1, members)
+                        else:
+                            with tempfile.TemporaryFile() as nested, zip_file.open(info, 'r') as source:
+                                shutil.copyfileobj(source, nested, 1024 * 1024)
+                                self.scan_nested(nested, info.filename, f"{name}/", depth + 1, members)
+        except zipfile.BadZipFile:
+            print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: {prefix or self.archive_file_path} is not a zip file or is corrupt, skipping this file ...")
+
+    def scan_tar(self, path, fileobj, prefix, depth, members, seekable=False):
+        with tarfile.open(name=path, fileobj=fileobj, mode='r') as tar_file:
+            for member in tar_file:
+                name = f"{prefix}{member.name}"
+                members.append((name, depth, member.size))
+                if self.nested and member.isfile() and (member.name.endswith('.zip') or member.name.endswith('.tar')):
+                    debug(f"Indexing nested archive: {name}")
+                    wx.Yield()
+                    source = tar_file.extractfile(member)
+                    if seekable:
+                        self.scan_nested(source, member.name, f"{name}/", depth + 1, members)
+                    else:
+                        with tempfile.TemporaryFile() as nested:
+                            shutil.copyfileobj(source, nested, 1024 * 1024)
+                            self.scan_nested(nested, member.name, f"{name}/", depth + 1, members)
+
+    def scan_nested(self, fileobj, name, prefix, depth, members):
+        fileobj.seek(0)
+        if name.endswith('.zip'):
+            self.scan_zip(fileobj, prefix, depth, members)
+        else:
+            self.scan_tar(None, fileobj, prefix, depth, members, seekable=True)
+
+    @property
+    def indexable(self):
+        return os.path.splitext(self.archive_file_path)[1].lower() in ['.zip', '.tgz', '.gz', '.tar', '.md5']
+
+    def find(self, file_to_check, nested=False):
+        # Same result as check_archive_contains_file, the first member named file_to_check or ''
+        if self.members is None:
+            return check_archive_contains_file(archive_file_path=self.archive_file_path, file_to_check=file_to_check, nested=nested)
+        for name, depth, size in self.members:
+            if depth and not nested:
+                continue
+            if name.endswith(f'/{file_to_check}') or name == file_to_check:
+                debug(f"Found: {name} in {self.archive_file_path}")
+                return name
+        debug(f"file: {file_to_check} was NOT found in {self.archive_file_path}")
+        return ''
+
+    def match(self, pattern, nested=False):
+        # All member names matching the fnmatch pattern
+        return [name for name, depth, size in self.members or [] if (nested or not depth) and fnmatch.fnmatch(name, pattern)]
+
+
 # ============================================================================
 #                               Function check_archive_contains_file
 # ============================================================================
@@ -2328,27 +2731,28 @@ def get_playstore_user_coords(xmlfile):
 #                               Function extract_sha1
 # ============================================================================
 def extract_sha1(binfile, length=8):
-    with open(binfile, 'rb') as f:
-        s = f.read()
-        # Find SHA1=
-        pos = s.find(b'\x53\x48\x41\x31\x3D')
-        # Move to that location
-        if pos != -1:
-            # move to 5 characters from the found position
-            f.seek(pos + 5, 0)
-            # read length bytes
+    result = scan_boot_image(binfile)
+    if result['sha1_offset'] is None:
+        return None
+    byte_string = result['sha1'][:length]
+    if length > len(byte_string):
+        with open(binfile, 'rb') as f:
+            f.seek(result['sha1_offset'])
             byte_string = f.read(length)
-            # convert byte string to hex string
-            hex_string = binascii.hexlify(byte_string).decode('ascii')
-            # convert hex string to ASCII string
-            ascii_string = binascii.unhexlify(hex_string).decode('ascii', errors='replace')
-            # replace non-decodable characters with ~
-            ascii_string = ascii_string.replace('\ufffd', '~')
-            # replace non-printable characters with !
-            ascii_string = ''.join(['!' if ord(c) < 32 or ord(c) > 126 else c for c in ascii_string])
-            return ascii_string
-        else:
-            return None
+    return printable_marker(byte_string)
+
+
+# ============================================================================
+#                               Function printable_marker
+# ============================================================================
+def printable_marker(byte_string):
+    # convert byte string to ASCII string
+    ascii_string = byte_string.decode('ascii', errors='replace')
+    # replace non-decodable characters with ~
+    ascii_string = ascii_string.replace('\ufffd', '~')
+    # replace non-printable characters with !
+    ascii_string = ''.join(['!' if ord(c) < 32 or ord(c) > 126 else c for c in ascii_string])
+    return ascii_string
 
 
 # ============================================================================
@@ -2396,26 +2800,10 @@ def compare_sha1(SHA1, Extracted_SHA1) -> float | None:
 # ============================================================================
 def extract_fingerprint(binfile):
     try:
-        with open(binfile, 'rb') as f:
-            s = f.read()
-            # Find fingerprint=
-            pos = s.find(b'\x66\x69\x6E\x67\x65\x72\x70\x72\x69\x6E\x74')
-            # Move to that location
-            if pos == -1:
-                return None
-            # move to 12 characters from the found position
-            f.seek(pos + 12, 0)
-            # read 65 bytes
-            byte_string = f.read(65)
-            # convert byte string to hex string
-            hex_string = binascii.hexlify(byte_string).decode('ascii')
-            # convert hex string to ASCII string
-            ascii_string = binascii.unhexlify(hex_string).decode('ascii', errors='replace')
-            # replace non-decodable characters with ~
-            ascii_string = ascii_string.replace('\ufffd', '~')
-            # replace non-printable characters with !
-            ascii_string = ''.join(['!' if ord(c) < 32 or ord(c) > 126 else c for c in ascii_string])
-            return ascii_string
+        result = scan_boot_image(binfile)
+        if result['fingerprint_offset'] is None:
+            return None
+        return printable_marker(result['fingerprint'])
     except Exception as e:
         print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Encountered an error while extracting fingerprint.")
         traceback.print_exc()
@@ -2449,16 +2837,458 @@ Is your device is waiting for interaction? if so perform the actions manually.
     print(message)
 
 
+# ============================================================================
+#                               Function get_cache_db
+# ============================================================================
+def get_cache_db():
+    # sqlite connections can't be shared across threads, each thread gets its own
+    # connection to the PixelFlasher db (FILE_HASH, APP_LABEL, DEVICE_PROPS, FIRMWARE_CACHE and ARCHIVE_INDEX tables are created by init_db).
+    con = getattr(_cache_db_local, 'con', None)
+    if con is None:
+        con = sl.connect(os.path.join(get_sys_config_path(), get_pf_db()), timeout=10)
+        _cache_db_local.con = con
+    return con
+
+
+# ============================================================================
+#                               Function hash_file_contents
+# ============================================================================
+def hash_file_contents(fname, algorithms=('md5', 'sha1', 'sha256'), chunk_size=HASH_CHUNK_SIZE) -> dict:
+    # Computes all the requested digests in a single pass over the file.
+    # Two buffers alternate: while the digests of one chunk are computed (one
+    # thread per algorithm, hashlib releases the GIL), the next chunk is read.
+    hashers = {name: hashlib.new(name) for name in algorithms}
+    buffers = [bytearray(chunk_size), bytearray(chunk_size)]
+    current = 0
+    pending = []
+    with open(fname, 'rb', buffering=0) as f, concurrent.futures.ThreadPoolExecutor(max_workers=len(hashers)) as executor:
+        while True:
+            view = memoryview(buffers[current])
+            n = f.readinto(view)
+            for future in pending:
+                future.result()
+            if not n:
+                break
+            chunk = view[:n]
+            pending = [executor.submit(hasher.update, chunk) for hasher in hashers.values()]
+            current ^= 1
+    return {name: hasher.hexdigest() for name, hasher in hashers.items()}
+
+
+# ============================================================================
+#                               Function file_digests
+# ============================================================================
+def file_digests(fname, algorithms=('md5', 'sha1', 'sha256'), use_cache=True) -> dict:
+    # Returns {algorithm: hexdigest} of fname for the requested algorithms (md5, sha1 and / or sha256).
+    # Results are cached in the FILE_HASH table keyed by path, size, mtime and inode,
+    # so hashing an unchanged file again is a single lookup. Only the missing digests
+    # are computed, the ones not asked for are stored as '' until they are.
+    # Raises on I/O errors, cache errors only disable the cache.
+    file_path = os.path.abspath(fname)
+    st = os.stat(file_path)
+    key = (file_path, st.st_size, st.st_mtime_ns, st.st_ino)
+    digests = {'md5': '', 'sha1': '', 'sha256': ''}
+    if use_cache:
+        try:
+            row = get_cache_db().execute("SELECT md5, sha1, sha256 FROM FILE_HASH WHERE file_path = ? AND size = ? AND mtime_ns = ? AND inode = ?", key).fetchone()
+            if row:
+                digests = {'md5': row[0], 'sha1': row[1], 'sha256': row[2]}
+        except Exception as e:
+            debug(f"Hash cache lookup failed: {e}")
+    missing = [name for name in algorithms if not digests[name]]
+    if missing:
+        digests.update(hash_file_contents(file_path, missing))
+        if use_cache:
+            try:
+                con = get_cache_db()
+                with con:
+                    con.execute("INSERT OR REPLACE INTO FILE_HASH (file_path, size, mtime_ns, inode, md5, sha1, sha256, epoch) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", key + (digests['md5'], digests['sha1'], digests['sha256'], int(time.time())))
+            except Exception as e:
+                debug(f"Hash cache update failed: {e}")
+    return {name: digests[name] for name in algorithms}
+
+
+# ============================================================================
+#                               Function prune_file_hash
+# ============================================================================
+def prune_file_hash():
+    # Drops the FILE_HASH rows of files that are gone or have changed since they were hashed.
+    try:
+        con = get_cache_db()
+        stale = []
+        for file_path, size, mtime_ns, inode in con.execute("SELECT file_path, size, mtime_ns, inode FROM FILE_HASH").fetchall():
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                stale.append((file_path,))
+                continue
+            if (st.st_size, st.st_mtime_ns, st.st_ino) != (size, mtime_ns, inode):
+                stale.append((file_path,))
+        if stale:
+            with con:
+                con.executemany("DELETE FROM FILE_HASH WHERE file_path = ?", stale)
+            debug(f"Pruned {len(stale)} stale FILE_HASH entries")
+    except Exception as e:
+        debug(f"Hash cache prune failed: {e}")
+
+
+# ============================================================================
+#                               Class LabelStore
+# ============================================================================
+class LabelStore(dict):
+    """Application labels, package -> most recent label, backed by the APP_LABEL table.
+
+    Every label is also indexed by (package, versionCode, apk path hash) so
+    a label only needs to be resolved again when the app is updated. Rows
+    are written one at a time as labels are set, and labels.json of older
+    versions is imported the first time the table is empty.
+    """
+    def __init__(self):
+        super().__init__()
+        self.index = {}
+
+    @staticmethod
+    def key(pkg, version_code='', path=''):
+        path_hash = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16] if path else ''
+        return pkg, str(version_code or ''), path_hash
+
+    def load(self):
+        try:
+            rows = get_cache_db().execute("SELECT package, version_code, path_hash, label, icon FROM APP_LABEL ORDER BY epoch").fetchall()
+        except Exception as e:
+            debug(f"Could not load labels: {e}")
+            rows = []
+        for pkg, version_code, path_hash, label, icon in rows:
+            self.index[(pkg, version_code, path_hash)] = (label, icon or '')
+            dict.__setitem__(self, pkg, label)
+        labels_file = get_labels_file_path()
+        if not rows and os.path.exists(labels_file):
+            try:
+                with open(labels_file, "r", encoding='ISO-8859-1', errors="replace") as f:
+                    legacy = json.load(f)
+                print(f"Importing {len(legacy)} labels from {labels_file}")
+                self.update(legacy)
+            except Exception as e:
+                print(f"\n⚠️ {datetime.now():%Y-%m-%d %H:%M:%S} WARNING: Could not import {labels_file}: {e}")
+
+    def lookup(self, pkg, version_code='', path=''):
+        # Returns (label, icon) cached for this build of the package, None if unknown.
+        return self.index.get(self.key(pkg, version_code, path))
+
+    def store(self, pkg, label, icon='', version_code='', path=''):
+        self.store_many([(pkg, label, icon, version_code, path)])
+
+    def store_many(self, items):
+        # items: iterable of (pkg, label, icon, version_code, path)
+        rows = []
+        now = int(time.time())
+        for pkg, label, icon, version_code, path in items:
+            key = self.key(pkg, version_code, path)
+            self.index[key] = (label, icon or '')
+            dict.__setitem__(self, pkg, label)
+            rows.append(key + (label, icon or '', now))
+        if not rows:
+            return
+        try:
+            con = get_cache_db()
+            with con:
+                # a new build supersedes the unversioned label and the one installed at the same path.
+                con.executemany("DELETE FROM APP_LABEL WHERE package = ? AND (version_code = '' OR path_hash = ?) AND version_code <> ?", [(row[0], row[2], row[1]) for row in rows if row[2]])
+                con.executemany("INSERT OR REPLACE INTO APP_LABEL (package, version_code, path_hash, label, icon, epoch) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except Exception as e:
+            debug(f"Label store update failed: {e}")
+
+    def __setitem__(self, pkg, label):
+        self.store(pkg, label)
+
+    def update(self, *args, **kwargs):
+        self.store_many((pkg, label, '', '', '') for pkg, label in dict(*args, **kwargs).items())
+
+
+# ============================================================================
+#                               Class FirmwareCache
+# ============================================================================
+class FirmwareCache():
+    """Files PixelFlasher needs from processed firmware archives, keyed by the archive's sha256.
+
+    Each entry is a directory <config>/firmware_cache/<sha256> holding the
+    extracted images and flash-all scripts, recorded in the FIRMWARE_CACHE
+    table along with the factory_images directory the archive was unpacked
+    to. The sha256 comes from file_digests, which costs a lookup for an
+    archive that was hashed before (size + mtime fast path).
+
+    Entries are evicted least recently used first once they exceed
+    budget_gb. Only the cache's own copies are evicted, the factory_images
+    directories belong to the user (flash_phone needs them) and are never
+    removed here. A budget of 0 disables the cache.
+    """
+    def __init__(self, budget_gb=None):
+        if budget_gb is None:
+            budget_gb = get_config().firmware_cache_gb if get_config() else 0
+        self.budget = int(float(budget_gb or 0) * 1024 * 1024 * 1024)
+        self.root = os.path.join(get_config_path(), 'firmware_cache')
+
+    @property
+    def enabled(self):
+        return self.budget > 0
+
+    @staticmethod
+    def dir_size(path):
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(path):
+            for name in filenames:
+                with contextlib.suppress(OSError):
+                    total += os.path.getsize(os.path.join(dirpath, name))
+        return total
+
+    def lookup(self, archive):
+        # Returns {'sha256', 'dir', 'package_sig', 'package_dir', 'members'} or None.
+        if not self.enabled or not archive or not os.path.exists(archive):
+            return None
+        try:
+            key = file_digests(archive, ('sha256',))['sha256']
+            con = get_cache_db()
+            row = con.execute("SELECT package_sig, package_dir, members FROM FIRMWARE_CACHE WHERE archive_sha256 = ?", (key,)).fetchone()
+            if not row:
+                return None
+            entry = {'sha256': key, 'dir': os.path.join(self.root, key), 'package_sig': row[0], 'package_dir': row[1], 'members': json.loads(row[2])}
+            if not os.path.isdir(entry['dir']):
+                with con:
+                    con.execute("DELETE FROM FIRMWARE_CACHE WHERE archive_sha256 = ?", (key,))
+                return None
+            with con:
+                con.execute("UPDATE FIRMWARE_CACHE SET last_used = ? WHERE archive_sha256 = ?", (int(time.time()), key))
+            return entry
+        except Exception as e:
+            debug(f"Firmware cache lookup failed: {e}")
+            return None
+
+    def restore(self, entry, names, destination):
+        # Copies the cached files to destination, False if any of them is missing.
+        sources = [os.path.join(entry['dir'], name) for name in names]
+        if not all(os.path.exists(source) for source in sources):
+            return False
+        os.makedirs(destination, exist_ok=True)
+        for source in sources:
+            debug(f"Copying {source} to {destination}")
+            shutil.copy(source, destination, follow_symlinks=True)
+        return True
+
+    def store(self, archive, package_sig, package_dir, files, members):
+        # files: {name: path of the extracted file}, members: {name: member found in the archive}
+        if not self.enabled:
+            return None
+        try:
+            key = file_digests(archive, ('sha256',))['sha256']
+            cache_dir = os.path.join(self.root, key)
+            os.makedirs(cache_dir, exist_ok=True)
+            for name, path in files.items():
+                if path and os.path.exists(path):
+                    shutil.copy(path, os.path.join(cache_dir, name), follow_symlinks=True)
+            now = int(time.time())
+            con = get_cache_db()
+            with con:
+                con.execute("INSERT OR REPLACE INTO FIRMWARE_CACHE (archive_sha256, file_path, package_sig, package_dir, members, size, last_used, epoch) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (key, os.path.abspath(archive), package_sig, package_dir, json.dumps(members), self.dir_size(cache_dir), now, now))
+            debug(f"Stored {', '.join(files)} of {archive} in the firmware cache")
+            self.evict(keep=key)
+            return key
+        except Exception as e:
+            debug(f"Firmware cache update failed: {e}")
+            return None
+
+    def evict(self, keep=None):
+        # Removes the least recently used entries from firmware_cache until it fits the budget.
+        # The entry keep is never removed.
+        try:
+            con = get_cache_db()
+            rows = con.execute("SELECT archive_sha256, file_path, size FROM FIRMWARE_CACHE ORDER BY last_used").fetchall()
+            total = sum(size for _, _, size in rows)
+            for key, file_path, size in rows:
+                if total <= self.budget:
+                    break
+                if key == keep:
+                    continue
+                print(f"Evicting {key} ({file_path}) from the firmware cache")
+                shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+                total -= size
+                with con:
+                    con.execute("DELETE FROM FIRMWARE_CACHE WHERE archive_sha256 = ?", (key,))
+        except Exception as e:
+            debug(f"Firmware cache eviction failed: {e}")
+
+
+# ============================================================================
+#                               Function get_prop_snapshot
+# ============================================================================
+def get_prop_snapshot(serial, mode, build_key, boot_id=''):
+    # Returns the raw property dump stored for the device if it was taken on the same
+    # build and boot less than PROP_SNAPSHOT_TTL seconds ago, None otherwise.
+    if not serial or not build_key:
+        return None
+    try:
+        row = get_cache_db().execute("SELECT props FROM DEVICE_PROPS WHERE serial = ? AND mode = ? AND build_key = ? AND boot_id = ? AND epoch >= ?", (serial, mode, build_key, boot_id or '', int(time.time()) - PROP_SNAPSHOT_TTL)).fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        debug(f"Could not read the property snapshot of {serial}: {e}")
+        return None
+
+
+# ============================================================================
+#                               Function clear_prop_snapshot
+# ============================================================================
+def clear_prop_snapshot(serial):
+    # Called before anything that changes the device's state (flash, erase, set active slot, (un)lock).
+    if not serial:
+        return
+    try:
+        con = get_cache_db()
+        with con:
+            con.execute("DELETE FROM DEVICE_PROPS WHERE serial = ?", (serial,))
+    except Exception as e:
+        debug(f"Could not clear the property snapshot of {serial}: {e}")
+
+
+# ============================================================================
+#                               Function save_prop_snapshot
+# ============================================================================
+def save_prop_snapshot(serial, mode, build_key, boot_id, props):
+    if not serial or not build_key or not props:
+        return
+    try:
+        con = get_cache_db()
+        with con:
+            con.execute("INSERT OR REPLACE INTO DEVICE_PROPS (serial, mode, build_key, boot_id, props, epoch) VALUES (?, ?, ?, ?, ?, ?)", (serial, mode, build_key, boot_id or '', props, int(time.time())))
+    except Exception as e:
+        debug(f"Could not save the property snapshot of {serial}: {e}")
+
+
+# ============================================================================
+#                               Class SparseImageWriter
+# ============================================================================
+class SparseImageWriter():
+    """File-like writer that stores a raw image as an Android sparse image.
+
+    Runs of all-zero blocks become FILL chunks (value 0) so flashing or
+    simg2img restores them as zeros; everything else becomes RAW chunks.
+    A trailing partial block is zero padded.
+    """
+    MAGIC = 0xED26FF3A
+    RAW = 0xCAC1
+    FILL = 0xCAC2
+    RAW_RUN_LIMIT = 16 * 1024 * 1024
+
+    def __init__(self, path, block_size=4096):
+        self.f = open(path, 'wb')
+        self.block_size = block_size
+        self.zero_block = bytes(block_size)
+        self.pending = bytearray()
+        self.raw = bytearray()
+        self.zero_blocks = 0
+        self.total_blocks = 0
+        self.total_chunks = 0
+        self.f.write(bytes(28))
+
+    def _chunk(self, chunk_type, blocks, payload):
+        self.f.write(struct.pack('<HHII', chunk_type, 0, blocks, 12 + len(payload)))
+        self.f.write(payload)
+        self.total_blocks += blocks
+        self.total_chunks += 1
+
+    def _flush_raw(self):
+        if self.raw:
+            self._chunk(self.RAW, len(self.raw) // self.block_size, self.raw)
+            self.raw = bytearray()
+
+    def _flush_zero(self):
+        if self.zero_blocks:
+            self._chunk(self.FILL, self.zero_blocks, bytes(4))
+            self.zero_blocks = 0
+
+    def _blocks(self, data):
+        bs = self.block_size
+        # fast path for whole chunks of zeros
+        if data.count(0) == len(data):
+            self._flush_raw()
+            self.zero_blocks += len(data) // bs
+            return
+        for pos in range(0, len(data), bs):
+            block = data[pos:pos + bs]
+            if block == self.zero_block:
+                self._flush_raw()
+                self.zero_blocks += 1
+            else:
+                self._flush_zero()
+                self.raw += block
+                if len(self.raw) >= self.RAW_RUN_LIMIT:
+                    self._flush_raw()
+
+    def write(self, data):
+        size = len(data)
+        if self.pending:
+            data = bytes(self.pending) + bytes(data)
+        usable = len(data) - len(data) % self.block_size
+        if usable:
+            self._blocks(data[:usable])
+        self.pending = bytearray(data[usable:])
+        return size
+
+    def close(self):
+        if self.f is None:
+            return
+        if self.pending:
+            self._blocks(bytes(self.pending) + bytes(self.block_size - len(self.pending)))
+            self.pending = bytearray()
+        self._flush_raw()
+        self._flush_zero()
+        self.f.seek(0)
+        self.f.write(struct.pack('<IHHHHIIII', self.MAGIC, 1, 0, 28, 12, self.block_size, self.total_blocks, self.total_chunks, 0))
+        self.f.close()
+        self.f = None
+
+
+# ============================================================================
+#                               Function get_dump_formats
+# ============================================================================
+def get_dump_formats():
+    # The DUMP_FORMATS that can be written here, zst needs the zstandard package.
+    formats = list(DUMP_FORMATS)
+    try:
+        import zstandard
+    except ImportError:
+        formats.remove('zst')
+    return formats
+
+
+# ============================================================================
+#                               Function open_dump_writer
+# ============================================================================
+def open_dump_writer(path, compression=''):
+    """Returns a writable file object that stores raw image data at path in the requested format."""
+    if compression == 'gz':
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compression == 'xz':
+        return lzma.open(path, 'wb', preset=3)
+    if compression == 'zst':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd output requires the zstandard package (pip install zstandard)")
+        # zeros compress to almost nothing, multithreaded level 3 keeps up with adb
+        return zstandard.ZstdCompressor(level=3, threads=-1).stream_writer(open(path, 'wb'), closefd=True)
+    if compression == 'sparse':
+        return SparseImageWriter(path)
+    if compression == '':
+        return open(path, 'wb')
+    raise ValueError(f"Unsupported dump format: {compression}")
+
+
 # ============================================================================
 #                               Function md5
 # ============================================================================
 def md5(fname) -> str:
     try:
-        hash_md5 = hashlib.md5()
-        with open(fname, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        return file_digests(fname, ('md5',))['md5']
     except Exception as e:
         print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Encountered an error computing md5.")
         traceback.print_exc()
@@ -2493,11 +3323,7 @@ def sha1(fname) -> str:
         if not fname or not os.path.exists(fname):
             print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: File [{fname}] does not exist, cannot compute sha1")
             return "NA Error"
-        hash_sha1 = hashlib.sha1()
-        with open(fname, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha1.update(chunk)
-        return hash_sha1.hexdigest()
+        return file_digests(fname, ('sha1',))['sha1']
     except Exception as e:
         print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Encountered an error while computing sha1")
         traceback.print_exc()
@@ -2509,11 +3335,7 @@ def sha1(fname) -> str:
 # ============================================================================
 def sha256(fname) -> str:
     try:
-        hash_sha256 = hashlib.sha256()
-        with open(fname, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
+        return file_digests(fname, ('sha256',))['sha256']
     except Exception as e:
         print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Encountered an error while computing sha256")
         traceback.print_exc()
@@ -2665,11 +3487,13 @@ def create_support_zip():
             debug(f"Copying {to_copy} to {support_dir_full}")
             shutil.copy(to_copy, support_dir_full, follow_symlinks=True)
 
-        # copy labels.json to tmp\support folder
-        to_copy = os.path.join(config_path, 'labels.json')
-        if os.path.exists(to_copy):
-            debug(f"Copying {to_copy} to {support_dir_full}")
-            shutil.copy(to_copy, support_dir_full, follow_symlinks=True)
+        # export the APP_LABEL table as labels.json to tmp\support folder
+        labels = get_labels()
+        if labels:
+            labels_file = os.path.join(support_dir_full, 'labels.json')
+            debug(f"Exporting {len(labels)} application labels to {labels_file}")
+            with open(labels_file, "w", encoding='ISO-8859-1', errors="replace") as f:
+                json.dump(dict(labels), f, indent=4)
 
         # copy logs to support folder
         to_copy = os.path.join(config_path, 'logs')
@@ -4620,97 +5444,127 @@ def resolve_url_redirects(url, max_redirects=5):
         return url
 
 
+# Raw byte patterns, the value has to be terminated so that a match cut at the
+# end of a range is not taken, the overlap of the next range completes it.
+OTA_FP_PATTERN = re.compile(rb"post-build=([^\s\x00]+)[\s\x00]")
+OTA_SP_PATTERN = re.compile(rb"security-patch-level=([^\s\x00]+)[\s\x00]")
+
+
+# ============================================================================
+#                Function scan_ota_fp_sp
+# ============================================================================
+def scan_ota_fp_sp(data, fingerprint=None, security_patch=None):
+    if fingerprint is None:
+        fp_match = OTA_FP_PATTERN.search(data)
+        if fp_match:
+            fingerprint = fp_match.group(1).decode('utf-8', errors='ignore')
+    if security_patch is None:
+        sp_match = OTA_SP_PATTERN.search(data)
+        if sp_match:
+            security_patch = sp_match.group(1).decode('utf-8', errors='ignore')
+    return fingerprint, security_patch
+
+
 # ============================================================================
 #                Function get_fp_sp_from_ota_http_range
 # ============================================================================
 def get_fp_sp_from_ota_http_range(url, state=None, chunk_size=8*1024*1024, overlap=200) -> tuple[str | None, str | None]:
+    # The values live in META-INF/com/android/metadata, which is located through
+    # the zip central directory and read on its own (a handful of small range
+    # requests). Only if that fails the whole file is scanned, OTA_RANGE_WORKERS
+    # ranges at a time over one keep-alive session, tail and head first.
     try:
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", urllib3.exceptions.InsecureRequestWarning)
 
+            fingerprint = None
+            security_patch = None
+            session = get_http_session()
+
+            total_size = None
+            try:
+                remote = HttpRangeFile(url, session=session, verify=False)
+                total_size = remote.size
+                url = remote.url
+                with zipfile.ZipFile(remote) as zip_file:
+                    metadata = zip_file.read('META-INF/com/android/metadata')
+                fingerprint, security_patch = scan_ota_fp_sp(metadata + b'\n')
+                debug(f"Read OTA metadata with {remote.requests} range requests ({remote.bytes_fetched} bytes)")
+                if fingerprint and security_patch:
+                    debug(f"Found fingerprint: {fingerprint}")
+                    debug(f"Found security patch: {security_patch}")
+                    return fingerprint, security_patch
+            except Exception as e:
+                debug(f"Could not read OTA metadata through the zip central directory: {e}")
+
             # Get the file size
-            total_size = get_size_from_url(url)
+            if total_size is None:
+                total_size = get_size_from_url(url)
             if total_size is None:
                 print(f"⚠️ Could not determine file size for {url}.")
                 return None, None
 
-            fingerprint = None
-            security_patch = None
+            # Tail (central directory, metadata of most OTAs) and head first, then the rest in order.
+            starts = list(range(0, total_size, chunk_size))
+            if len(starts) > 1:
+                starts = [starts[-1], starts[0]] + starts[1:-1]
 
-            # Set up regex patterns for OTA
-            fp_pattern_complete = r"post-build=(.+?)(\s|$)"
-            sp_pattern_complete = r"security-patch-level=(.+?)(\s|$)"
+            done = threading.Event()
 
-            debug(f"Starting OTA chunked download with chunk_size=0x{chunk_size:x}, overlap=0x{overlap:x}")
-            i = 0
-            while fingerprint is None or security_patch is None:
-                # Check if abort was triggered
-                if state and state.stop_event.is_set():
-                    debug("OTA processing aborted by user")
-                    return None, None
-
-                # Calculate start and end ranges with overlap
-                start_range = i * chunk_size
-                end_range = ((i + 1) * chunk_size) + overlap
-
-                # Check if we've reached the end of the file
-                if start_range >= total_size:
-                    debug(f"Reached end of file at position {start_range}")
-                    break
-
-                # Adjust end_range if it exceeds file size
-                if end_range > total_size:
-                    end_range = total_size
-
-                # Request range of bytes
+            def fetch(start_range):
+                if done.is_set():
+                    return None
+                end_range = min(start_range + chunk_size + overlap, total_size)
                 headers = {
                     "Range": f"bytes={start_range}-{end_range - 1}",
                     "Accept-Encoding": "identity"  # Disable compression to avoid gzip issues
                 }
-                # debug(f"Fetching bytes {start_range} to {end_range - 1} from {url}")
                 debug(f"Fetching bytes 0x{start_range:x} to 0x{(end_range - 1):x}")
-                wx.Yield()
-
-                try:
-                    response = requests.get(url, headers=headers, stream=True, verify=False, timeout=30)
-
-                    if response.status_code == 206:  # Partial content success
-                        ## Optional save each binary chunk to file for debugging
-                        #
-                        # config_path = get_config_path()
-                        # debug_dir = os.path.join(config_path, 'debug_chunks')
-                        # os.makedirs(debug_dir, exist_ok=True)
-                        # chunk_filename = os.path.join(debug_dir, f"chunk_{start_range}_{end_range - 1}.bin")
-                        # with open(chunk_filename, 'wb') as chunk_file:
-                        #     chunk_file.write(response.content)
-                        # print(f"Saved chunk to {chunk_filename}")
-
-                        content = response.content.decode('utf-8', errors='ignore')
-
-                        # Search for fingerprint
-                        if fingerprint is None:
-                            fp_match = re.search(fp_pattern_complete, content)
-                            if fp_match:
-                                fingerprint = fp_match.group(1).strip('\x00')
-                                debug(f"Found fingerprint: {fingerprint}")
-                                wx.Yield()
-
-                        # Search for security patch
-                        if security_patch is None:
-                            sp_match = re.search(sp_pattern_complete, content)
-                            if sp_match:
-                                security_patch = sp_match.group(1).strip('\x00')
-                                debug(f"Found security patch: {security_patch}")
-                                wx.Yield()
-
-                        i += 1
-                    else:
-                        debug(f"Server returned status {response.status_code}, cannot use partial content")
-                        break
-
-                except Exception as e:
-                    debug(f"Error fetching range {start_range}-{end_range}: {e}")
-                    break
+                with session.get(url, headers=headers, stream=True, verify=False, timeout=30) as response:
+                    if response.status_code != 206:  # Partial content only
+                        raise OSError(f"Server returned status {response.status_code}, cannot use partial content")
+                    data = bytearray()
+                    for block in response.iter_content(EXTRACT_CHUNK_SIZE):
+                        if done.is_set():
+                            return None
+                        data += block
+                # End of file terminates a value just like whitespace does.
+                if end_range == total_size:
+                    data += b'\n'
+                return data
+
+            debug(f"Starting OTA range scan with chunk_size=0x{chunk_size:x}, overlap=0x{overlap:x}, {OTA_RANGE_WORKERS} workers")
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=OTA_RANGE_WORKERS)
+            try:
+                pending = {executor.submit(fetch, start): start for start in starts}
+                while pending and (fingerprint is None or security_patch is None):
+                    # Check if abort was triggered
+                    if state and state.stop_event.is_set():
+                        debug("OTA processing aborted by user")
+                        return None, None
+                    finished, _ = concurrent.futures.wait(pending, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED)
+                    wx.Yield()
+                    for future in finished:
+                        start_range = pending.pop(future)
+                        try:
+                            data = future.result()
+                        except Exception as e:
+                            debug(f"Error fetching range at 0x{start_range:x}: {e}")
+                            pending.clear()
+                            break
+                        if data is None:
+                            continue
+                        fp, sp = scan_ota_fp_sp(data, fingerprint, security_patch)
+                        if fp != fingerprint:
+                            fingerprint = fp
+                            debug(f"Found fingerprint: {fingerprint}")
+                        if sp != security_patch:
+                            security_patch = sp
+                            debug(f"Found security patch: {security_patch}")
+            finally:
+                # Stop the ranges in flight and drop the ones not started yet.
+                done.set()
+                executor.shutdown(wait=False, cancel_futures=True)
 
             return fingerprint, security_patch
 
@@ -6522,6 +7376,58 @@ def get_freeman_pif(abi_list=None):
         traceback.print_exc()
 
 
+# ============================================================================
+#                               Function write_image_build_prop
+# ============================================================================
+def write_image_build_prop(image, partition, props_path):
+    # Reads build.prop straight from the ext4 / EROFS filesystem of a system, vendor or product image
+    # (path or seekable file object) and saves it as <partition>-build.prop in props_path.
+    # Returns False when the image can not be read this way, callers then fall back to 7z.
+    try:
+        if isinstance(image, str):
+            with open(image, 'rb') as f:
+                found = read_image_file(f, BUILD_PROP_PATHS[partition])
+        else:
+            found = read_image_file(image, BUILD_PROP_PATHS[partition])
+    except FsImageError as e:
+        debug(f"Could not read build.prop from the {partition} image: {e}")
+        return False
+    except Exception as e:
+        print(f"⚠️ {datetime.now():%Y-%m-%d %H:%M:%S} WARNING: Could not read the {partition} image filesystem: {e}")
+        return False
+    if not found:
+        debug(f"build.prop not found in the {partition} image filesystem")
+        return False
+    with open(os.path.join(props_path, f"{partition}-build.prop"), 'wb') as f:
+        f.write(found[1])
+    print(f"Read {found[0]} from the {partition} image")
+    return True
+
+
+# ============================================================================
+#                               Function write_build_props_from_zip
+# ============================================================================
+def write_build_props_from_zip(zip_source, props_path):
+    # Reads build.prop of the system, vendor and product images in the zip zip_source (path or file object)
+    # without extracting the images. Returns the partitions whose image is in the zip but whose build.prop
+    # could not be read this way, those still need their image extracted. All three when the zip has none
+    # of the images or can't be read.
+    pending = ['system', 'vendor', 'product']
+    try:
+        with zipfile.ZipFile(zip_source, 'r') as zip_file:
+            names = zip_file.namelist()
+            images = [partition for partition in pending if f"{partition}.img" in names]
+            if images:
+                pending = []
+                for partition in images:
+                    with zip_file.open(f"{partition}.img", 'r') as image:
+                        if not write_image_build_prop(image, partition, props_path):
+                            pending.append(partition)
+    except Exception as e:
+        debug(f"Could not read the images in {zip_source}: {e}")
+    return pending
+
+
 # ============================================================================
 #                               Function get_pif_from_image
 # ============================================================================
@@ -6551,7 +7457,7 @@ def get_pif_from_image(image_file):
         # process system.img
         try:
             img_archive = os.path.join(temp_dir_path, "system.img")
-            if os.path.exists(img_archive):
+            if os.path.exists(img_archive) and not write_image_build_prop(img_archive, 'system', props_path):
                 found_system_build_prop = check_archive_contains_file(archive_file_path=img_archive, file_to_check="build.prop", nested=False, is_recursive=False)
                 if isinstance(found_system_build_prop, str) and found_system_build_prop:
                     print(f"Extracting build.prop from {img_archive} ...")
@@ -6569,7 +7475,7 @@ def get_pif_from_image(image_file):
         # process vendor.img
         try:
             img_archive = os.path.join(temp_dir_path, "vendor.img")
-            if os.path.exists(img_archive):
+            if os.path.exists(img_archive) and not write_image_build_prop(img_archive, 'vendor', props_path):
                 found_vendor_img_prop = check_archive_contains_file(archive_file_path=img_archive, file_to_check="build.prop", nested=False, is_recursive=False)
                 if isinstance(found_vendor_img_prop, str) and found_vendor_img_prop:
                     print(f"Extracting build.prop from {img_archive} ...")
@@ -6587,7 +7493,7 @@ def get_pif_from_image(image_file):
         # process product.img
         try:
             img_archive = os.path.join(temp_dir_path, "product.img")
-            if os.path.exists(img_archive):
+            if os.path.exists(img_archive) and not write_image_build_prop(img_archive, 'product', props_path):
                 found_product_img_prop = check_archive_contains_file(archive_file_path=img_archive, file_to_check="build.prop", nested=False, is_recursive=False)
                 if isinstance(found_product_img_prop, str) and found_product_img_prop:
                     print(f"Extracting build.prop from {img_archive} ...")
@@ -6608,29 +7514,28 @@ def get_pif_from_image(image_file):
     def check_for_system_vendor_product_imgs(filename):
         # check if image file is included and contains what we need
         if os.path.exists(filename):
+            # read build.prop without extracting the images if their filesystems can be read
+            pending = write_build_props_from_zip(filename, props_path)
+            if not pending:
+                return True
+
             # extract system.img
-            found_system_img = check_archive_contains_file(archive_file_path=filename, file_to_check="system.img", nested=False, is_recursive=False)
+            found_system_img = 'system' in pending and check_archive_contains_file(archive_file_path=filename, file_to_check="system.img", nested=False, is_recursive=False)
             if found_system_img:
                 print(f"Extracting system.img from {filename} ...")
-                theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{temp_dir_path}\" \"{filename}\" system.img"
-                debug(theCmd)
-                res = run_shell2(theCmd)
+                res = extract_archive(filename, temp_dir_path, ['system.img'])
 
             # extract vendor.img
-            found_vendor_img = check_archive_contains_file(archive_file_path=filename, file_to_check="vendor.img", nested=False, is_recursive=False)
+            found_vendor_img = 'vendor' in pending and check_archive_contains_file(archive_file_path=filename, file_to_check="vendor.img", nested=False, is_recursive=False)
             if found_vendor_img:
                 print(f"Extracting system.img from {filename} ...")
-                theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{temp_dir_path}\" \"{filename}\" vendor.img"
-                debug(theCmd)
-                res = run_shell2(theCmd)
+                res = extract_archive(filename, temp_dir_path, ['vendor.img'])
 
             # extract product.img
-            found_product_img = check_archive_contains_file(archive_file_path=filename, file_to_check="product.img", nested=False, is_recursive=False)
+            found_product_img = 'product' in pending and check_archive_contains_file(archive_file_path=filename, file_to_check="product.img", nested=False, is_recursive=False)
             if found_product_img:
                 print(f"Extracting system.img from {filename} ...")
-                theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{temp_dir_path}\" \"{filename}\" product.img"
-                debug(theCmd)
-                res = run_shell2(theCmd)
+                res = extract_archive(filename, temp_dir_path, ['product.img'])
 
     try:
         # .img file
@@ -6659,11 +7564,23 @@ def get_pif_from_image(image_file):
                 return
             package_dir_full = os.path.join(temp_dir_path, package_sig)
             image_file_path = os.path.join(package_dir_full, f"image-{package_sig}.zip")
+            # the image zip is normally stored, read build.prop straight from the images in it
+            nested_image = zip_member_offset(file_to_process, f"{package_sig}/image-{package_sig}.zip")
+            pending = ['system', 'vendor', 'product']
+            if nested_image:
+                with open(file_to_process, 'rb') as f:
+                    pending = write_build_props_from_zip(io.BufferedReader(ArchiveRange(f, *nested_image)), props_path)
+                if not pending:
+                    return props_path
+
+            # or at least extract the images we still need from it in place
+            if extract_from_nested_zip(file_to_process, f"{package_sig}/image-{package_sig}.zip", [f"{partition}.img" for partition in pending], temp_dir_path):
+                process_system_vendor_product_images()
+                return props_path
+
             # Unzip the factory image
             debug(f"Unzipping Image: {file_to_process} into {package_dir_full} ...")
-            theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{temp_dir_path}\" \"{file_to_process}\""
-            debug(theCmd)
-            res = run_shell2(theCmd)
+            res = extract_archive(file_to_process, temp_dir_path)
             if res and isinstance(res, subprocess.CompletedProcess):
                 debug(f"Return Code: {res.returncode}")
                 debug(f"Stdout: {res.stdout}")
@@ -6688,22 +7605,26 @@ def get_pif_from_image(image_file):
             # Firmware with payload.bin
             # -----------------------------
             print("Detected a firmware, with payload.bin")
-            # extract the payload.bin into a temporary directory
-            print(f"Extracting payload.bin from {file_to_process} ...")
-            theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{temp_dir_path}\" \"{file_to_process}\" payload.bin"
-            debug(f"{theCmd}")
-            res = run_shell(theCmd)
-            if res and isinstance(res, subprocess.CompletedProcess) and res.returncode != 0:
-                print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not extract payload.bin.")
-                print(f"Return Code: {res.returncode}.")
-                print(f"Stdout: {res.stdout}.")
-                print(f"Stderr: {res.stderr}.")
-                print("Aborting ...\n")
-                return
+            # a stored payload.bin is read in place, otherwise extract it into a temporary directory
+            payload_offset = 0
+            payload_member = zip_member_offset(file_to_process, 'payload.bin')
+            if payload_member:
+                payload_file_path = file_to_process
+                payload_offset = payload_member[0]
+            else:
+                print(f"Extracting payload.bin from {file_to_process} ...")
+                res = extract_archive(file_to_process, temp_dir_path, ['payload.bin'])
+                if res and isinstance(res, subprocess.CompletedProcess) and res.returncode != 0:
+                    print(f"\n❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: Could not extract payload.bin.")
+                    print(f"Return Code: {res.returncode}.")
+                    print(f"Stdout: {res.stdout}.")
+                    print(f"Stderr: {res.stderr}.")
+                    print("Aborting ...\n")
+                    return
+                payload_file_path = os.path.join(temp_dir_path, "payload.bin")
 
-            payload_file_path = os.path.join(temp_dir_path, "payload.bin")
             if os.path.exists(payload_file_path):
-                extract_payload(payload_file_path, out=temp_dir_path, diff=False, old='old', images='system,vendor,product')
+                extract_payload(payload_file_path, out=temp_dir_path, diff=False, old='old', images='system,vendor,product', payload_offset=payload_offset)
                 process_system_vendor_product_images()
                 return props_path
             return
@@ -6765,9 +7686,7 @@ def get_pif_from_image(image_file):
 
                 # extract AP file
                 print(f"Extracting {found_ap} from {image_file} ...")
-                theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{temp_dir_path}\" \"{image_file}\" {found_ap}"
-                debug(theCmd)
-                res = run_shell2(theCmd)
+                res = extract_archive(image_file, temp_dir_path, [found_ap])
                 if res and isinstance(res, subprocess.CompletedProcess):
                     debug(f"Return Code: {res.returncode}")
                     debug(f"Stdout: {res.stdout}")
@@ -6786,9 +7705,7 @@ def get_pif_from_image(image_file):
                     return
                 # extract image file
                 print(f"Extracting {image_file_path} ...")
-                theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{temp_dir_path}\" \"{image_file_path}\" \"meta-data\""
-                debug(theCmd)
-                res = run_shell2(theCmd)
+                res = extract_archive(image_file_path, temp_dir_path, ['meta-data'])
                 if res and isinstance(res, subprocess.CompletedProcess):
                     debug(f"Return Code: {res.returncode}")
                     debug(f"Stdout: {res.stdout}")
@@ -6815,9 +7732,7 @@ def get_pif_from_image(image_file):
                 if found_fota_zip:
                     # extract fota.zip
                     print(f"Extracting fota.zip from {image_file_path} ...")
-                    theCmd = f"\"{path_to_7z}\" x -bd -y -o\"{temp_dir_path}\" \"{file_path}\" \"SYSTEM\" \"VENDOR\""
-                    debug(theCmd)
-                    res = run_shell2(theCmd)
+                    res = extract_archive(file_path, temp_dir_path, ['SYSTEM', 'VENDOR'])
 
                     source_path = os.path.join(temp_dir_path, "VENDOR", "build.prop")
                     destination_path = os.path.join(props_path, "system-build.prop")
@@ -10505,52 +11420,84 @@ def get_bootloader_versions():
                 debug(f"❌ {datetime.now():%Y-%m-%d %H:%M:%S} ERROR: cleaning up temp directory: {str(e)}")
 
 
+KERNEL_PRINTABLE_RUN_REGEX = re.compile(rb'[\x20-\x7E]{4,}')
+# SHA1= (Magisk config) and fingerprint markers, both printable so always inside a printable run
+BOOT_MARKER_REGEX = re.compile(rb'(?P<sha1>SHA1=)|(?P<fingerprint>fingerprint)')
+KERNEL_VERSION_REGEX = re.compile(rb'\d+\.\d+\.\d+[-\w]+')
+KERNEL_DATE_REGEX = re.compile(rb'(?:#\d+ )?SMP PREEMPT .+\d{4}')
+
+
 # ============================================================================
-#                               Function extract_strings
+#                               Function scan_boot_image
 # ============================================================================
-def extract_strings(filename):
-    with open(filename, "rb") as f:
-        data = f.read()
-    return re.findall(rb'[\x20-\x7E]{4,}', data)
+def scan_boot_image(boot_img_path) -> dict:
+    # Scans a (boot) image once through a memory mapping and returns
+    #   sha1:           up to 64 bytes following the first SHA1= marker (Magisk config)
+    #   fingerprint:    the 65 bytes following the first fingerprint marker
+    #   kernel_version: longest kernel version string, trimmed to the kernel banner
+    #   kernel_date:    longest kernel build date string
+    # The mapping is walked once, printable run by printable run, the markers and
+    # kernel patterns are applied to each run in place (pos / endpos). Only printable
+    # runs that match are ever copied out of the mapping, so memory stays bounded
+    # regardless of the image size.
+    # Results are cached per path, size and modification time.
+    try:
+        st = os.stat(boot_img_path)
+        key = (os.path.abspath(boot_img_path), st.st_size, st.st_mtime_ns)
+    except OSError:
+        key = None
+    if key and key in _boot_scan_cache:
+        return _boot_scan_cache[key]
+
+    result = {'sha1': None, 'sha1_offset': None, 'fingerprint': None, 'fingerprint_offset': None, 'kernel_version': None, 'kernel_date': None}
+    with open(boot_img_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return result
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            prefix = None
+            build_number = None
+            build_date = None
+            for run in KERNEL_PRINTABLE_RUN_REGEX.finditer(mm):
+                start, end = run.span()
+                # First SHA1= and fingerprint markers
+                if result['sha1'] is None or result['fingerprint'] is None:
+                    for marker in BOOT_MARKER_REGEX.finditer(mm, start, end):
+                        if marker.lastgroup == 'sha1' and result['sha1'] is None:
+                            result['sha1_offset'] = marker.end()
+                            result['sha1'] = mm[marker.end():marker.end() + 64]
+                        elif marker.lastgroup == 'fingerprint' and result['fingerprint'] is None:
+                            result['fingerprint_offset'] = marker.end() + 1
+                            result['fingerprint'] = mm[marker.end() + 1:marker.end() + 1 + 65]
+                # Get the prefix portion, don't look into multiline strings
+                if prefix is None and KERNEL_VERSION_REGEX.match(mm, start, end):
+                    prefix = mm[start:end]
+                # Get the longest candidates
+                vmatch = KERNEL_VERSION_REGEX.search(mm, start, end)
+                if vmatch and (build_number is None or vmatch.end() - vmatch.start() > len(build_number)):
+                    build_number = vmatch.group(0)
+                dmatch = KERNEL_DATE_REGEX.search(mm, start, end)
+                if dmatch and (build_date is None or dmatch.end() - dmatch.start() > len(build_date)):
+                    build_date = dmatch.group(0)
+
+    # Filter out anything before the prefix in the longest candidate
+    if prefix and build_number and prefix in build_number:
+        build_number = build_number[build_number.index(prefix):]
+    result['kernel_version'] = build_number.decode('ascii') if build_number else None
+    result['kernel_date'] = build_date.decode('ascii') if build_date else None
+
+    if key:
+        if len(_boot_scan_cache) >= 64:
+            _boot_scan_cache.pop(next(iter(_boot_scan_cache)))
+        _boot_scan_cache[key] = result
+    return result
 
 
 # ============================================================================
 #                               Function extract_kernel_info
 # ============================================================================
 def extract_kernel_info(boot_img_path):
-    strings = [s.decode(errors="ignore") for s in extract_strings(boot_img_path)]
-    version_regex = re.compile(r'^\d+\.\d+\.\d+[-\w]+')
-    date_regex = re.compile(r'(?:#\d+ )?SMP PREEMPT .+\d{4}')
-
-    # Step 1: Get the prefix portion, don't look into multiline strings
-    prefix = None
-    for i, line in enumerate(strings):
-        if version_regex.match(line):
-            prefix = line
-            break
-
-    # Step 2: Get the longest candidate by searching all lines
-    version_regex2 = re.compile(r'\d+\.\d+\.\d+[-\w]+')
-    version_candidates = []
-    date_candidates = []
-
-    for line in strings:
-        vmatch = version_regex2.search(line)
-        if vmatch:
-            version_candidates.append(vmatch.group(0))
-        dmatch = date_regex.search(line)
-        if dmatch:
-            date_candidates.append(dmatch.group(0))
-
-    build_number = max(version_candidates, key=len) if version_candidates else None
-    build_date = max(date_candidates, key=len) if date_candidates else None
-
-    # Step 3: Filter out anything before the prefix in the longest candidate
-    if prefix and build_number and prefix in build_number:
-        idx = build_number.index(prefix)
-        build_number = build_number[idx:]
-
-    return build_number, build_date
+    result = scan_boot_image(boot_img_path)
+    return result['kernel_version'], result['kernel_date']
 
 
 # ============================================================================
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+
+# This file is part of PixelFlasher https://github.com/badabing2005/PixelFlasher
+#
+# Copyright (C) 2025 Badabing2005
+# SPDX-FileCopyrightText: 2025 Badabing2005
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+# for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+# Also add information on how to contact you by electronic and paper mail.
+#
+# If your software can interact with users remotely through a computer network,
+# you should also make sure that it provides a way for users to get its source.
+# For example, if your program is a web application, its interface could
+# display a "Source" link that leads users to an archive of the code. There are
+# many ways you could offer source, and different solutions will be better for
+# different programs; see section 13 for the specific requirements.
+#
+# You should also get your employer (if you work as a programmer) or school, if
+# any, to sign a "copyright disclaimer" for the program, if necessary. For more
+# information on this, and how to apply and follow the GNU AGPL, see
+# <https://www.gnu.org/licenses/>.
+
+import contextlib
+
+import wx
+import wx.lib.mixins.listctrl as listmix
+
+
+# ============================================================================
+#                               Class ListModel
+# ============================================================================
+class ListModel():
+    """Columnar rows behind a VirtualListCtrl.
+
+    Each column is one list of values, rows are addressed by their position
+    in those lists. A lowercase search key is built per row when it is added,
+    and the sort order of a column is computed once and reused until a value
+    in that column changes, so filtering and sorting never rebuild rows.
+    `view` holds the rows that are shown, in display order.
+    """
+    def __init__(self, columns, search_columns=(0,)):
+        self.names = list(columns)
+        self.search_columns = tuple(search_columns)
+        self.query = ''
+        self.predicate = None
+        self.sort_column = -1
+        self.ascending = True
+        self.clear()
+
+    def clear(self):
+        # drops the rows, the filter and sort settings are kept for the next update_view.
+        self.columns = [[] for _ in self.names]
+        self.colours = []
+        self.search_keys = []
+        self.index = {}
+        self.checked = set()
+        self.view = []
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.search_keys)
+
+    def append(self, values, colour=None):
+        # values: one value per column, the first one is the row key.
+        row = len(self.search_keys)
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        self.colours.append(colour)
+        self.search_keys.append(self._search_key(row))
+        self.index[values[0]] = row
+        self._orders.clear()
+        return row
+
+    def _search_key(self, row):
+        return ' '.join(str(self.columns[col][row]).lower() for col in self.search_columns)
+
+    def value(self, row, col):
+        return self.columns[col][row]
+
+    def key(self, row):
+        return self.columns[0][row]
+
+    def row(self, key):
+        return self.index.get(key, -1)
+
+    def set_value(self, row, col, value):
+        # The view keeps its current order, the new value is used on the next filter / sort.
+        self.columns[col][row] = value
+        self._orders.pop(col, None)
+        if col in self.search_columns:
+            self.search_keys[row] = self._search_key(row)
+
+    def order(self, col):
+        # Row permutation of the whole model sorted ascending on col, cached per column.
+        order = self._orders.get(col)
+        if order is None:
+            values = self.columns[col]
+            order = sorted(range(len(values)), key=lambda row: self._sort_key(values[row]))
+            self._orders[col] = order
+        return order
+
+    @staticmethod
+    def _sort_key(value):
+        # numbers and bools first, then text, a column can mix them (ex: '' for unknown values).
+        if isinstance(value, str):
+            return (1, value.lower())
+        if value is None:
+            return (2, '')
+        return (0, value)
+
+    def filter(self, query='', predicate=None):
+        # predicate(row) -> bool, for filters that are not a text match.
+        self.query = query.lower()
+        self.predicate = predicate
+        self.update_view()
+
+    def sort(self, col, ascending=True):
+        self.sort_column = col
+        self.ascending = ascending
+        self.update_view()
+
+    def update_view(self):
+        if 0 <= self.sort_column < len(self.columns):
+            rows = self.order(self.sort_column)
+            if not self.ascending:
+                rows = reversed(rows)
+        else:
+            rows = range(len(self.search_keys))
+        query = self.query
+        predicate = self.predicate
+        search_keys = self.search_keys
+        self.view = [row for row in rows if (not query or query in search_keys[row]) and (predicate is None or predicate(row))]
+
+
+# ============================================================================
+#                               Class VirtualListCtrl
+# ============================================================================
+class VirtualListCtrl(wx.ListCtrl, listmix.ListCtrlAutoWidthMixin):
+    """Report mode LC_VIRTUAL list control that draws the `view` of a ListModel.
+
+    The control asks for the text of the rows that are visible only, checkbox
+    states are kept in the model and clicking a column header sorts the model.
+    Items are indexes in model.view, GetRow / GetKey map them to model rows.
+    """
+    def __init__(self, parent, ID, model, pos=wx.DefaultPosition, size=wx.DefaultSize, style=0):
+        wx.ListCtrl.__init__(self, parent, ID, pos, size, style | wx.LC_VIRTUAL)
+        listmix.ListCtrlAutoWidthMixin.__init__(self)
+        self.model = model
+        self.sort_images = None
+        self._attrs = {}
+        self._selected_key = None
+        self.Bind(wx.EVT_LIST_ITEM_SELECTED, self._on_item_selected)
+        self.Bind(wx.EVT_LIST_ITEM_DESELECTED, self._on_item_deselected)
+        self.Bind(wx.EVT_LIST_COL_CLICK, self._on_col_click)
+        self.Bind(wx.EVT_LIST_ITEM_CHECKED, self._on_item_checked)
+        self.Bind(wx.EVT_LIST_ITEM_UNCHECKED, self._on_item_unchecked)
+
+    def SetColumns(self, names=None):
+        info = wx.ListItem()
+        info.Mask = wx.LIST_MASK_TEXT | wx.LIST_MASK_IMAGE | wx.LIST_MASK_FORMAT
+        info.Image = -1
+        info.Align = wx.LIST_FORMAT_LEFT
+        info.Width = -1
+        for col, name in enumerate(names or self.model.names):
+            info.Text = name
+            self.InsertColumn(col, info)
+
+    def SetSortImages(self, down, up):
+        self.sort_images = (down, up)
+
+    def RefreshView(self):
+        # call after model.filter / model.sort / model.update_view, the selected row stays selected if it is still shown.
+        key = self._selected_key
+        selected = self.GetFirstSelected()
+        if selected != -1:
+            self.Select(selected, 0)
+        count = len(self.model.view)
+        self.SetItemCount(count)
+        if count:
+            self.RefreshItems(0, count - 1)
+        self.Refresh()
+        if key is not None:
+            item = self.FindKey(key)
+            if item != -1:
+                self.Select(item)
+                self.EnsureVisible(item)
+
+    def GetRow(self, item):
+        return self.model.view[item]
+
+    def GetKey(self, item):
+        return self.model.key(self.model.view[item])
+
+    def FindKey(self, key):
+        row = self.model.row(key)
+        if row == -1:
+            return -1
+        with contextlib.suppress(ValueError):
+            return self.model.view.index(row)
+        return -1
+
+    def GetItemText(self, item, col=0):  # type: ignore[reportIncompatibleMethodOverride]
+        return self.OnGetItemText(item, col)
+
+    def SetItemValue(self, item, col, value):
+        self.model.set_value(self.model.view[item], col, value)
+        self.RefreshItem(item)
+
+    def IsItemChecked(self, item):  # type: ignore[reportIncompatibleMethodOverride]
+        return self.model.view[item] in self.model.checked
+
+    def CheckItem(self, item, check=True):  # type: ignore[reportIncompatibleMethodOverride]
+        # Stores the state without sending EVT_LIST_ITEM_(UN)CHECKED, like the dialogs expect for check all.
+        if check:
+            self.model.checked.add(self.model.view[item])
+        else:
+            self.model.checked.discard(self.model.view[item])
+        self.RefreshItem(item)
+
+    def CheckAll(self, check=True):
+        if check:
+            self.model.checked.update(self.model.view)
+        else:
+            self.model.checked.difference_update(self.model.view)
+        if self.model.view:
+            self.RefreshItems(0, len(self.model.view) - 1)
+
+    def GetCheckedItems(self):
+        checked = self.model.checked
+        return [item for item, row in enumerate(self.model.view) if row in checked]
+
+    # Called by wx for the visible items only.
+    def OnGetItemText(self, item, col):
+        value = self.model.value(self.model.view[item], col)
+        return value if isinstance(value, str) else str(value)
+
+    def OnGetItemAttr(self, item):
+        colour = self.model.colours[self.model.view[item]]
+        if colour is None:
+            return None
+        attr = self._attrs.get(colour)
+        if attr is None:
+            attr = wx.ItemAttr()
+            attr.SetTextColour(colour)
+            self._attrs[colour] = attr
+        return attr
+
+    def OnGetItemImage(self, item):
+        return -1
+
+    def OnGetItemColumnImage(self, item, col):
+        return -1
+
+    def OnGetItemIsChecked(self, item):
+        return self.model.view[item] in self.model.checked
+
+    def _on_item_selected(self, event):
+        self._selected_key = self.GetKey(event.GetIndex())
+        event.Skip()
+
+    def _on_item_deselected(self, event):
+        self._selected_key = None
+        event.Skip()
+
+    def _on_item_checked(self, event):
+        self.model.checked.add(self.model.view[event.GetIndex()])
+        event.Skip()
+
+    def _on_item_unchecked(self, event):
+        self.model.checked.discard(self.model.view[event.GetIndex()])
+        event.Skip()
+
+    def _on_col_click(self, event):
+        col = event.GetColumn()
+        if col == -1:
+            event.Skip()
+            return
+        previous = self.model.sort_column
+        ascending = not self.model.ascending if col == previous else True
+        self.model.sort(col, ascending)
+        if self.sort_images:
+            if previous != -1 and previous != col:
+                self.ClearColumnImage(previous)
+            self.SetColumnImage(col, self.sort_images[ascending])
+        self.RefreshView()
+        event.Skip()